@@ -0,0 +1,636 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""변환 과정을 흉내 내는 이산 사건 시뮬레이터. 가상 머신이 몇 대 필요한지 등을 미리 계산할 때 사용합니다.
+(예: 시간당 20,000건을 p95 2분 이내에 처리하려면 가상 머신이 몇 대 필요한가?)
+
+흉내 내는 과정:
+ 1) 연동 대상 도착: 포아송 분포(--rate, --mix) 혹은 부하 기록(--trace, [Trace] CaptureFile)
+ 2) 요청 처리기: 대상 가져오기([RequestProcessor] DelayTime 간격 조회, inotify면 바로), 작업 생성, [Admission] 제한
+ 3) 쿠쿠: pending -> running(가상 머신 --machines대) -> completed(레포트 작성, --processors개) -> reported
+ 4) 결과 처리기: PollScheduler([ConvertResultProcessor] 설정)에 따른 상태 조회, 레포트 받기/분석, 결과 전달
+    (작업자 수는 [Engine] 설정을 따름. process 모드는 요청/결과 처리기 각 1개)
+
+단계별 소요 시간은 실제로 측정한 JSON-lines 기록([Trace] JsonLinesFile)을 --measured로 지정하면 확장자별 측정값에서 뽑고,
+측정값이 부족하면 옵션으로 지정한 평균의 로그정규분포에서 뽑습니다.
+(측정된 레포트 작성 시간에는 상태 조회 간격이 포함되어 있으므로 측정값을 사용하면 지연 시간이 조금 길게 계산됩니다.)
+(실행 시간의 기본 평균은 [ConvertResultProcessor] ExpectedDuration에서 레포트 작성 시간을 뺀 값)
+
+사용 예: python capacity_sim.py --rate 20000 --duration 3600 --machines 40
+         python capacity_sim.py --rate 20000 --measured trace.jsonl --target-p95 120 --search 10:200
+"""
+
+import os
+import sys
+import json
+import math
+import heapq
+import random
+import argparse
+from collections import deque
+from ConfigParser import ConfigParser
+
+BENCHMARK_DIR = os.path.dirname(os.path.realpath(__file__))
+AGENT_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), 'doc_conv_agent')
+sys.path.insert(0, AGENT_DIR)
+
+from poll_scheduler import PollScheduler
+from load_trace import read_records
+
+MIN_SAMPLES = 20 # 확장자별 측정값이 이보다 적으면 전체 측정값(혹은 로그정규분포)을 사용함
+
+# JSON-lines 기록의 span 이름 -> 시뮬레이터의 단계
+MEASURED_STAGES = {'claimed': 'create',
+                   'sandbox_running': 'run',
+                   'sandbox_reporting': 'report',
+                   'report_download': 'fetch',
+                   'report_decode': 'fetch',
+                   'converted_file_download': 'fetch',
+                   'deliver': 'deliver'}
+
+
+class Store:
+    """Simulator에서 사용하는 FIFO 대기열. 프로세스는 yield store.get()으로 항목을 받을 때까지 기다립니다."""
+    def __init__(self, sim):
+        self.sim = sim
+        self.items = deque()
+        self.waiters = deque()
+
+    def put(self, item):
+        if self.waiters:
+            self.sim.resume(self.waiters.popleft(), item)
+        else:
+            self.items.append(item)
+
+    def get(self):
+        return _Get(self)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class _Get:
+    def __init__(self, store):
+        self.store = store
+
+
+class Simulator:
+    """제너레이터로 작성한 프로세스들을 가상의 시각에 따라 실행합니다.
+    프로세스는 숫자(기다릴 시간, 초)나 Store.get()을 yield합니다.
+    """
+    def __init__(self):
+        self.now = 0.0
+        self.queue = [] # (시각, 순번, 프로세스, 전달할 값)
+        self.seq = 0
+
+    def process(self, generator, delay = 0):
+        self._schedule(self.now + delay, generator, None)
+
+    def resume(self, generator, value):
+        self._schedule(self.now, generator, value)
+
+    def _schedule(self, at, generator, value):
+        self.seq += 1
+        heapq.heappush(self.queue, (at, self.seq, generator, value))
+
+    def run(self, until = None, stop = None):
+        """until 시각까지(혹은 stop()이 True를 반환할 때까지) 실행합니다."""
+        while self.queue:
+            at, seq, generator, value = self.queue[0]
+            if until is not None and at > until:
+                break
+            heapq.heappop(self.queue)
+            self.now = at
+            try:
+                command = generator.send(value)
+            except StopIteration:
+                continue
+            if isinstance(command, _Get):
+                store = command.store
+                if store.items:
+                    self.resume(generator, store.items.popleft())
+                else:
+                    store.waiters.append(generator)
+            else:
+                self._schedule(self.now + command, generator, None)
+            if stop and stop():
+                break
+
+
+class Level:
+    """대기열 길이 등의 시간 가중 평균과 최대값을 구합니다."""
+    def __init__(self):
+        self.value = 0
+        self.max = 0
+        self.area = 0.0
+        self.last_time = 0.0
+
+    def add(self, delta, now):
+        self.area += self.value * (now - self.last_time)
+        self.last_time = now
+        self.value += delta
+        self.max = max(self.max, self.value)
+
+    def mean(self, now):
+        area = self.area + self.value * (now - self.last_time)
+        return area / now if now > 0 else 0
+
+
+class Sampler:
+    """한 단계의 소요 시간을 확장자별로 뽑습니다.
+    측정값이 충분하면 측정값 중에서 무작위로 고르고(경험적 분포), 아니면 평균이 means[ext]인 로그정규분포에서 뽑습니다.
+    """
+    def __init__(self, rand, means, sigma, measured = None):
+        self.rand = rand
+        self.means = means
+        self.sigma = sigma
+        self.measured = measured or {}
+        self.all_measured = [value for values in self.measured.values() for value in values]
+
+    def sample(self, ext):
+        values = self.measured.get(ext)
+        if not values or len(values) < MIN_SAMPLES:
+            values = self.all_measured if len(self.all_measured) >= MIN_SAMPLES else None
+        if values:
+            return self.rand.choice(values)
+        mean = self.means.get(ext, self.means.get('default', 0))
+        if mean <= 0:
+            return 0.0
+        if not self.sigma:
+            return mean
+        return self.rand.lognormvariate(math.log(mean) - self.sigma ** 2 / 2, self.sigma)
+
+
+class Job:
+    def __init__(self, job_id, ext, arrived_time):
+        self.id = job_id
+        self.ext = ext
+        self.arrived_time = arrived_time
+        self.reported_time = None
+        self.delivered_time = None
+
+
+class Pipeline:
+    """에이전트와 쿠쿠의 처리 과정을 흉내 냅니다."""
+    def __init__(self, conf, options, samplers, arrivals):
+        self.sim = Simulator()
+        self.conf = conf
+        self.options = options
+        self.samplers = samplers
+        self.arrivals = arrivals # (도착 시각, 확장자) 목록 (시각 순)
+        self.jobs = []
+
+        self.target = Store(self.sim) # TargetDir에서 기다리는 대상
+        self.pending = Store(self.sim) # 쿠쿠에서 가상 머신을 기다리는 작업
+        self.completed = Store(self.sim) # 실행이 끝나고 레포트 작성을 기다리는 작업
+        self.submitted = deque() # 결과 처리기가 가져가지 않은 작업 (작업 기록의 submitted 상태)
+        self.active = 0 # 쿠쿠에 맡긴 후 결과를 전달하지 않은 작업 수 (AdmissionController)
+
+        self.levels = dict((name, Level()) for name in
+                           ['target', 'cuckoo_pending', 'cuckoo_running', 'cuckoo_reporting', 'awaiting_fetch'])
+        self.busy = {'machines': 0.0, 'request_workers': 0.0, 'result_workers': 0.0}
+
+        self.delay_time = float(get_conf(conf, 'RequestProcessor', 'DelayTime', '3'))
+        self.inotify = get_conf(conf, 'Path', 'WatchMode', 'poll') == 'inotify'
+        self.admission_limit = None
+        if get_conf(conf, 'Admission', 'Enabled', 'no') == 'yes':
+            self.admission_limit = options.machines + int(get_conf(conf, 'Admission', 'Headroom', '2'))
+        if get_conf(conf, 'Engine', 'Mode', 'process') == 'thread':
+            self.request_workers = int(get_conf(conf, 'Engine', 'RequestWorkers', '1'))
+            self.result_workers = int(get_conf(conf, 'Engine', 'ResultWorkers', '1'))
+        else:
+            self.request_workers = 1
+            self.result_workers = 1
+
+    def _level(self, name, delta):
+        self.levels[name].add(delta, self.sim.now)
+
+    def _arrive(self):
+        for arrived_time, ext in self.arrivals:
+            if arrived_time > self.sim.now:
+                yield arrived_time - self.sim.now
+            job = Job(len(self.jobs), ext, self.sim.now)
+            self.jobs.append(job)
+            self._level('target', 1)
+            self.target.put(job)
+
+    def _request_worker(self):
+        while True:
+            if self.admission_limit is not None and self.active >= self.admission_limit:
+                yield self.delay_time
+                continue
+            if self.target.items:
+                job = self.target.items.popleft()
+            elif self.inotify:
+                job = yield self.target.get()
+            else:
+                yield self.delay_time
+                continue
+            self._level('target', -1)
+
+            self.active += 1
+            duration = self.samplers['create'].sample(job.ext)
+            self.busy['request_workers'] += duration
+            yield duration
+            self._level('cuckoo_pending', 1)
+            self.pending.put(job)
+            self.submitted.append(job)
+
+    def _machine(self):
+        while True:
+            job = yield self.pending.get()
+            self._level('cuckoo_pending', -1)
+            self._level('cuckoo_running', 1)
+            duration = self.samplers['run'].sample(job.ext)
+            self.busy['machines'] += duration
+            yield duration
+            self._level('cuckoo_running', -1)
+            self._level('cuckoo_reporting', 1)
+            if self.options.processors:
+                self.completed.put(job)
+            else:
+                self.sim.process(self._report(job))
+            if self.options.machine_overhead:
+                yield self.options.machine_overhead
+
+    def _processor(self):
+        while True:
+            job = yield self.completed.get()
+            for step in self._report(job):
+                yield step
+
+    def _report(self, job):
+        yield self.samplers['report'].sample(job.ext)
+        job.reported_time = self.sim.now
+        self._level('cuckoo_reporting', -1)
+        self._level('awaiting_fetch', 1)
+
+    def _result_worker(self):
+        poll_scheduler = create_poll_scheduler(self.conf)
+        jobs = {}
+        while True:
+            # 작업 기록에서 새로 생성된 작업을 가져옴. (ConvertResultProcessor._receive_tasks)
+            taken = 0
+            while self.submitted and taken < 1000:
+                job = self.submitted.popleft()
+                jobs[job.id] = job
+                poll_scheduler.add(job.id, job.id, 'job.' + job.ext, None, self.sim.now)
+                taken += 1
+            if not taken:
+                timeout = poll_scheduler.time_until_next_poll(self.sim.now)
+                if timeout is None or timeout > 1:
+                    timeout = 1
+                yield max(timeout, 0.01)
+
+            task_ids = poll_scheduler.due(self.sim.now)
+            if not task_ids:
+                continue
+            status_time = self.samplers['status'].sample('default')
+            self.busy['result_workers'] += status_time
+            yield status_time
+
+            for task_id in task_ids:
+                job = jobs[task_id]
+                if job.reported_time is None or job.reported_time > self.sim.now:
+                    poll_scheduler.reschedule(task_id, self.sim.now)
+                    continue
+                duration = self.samplers['fetch'].sample(job.ext) + self.samplers['deliver'].sample(job.ext)
+                self.busy['result_workers'] += duration
+                yield duration
+                poll_scheduler.remove(task_id)
+                del jobs[task_id]
+                job.delivered_time = self.sim.now
+                self.active -= 1
+                self._level('awaiting_fetch', -1)
+
+    def _delivered_count(self):
+        return sum(1 for job in self.jobs if job.delivered_time is not None)
+
+    def run(self):
+        self.sim.process(self._arrive())
+        for i in range(self.request_workers):
+            self.sim.process(self._request_worker())
+        for i in range(self.options.machines):
+            self.sim.process(self._machine())
+        for i in range(self.options.processors):
+            self.sim.process(self._processor())
+        for i in range(self.result_workers):
+            self.sim.process(self._result_worker())
+
+        last_arrival = self.arrivals[-1][0] if self.arrivals else 0
+        self.sim.run(until = last_arrival)
+        # 도착이 끝난 후에는 남은 작업을 모두 처리할 때까지 실행함. (처리하지 못하고 쌓이는 경우를 위해 제한을 둠)
+        limit = last_arrival + max(last_arrival * self.options.drain_factor, 600)
+        while self.sim.now < limit and self._delivered_count() < len(self.arrivals):
+            self.sim.run(until = min(self.sim.now + 60, limit))
+        return self.summarize(last_arrival)
+
+    def summarize(self, last_arrival):
+        now = self.sim.now
+        warmup = self.options.warmup if self.options.warmup is not None else last_arrival * 0.1
+        measured = [job for job in self.jobs if job.arrived_time >= warmup]
+        delivered = [job for job in measured if job.delivered_time is not None]
+        latencies = [job.delivered_time - job.arrived_time for job in delivered]
+        window = last_arrival - warmup
+        # 처리량: 통계 대상 작업을 모두 전달하기까지 걸린 시간 기준. (처리 능력이 부족하면 도착 속도보다 낮게 나옴)
+        busy_window = max(job.delivered_time for job in delivered) - warmup if delivered else 0
+
+        per_ext = {}
+        for job in delivered:
+            per_ext.setdefault(job.ext, []).append(job.delivered_time - job.arrived_time)
+
+        return {'machines': self.options.machines,
+                'jobs': len(self.jobs),
+                'delivered': len(self.jobs) - sum(1 for job in self.jobs if job.delivered_time is None),
+                'unfinished': sum(1 for job in self.jobs if job.delivered_time is None),
+                'offered_per_hour': len(measured) / window * 3600 if window >= 1 else None,
+                'throughput_per_hour': len(delivered) / busy_window * 3600 if busy_window > 0 else None,
+                'latency_seconds': percentiles(latencies),
+                'latency_p95_by_ext': dict((ext, percentile(values, 95)) for ext, values in per_ext.items()),
+                'queue_length': dict((name, {'mean': level.mean(now), 'max': level.max})
+                                     for name, level in self.levels.items()),
+                'utilization': {'machines': self.busy['machines'] / (self.options.machines * now) if now else 0,
+                                'request_workers': self.busy['request_workers'] / (self.request_workers * now) if now else 0,
+                                'result_workers': self.busy['result_workers'] / (self.result_workers * now) if now else 0},
+                'simulated_seconds': now}
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(int(round(p / 100.0 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def percentiles(values):
+    values = sorted(values)
+    return dict(('p{}'.format(p), percentile(values, p)) for p in [50, 90, 95, 99, 100])
+
+
+def get_conf(conf, section, option, default):
+    return conf.get(section, {}).get(option, default)
+
+
+def load_conf(path, overrides):
+    """에이전트 설정 파일을 읽습니다. (doc_conv_agent.load_config()와 같은 형식의 dict)
+    @param overrides: 'SECTION.OPTION=VALUE' 목록
+    """
+    parser = ConfigParser()
+    parser.optionxform = str
+    parser.read(path)
+    conf = dict((section, dict(parser.items(section))) for section in parser.sections())
+    for item in overrides:
+        key, value = item.split('=', 1)
+        section, option = key.split('.', 1)
+        conf.setdefault(section, {})[option] = value
+    return conf
+
+
+def parse_ext_values(text):
+    """'default:60,doc:40' 형식의 문자열을 dict로 바꿉니다. (ExpectedDuration과 같은 형식)"""
+    values = {}
+    for item in text.split(','):
+        if item.strip():
+            ext, value = item.split(':')
+            values[ext.strip().lower()] = float(value)
+    return values
+
+
+def create_poll_scheduler(conf):
+    """doc_conv_agent.create_poll_scheduler()와 같은 설정의 PollScheduler"""
+    poll_scheduler = PollScheduler()
+    poll_scheduler.set_poll_interval(float(get_conf(conf, 'ConvertResultProcessor', 'MinPollInterval', '1')),
+                                     float(get_conf(conf, 'ConvertResultProcessor', 'MaxPollInterval', '30')))
+    poll_scheduler.set_expected_durations(
+            parse_ext_values(get_conf(conf, 'ConvertResultProcessor', 'ExpectedDuration', 'default:60')))
+    return poll_scheduler
+
+
+def load_measured(path):
+    """JSON-lines 기록([Trace] JsonLinesFile)에서 단계별, 확장자별 소요 시간을 모읍니다.
+    @return: 단계 -> 확장자 -> 소요 시간 목록
+    """
+    measured = {}
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                trace = json.loads(line)
+            except ValueError:
+                continue
+            ext = os.path.splitext(trace.get('file_path') or '')[1][1:].lower()
+            durations = {}
+            for span in trace.get('spans', []):
+                stage = MEASURED_STAGES.get(span['name'])
+                if stage:
+                    durations[stage] = durations.get(stage, 0) + span['duration']
+            for stage, duration in durations.items():
+                measured.setdefault(stage, {}).setdefault(ext, []).append(duration)
+    return measured
+
+
+def create_samplers(conf, options, rand):
+    measured = load_measured(options.measured) if options.measured else {}
+    report_means = parse_ext_values(options.report_time)
+    if options.run_time:
+        run_means = parse_ext_values(options.run_time)
+    else:
+        # 예상 소요 시간에는 레포트 작성 시간도 포함되어 있으므로 그만큼 뺌.
+        expected = parse_ext_values(get_conf(conf, 'ConvertResultProcessor', 'ExpectedDuration', 'default:60'))
+        default_report = report_means.get('default', 0)
+        run_means = dict((ext, max(value - report_means.get(ext, default_report), 1.0))
+                         for ext, value in expected.items())
+    means = {'create': parse_ext_values(options.create_time),
+             'run': run_means,
+             'report': report_means,
+             'fetch': parse_ext_values(options.fetch_time),
+             'deliver': parse_ext_values(options.deliver_time),
+             'status': {'default': options.status_time}}
+    return dict((stage, Sampler(rand, stage_means, options.sigma, measured.get(stage)))
+                for stage, stage_means in means.items())
+
+
+def create_arrivals(conf, options, rand):
+    """(도착 시각, 확장자) 목록을 만듭니다."""
+    if options.trace:
+        records = read_records(options.trace)
+        if not records:
+            return []
+        first = records[0]['arrived_time']
+        arrivals = [((record['arrived_time'] - first) / options.speed, record['ext'] or 'default')
+                    for record in records]
+        if options.duration:
+            arrivals = [arrival for arrival in arrivals if arrival[0] <= options.duration]
+        return arrivals
+
+    if options.mix:
+        mix = parse_ext_values(options.mix)
+    else:
+        exts = parse_ext_values(get_conf(conf, 'ConvertResultProcessor', 'ExpectedDuration', 'default:60'))
+        mix = dict((ext, 1.0) for ext in exts if ext != 'default') or {'default': 1.0}
+    exts = sorted(mix)
+    total = sum(mix.values())
+    cumulative = []
+    acc = 0
+    for ext in exts:
+        acc += mix[ext] / total
+        cumulative.append(acc)
+
+    arrivals = []
+    now = 0.0
+    rate = options.rate / 3600.0
+    while True:
+        now += rand.expovariate(rate)
+        if now > options.duration:
+            break
+        r = rand.random()
+        for ext, bound in zip(exts, cumulative):
+            if r <= bound:
+                break
+        arrivals.append((now, ext))
+    return arrivals
+
+
+def simulate(conf, options, machines):
+    rand = random.Random(options.seed)
+    arrivals = create_arrivals(conf, options, rand)
+    options = argparse.Namespace(**dict(vars(options), machines = machines))
+    return Pipeline(conf, options, create_samplers(conf, options, rand), arrivals).run()
+
+
+def meets_target(result, target_p95):
+    p95 = result['latency_seconds']['p95']
+    return not result['unfinished'] and p95 is not None and p95 <= target_p95
+
+
+def search_machines(conf, options, low, high):
+    """p95 목표를 만족하는 가장 적은 가상 머신 수를 찾습니다. (이진 탐색)
+    @return: (가상 머신 수 혹은 None, 시뮬레이션한 결과 목록)
+    """
+    tried = {}
+    def run(machines):
+        if not machines in tried:
+            tried[machines] = simulate(conf, options, machines)
+            print_short(tried[machines], options.target_p95)
+        return tried[machines]
+
+    if not meets_target(run(high), options.target_p95):
+        return None, [tried[m] for m in sorted(tried)]
+    while low < high:
+        middle = (low + high) // 2
+        if meets_target(run(middle), options.target_p95):
+            high = middle
+        else:
+            low = middle + 1
+    return high, [tried[m] for m in sorted(tried)]
+
+
+def _format_seconds(value):
+    return '-' if value is None else '{:.1f}s'.format(value)
+
+
+def _format_rate(value):
+    return '-' if value is None else '{:.0f}/h'.format(value)
+
+
+def print_short(result, target_p95):
+    latency = result['latency_seconds']
+    print('machines {:>4}: p95 {:>8}, throughput {:>8}, unfinished {}{}'.format(
+            result['machines'], _format_seconds(latency['p95']), _format_rate(result['throughput_per_hour']),
+            result['unfinished'], '  (ok)' if meets_target(result, target_p95) else ''))
+    sys.stdout.flush()
+
+
+def print_result(result):
+    print('machines: {machines}, jobs: {jobs}, delivered: {delivered}, unfinished: {unfinished}'.format(**result))
+    print('offered: {}, throughput: {}'.format(_format_rate(result['offered_per_hour']), _format_rate(result['throughput_per_hour'])))
+    latency = result['latency_seconds']
+    print('latency: ' + ', '.join('{} {}'.format(k, _format_seconds(latency[k])) for k in ['p50', 'p90', 'p95', 'p99', 'p100']))
+    print('latency p95 by ext: ' + ', '.join('{} {}'.format(ext, _format_seconds(value))
+                                              for ext, value in sorted(result['latency_p95_by_ext'].items())))
+    print('queue length (mean / max):')
+    for name, level in sorted(result['queue_length'].items()):
+        print('  {:<18} {:>8.1f} / {}'.format(name, level['mean'], level['max']))
+    print('utilization: ' + ', '.join('{} {:.0%}'.format(k, v) for k, v in sorted(result['utilization'].items())))
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description = '변환 과정 용량 시뮬레이터')
+    parser.add_argument('--conf', default = os.path.join(AGENT_DIR, 'doc_conv_agent.conf'), help = '에이전트 설정 파일')
+    parser.add_argument('--set', action = 'append', default = [], metavar = 'SECTION.OPTION=VALUE',
+                        help = '에이전트 설정 변경 (여러 번 지정 가능)')
+    parser.add_argument('--rate', type = float, default = 1000, help = '시간당 도착하는 파일 수 (포아송 분포)')
+    parser.add_argument('--mix', default = '', help = '확장자별 비율. 예: doc:5,xls:2,ppt:1 (기본: ExpectedDuration의 확장자들을 같은 비율로)')
+    parser.add_argument('--trace', default = '', help = '도착 시각과 확장자를 가져올 부하 기록 (지정하면 --rate, --mix는 무시함)')
+    parser.add_argument('--speed', type = float, default = 1.0, help = '부하 기록의 재현 속도 (2 = 두 배 빠르게)')
+    parser.add_argument('--duration', type = float, default = 3600, help = '파일이 도착하는 기간 (초)')
+    parser.add_argument('--warmup', type = float, default = None, help = '통계에서 제외할 처음 기간 (초, 기본: --duration의 10%%)')
+    parser.add_argument('--drain-factor', type = float, default = 3.0,
+                        help = '도착이 끝난 후 남은 작업을 처리하는 최대 기간 (--duration의 배수)')
+    parser.add_argument('--machines', type = int, default = 4, help = '가상 머신 수')
+    parser.add_argument('--machine-overhead', type = float, default = 0.0,
+                        help = '작업이 끝난 후 가상 머신을 다시 사용할 수 있을 때까지 걸리는 시간 (초, 스냅샷 복원 등)')
+    parser.add_argument('--processors', type = int, default = 0, help = '쿠쿠의 레포트 작성 프로세스 수 (0이면 제한 없음)')
+    parser.add_argument('--measured', default = '', help = '단계별 소요 시간을 가져올 JSON-lines 기록 ([Trace] JsonLinesFile)')
+    parser.add_argument('--run-time', default = '', help = '가상 머신 실행 시간의 평균 (예: default:40,ppt:70. 기본: ExpectedDuration - 레포트 작성 시간)')
+    parser.add_argument('--report-time', default = 'default:5', help = '레포트 작성 시간의 평균')
+    parser.add_argument('--create-time', default = 'default:0.2', help = '작업 생성(파일 업로드) 시간의 평균')
+    parser.add_argument('--fetch-time', default = 'default:0.5', help = '레포트 받기/분석 시간의 평균')
+    parser.add_argument('--deliver-time', default = 'default:0.05', help = '결과 전달 시간의 평균')
+    parser.add_argument('--status-time', type = float, default = 0.05, help = '상태 조회 한 번에 걸리는 시간')
+    parser.add_argument('--sigma', type = float, default = 0.3, help = '로그정규분포의 형태 값 (0이면 항상 평균 값)')
+    parser.add_argument('--seed', type = int, default = 1, help = '난수 시드')
+    parser.add_argument('--target-p95', type = float, default = 120, help = '--search에서 사용할 p95 지연 시간 목표 (초)')
+    parser.add_argument('--search', default = '', metavar = 'MIN:MAX',
+                        help = 'p95 목표를 만족하는 가장 적은 가상 머신 수를 MIN ~ MAX에서 찾음')
+    parser.add_argument('--json', default = '', help = '결과를 JSON으로 저장할 경로')
+    return parser
+
+
+def main(argv):
+    options = create_parser().parse_args(argv)
+    conf = load_conf(options.conf, options.set)
+
+    if options.search:
+        low, high = [int(x) for x in options.search.split(':')]
+        machines, results = search_machines(conf, options, low, high)
+        print('')
+        if machines is None:
+            print('가상 머신 {}대로도 p95 {}초 목표를 만족하지 못합니다.'.format(high, options.target_p95))
+        else:
+            print('p95 {}초 목표를 만족하는 가장 적은 가상 머신 수: {}'.format(options.target_p95, machines))
+            print_result([result for result in results if result['machines'] == machines][0])
+        output = {'target_p95': options.target_p95, 'machines': machines, 'results': results}
+    else:
+        output = simulate(conf, options, options.machines)
+        print_result(output)
+
+    if options.json:
+        with open(options.json, 'w') as f:
+            json.dump(output, f, indent = 4, sort_keys = True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,475 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""doc_conv_agent의 성능을 측정하기 위한 가짜 쿠쿠 REST API 서버.
+실제 쿠쿠와 가상 머신 없이 SandboxDocConverter가 사용하는 API를 흉내 냅니다.
+ - POST /tasks/create/file
+ - GET /tasks/view/<작업ID>, /tasks/list/<limit>/<offset>, /tasks/report/<작업ID>/json, /tasks/delete/<작업ID>
+   (/tasks/list의 순서는 --list-order로 정함)
+ - GET /machines/list, /cuckoo/status
+ - GET /analyses/<작업ID>/converted/result.pdf, /analyses/<작업ID>/converted/<문서 이름>.pdf (--reference 옵션을 준 경우)
+ - GET /analyses/<작업ID>/reports/conversion.json (--conversion 옵션을 준 경우)
+
+작업은 가상 머신 수(--machines)만큼만 동시에 실행되며, 나머지는 pending 상태로 기다립니다.
+실행 시간과 레포트 작성 시간은 옵션으로 지정한 값을 기준으로 ±jitter 비율만큼 무작위로 바뀝니다.
+에러/시그니처 발견 여부는 --error-rate, --signature-rate에 따라 정하며, 파일 앞부분에 결과 표시(OUTCOME_MARKER)가 있으면 그에 따릅니다.
+zip 파일로 받은 작업은 배치 작업으로 보고 문서별 결과({"documents": {...}})를 레포트에 넣습니다.
+(실행 시간은 두 번째 문서부터 문서마다 --batch-document-time만큼 늘어나며, 문서 중 하나라도 에러/시그니처이면 작업 전체가 그 결과가 됨)
+
+사용 예: python fake_cuckoo.py --port 8090 --machines 8 --run-time 20 --report-time 3 --report-size 5000000
+      (오래된 작업이 많이 남아 있는 쿠쿠 2.x: --old-tasks 5000 --list-order completed)
+"""
+
+import sys
+import time
+import json
+import heapq
+import random
+import base64
+import hashlib
+import zipfile
+import argparse
+import threading
+from cStringIO import StringIO
+from collections import deque
+import BaseHTTPServer
+import cgi
+from SocketServer import ThreadingMixIn
+
+
+CHUNK_SIZE = 1024 * 1024
+
+# 파일 앞부분에 이 표시와 결과(success, error, signature)가 있으면 무작위로 정하지 않고 그 결과를 냄.
+# (replay_trace.py가 부하 기록의 결과를 재현할 때 사용)
+OUTCOME_MARKER = 'fake-cuckoo-outcome:'
+
+
+def read_outcome(data):
+    """파일 앞부분에 기록된 결과를 반환합니다. 없으면 None."""
+    head = data[:256]
+    index = head.find(OUTCOME_MARKER)
+    if index < 0:
+        return None
+    return head[index + len(OUTCOME_MARKER):].split('\n', 1)[0].strip()
+
+
+class Task:
+    def __init__(self, task_id, file_name, data, added_on):
+        self.id = task_id
+        self.file_name = file_name
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        self.documents = None # 배치 작업인 경우 문서 이름 -> 원본 파일의 sha256
+        self.added_on = added_on
+        self.started_on = None
+        self.completed_on = None
+        self.reported_on = None
+        self.error = False
+        self.signature = False
+
+
+class FakeCuckoo:
+    """작업의 상태를 시간에 따라 흉내 냅니다.
+    상태는 요청이 올 때마다 현재 시각까지 한꺼번에 계산합니다. (advance())
+    """
+    def __init__(self, options):
+        self.options = options
+        self.random = random.Random(options.seed)
+        self.lock = threading.Lock()
+        self.tasks = {} # 작업ID -> Task
+        self.pending = deque() # 가상 머신을 기다리는 작업 (도착 순서)
+        self.machines = [(0.0, i) for i in range(options.machines)] # (가상 머신이 비는 시각, 번호) 힙
+        self.last_task_id = 0
+        self._add_old_tasks(options.old_tasks)
+        self.pdf_body = self._make_filler(options.pdf_size)
+        self.padding = 'A' * CHUNK_SIZE
+
+    def _add_old_tasks(self, count):
+        """하루 전에 끝난 작업(reported)을 count개 추가합니다. (에이전트가 삭제하지 않은 작업이 쌓인 서버를 흉내 냄)"""
+        added_on = time.time() - 86400 - count
+        for i in range(count):
+            self.last_task_id += 1
+            task = Task(self.last_task_id, 'old.doc', '', added_on + i)
+            task.started_on = task.added_on
+            task.completed_on = task.reported_on = task.added_on + 1
+            self.tasks[task.id] = task
+
+    def _make_filler(self, size):
+        block = ''.join(chr(self.random.randint(32, 126)) for i in range(4096))
+        return (block * (size // len(block) + 1))[:size]
+
+    def _jitter(self, value):
+        jitter = self.options.jitter
+        return max(value * (1 + self.random.uniform(-jitter, jitter)), 0)
+
+    def create_task(self, file_name, data):
+        with self.lock:
+            self.last_task_id += 1
+            task = Task(self.last_task_id, file_name, data, time.time())
+            contents = [data]
+            if file_name.lower().endswith('.zip'):
+                task.documents = {}
+                contents = []
+                archive = zipfile.ZipFile(StringIO(data))
+                for member in archive.namelist():
+                    content = archive.read(member)
+                    task.documents[member.rsplit('.', 1)[0]] = hashlib.sha256(content).hexdigest()
+                    contents.append(content)
+
+            for content in contents:
+                outcome = read_outcome(content)
+                if outcome:
+                    task.error = task.error or outcome == 'error'
+                    task.signature = task.signature or outcome == 'signature'
+                else:
+                    task.error = task.error or self.random.random() < self.options.error_rate
+                    task.signature = task.signature or self.random.random() < self.options.signature_rate
+            self.tasks[task.id] = task
+            self.pending.append(task)
+            return task.id
+
+    def advance(self, now = None):
+        """현재 시각까지 비어 있는 가상 머신에 대기 중인 작업을 배정합니다. (lock을 잡은 상태에서 호출)"""
+        if now is None:
+            now = time.time()
+        while self.pending and self.machines:
+            free_time, machine = self.machines[0]
+            task = self.pending[0]
+            start = max(free_time, task.added_on)
+            if start > now:
+                break
+            heapq.heappop(self.machines)
+            self.pending.popleft()
+            if not task.id in self.tasks:
+                # 대기 중에 삭제된 작업
+                heapq.heappush(self.machines, (free_time, machine))
+                continue
+            task.started_on = start
+            run_time = self.options.run_time
+            if task.documents:
+                document_time = self.options.batch_document_time
+                if document_time is None:
+                    document_time = run_time / 4.0
+                run_time += document_time * (len(task.documents) - 1)
+            task.completed_on = start + self._jitter(run_time)
+            task.reported_on = task.completed_on + self._jitter(self.options.report_time)
+            heapq.heappush(self.machines, (task.completed_on + self.options.machine_overhead, machine))
+
+    def status(self, task, now):
+        if task.started_on is None or task.started_on > now:
+            return 'pending'
+        if now < task.completed_on:
+            return 'running'
+        if now < task.reported_on:
+            return 'completed'
+        return 'reported'
+
+    def task_info(self, task, now):
+        status = self.status(task, now)
+        info = {'id': task.id,
+                'target': task.file_name,
+                'category': 'file',
+                'package': 'doc_conv',
+                'status': status,
+                'errors': [],
+                'added_on': _format_time(task.added_on),
+                'started_on': _format_time(task.started_on) if status != 'pending' else None,
+                'completed_on': _format_time(task.completed_on) if status in ('completed', 'reported') else None}
+        if task.error and status == 'reported':
+            info['errors'] = ['Analysis failed (fake error)']
+        return info
+
+    def get_task(self, task_id):
+        with self.lock:
+            self.advance()
+            task = self.tasks.get(task_id)
+            if task:
+                return self.task_info(task, time.time())
+            return None
+
+    def list_tasks(self, limit, offset):
+        """--list-order의 순서로 작업 목록을 반환합니다.
+        newest: 최신 작업부터 (쿠쿠 1.x), completed: 완료 시각 순이며 끝나지 않은 작업이 먼저 (쿠쿠 2.x)
+        """
+        with self.lock:
+            self.advance()
+            now = time.time()
+            tasks = self.tasks.values()
+            if self.options.list_order == 'completed':
+                # 아직 끝나지 않은 작업은 완료 시각이 없음(NULL)
+                tasks.sort(key = lambda task: (task.completed_on if self.status(task, now) in ('completed', 'reported')
+                                               else None, task.id))
+            else:
+                tasks.sort(key = lambda task: task.id, reverse = True)
+            if limit is None:
+                limit = len(tasks)
+            return [self.task_info(task, now) for task in tasks[offset:offset + limit]]
+
+    def delete_task(self, task_id):
+        with self.lock:
+            return self.tasks.pop(task_id, None) is not None
+
+    def machine_list(self):
+        now = time.time()
+        with self.lock:
+            self.advance()
+            busy = set(machine for free_time, machine in self.machines if free_time > now)
+        return [{'id': i + 1, 'name': 'fake{}'.format(i), 'label': 'fake{}'.format(i), 'platform': 'windows',
+                 'status': 'running' if i in busy else 'poweroff', 'locked': i in busy}
+                for i in range(self.options.machines)]
+
+    def cuckoo_status(self):
+        with self.lock:
+            self.advance()
+            now = time.time()
+            counts = {'total': len(self.tasks), 'pending': 0, 'running': 0, 'completed': 0, 'reported': 0}
+            for task in self.tasks.values():
+                counts[self.status(task, now)] += 1
+            busy = len([1 for free_time, machine in self.machines if free_time > now])
+        return {'version': '1.2-fake', 'hostname': 'fake_cuckoo', 'tasks': counts,
+                'machines': {'total': self.options.machines, 'available': self.options.machines - busy}}
+
+    def converted_file(self, task, name = None):
+        """
+        @param name: 배치 작업인 경우 문서 이름
+        """
+        if name is not None:
+            return '%PDF-1.4\n% ' + task.documents[name] + '\n' + self.pdf_body
+        return '%PDF-1.4\n% ' + task.sha256 + '\n' + self.pdf_body
+
+    def converted_value(self, task, name = None):
+        """레포트의 converted 항목에 넣을 값 (JSON 문자열)"""
+        converted = self.converted_file(task, name)
+        if self.options.reference:
+            path = 'converted/{}.pdf'.format(name if name is not None else 'result')
+            return json.dumps({'size': len(converted), 'sha256': hashlib.sha256(converted).hexdigest(),
+                               'path': path})
+        return '"' + base64.encodestring(converted).replace('\n', '\\n') + '"'
+
+    def report_parts(self, task):
+        """레포트를 (앞부분, 채워 넣을 데이터의 크기, 뒷부분)으로 나누어 반환합니다.
+        converted 항목은 쿠쿠의 jsondumpex와 같이 레포트의 뒷부분에 위치합니다.
+        """
+        signatures = []
+        if task.signature:
+            signatures.append({'name': 'abnormal_doc', 'description': 'fake signature', 'severity': 3})
+        head = '{"info": ' + json.dumps({'id': task.id, 'package': 'doc_conv'}) + \
+               ', "signatures": ' + json.dumps(signatures) + ', "debug": {"log": "'
+
+        if task.documents is not None:
+            converted = '{"documents": {' + ', '.join(
+                json.dumps(name) + ': ' + self.converted_value(task, name) for name in sorted(task.documents)) + '}}'
+        else:
+            converted = self.converted_value(task)
+        tail = '"}, "converted": ' + converted + '}'
+        return head, self.options.report_size, tail
+
+    def conversion_report(self, task):
+        """conversion 레포팅 모듈이 만드는 작은 레포트(reports/conversion.json)"""
+        signatures = []
+        if task.signature:
+            signatures.append({'name': 'abnormal_doc', 'severity': 3})
+        if task.documents is not None:
+            converted = '{"documents": {' + ', '.join(
+                json.dumps(name) + ': ' + self.converted_value(task, name) for name in sorted(task.documents)) + '}}'
+        else:
+            converted = self.converted_value(task)
+        return '{"info": ' + json.dumps({'id': task.id, 'package': 'doc_conv'}) + \
+               ', "signatures": ' + json.dumps(signatures) + ', "converted": ' + converted + '}'
+
+    def write_report(self, out, parts):
+        """레포트를 조금씩 기록합니다. (레포트가 커도 메모리에 한꺼번에 올리지 않음)"""
+        head, remaining, tail = parts
+        out.write(head)
+        while remaining > 0:
+            size = min(remaining, CHUNK_SIZE)
+            out.write(self.padding[:size])
+            remaining -= size
+        out.write(tail)
+
+
+def _format_time(value):
+    if value is None:
+        return None
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(value))
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # 에이전트가 연결을 재사용할 수 있도록 keep-alive 지원
+
+    def log_message(self, format, *args):
+        if self.server.cuckoo.options.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def send_json(self, obj, code = 200):
+        body = json.dumps(obj)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        cuckoo = self.server.cuckoo
+        parts = self.path.strip('/').split('/')
+        if parts != ['tasks', 'create', 'file']:
+            return self.send_json({'error': True, 'error_value': 'not found'}, 404)
+
+        form = cgi.FieldStorage(fp = self.rfile, headers = self.headers,
+                                environ = {'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': self.headers['Content-Type']})
+        if not 'file' in form:
+            return self.send_json({'error': True, 'error_value': 'No file has been submitted'}, 400)
+        task_id = cuckoo.create_task(form['file'].filename, form['file'].file.read())
+        self.send_json({'task_id': task_id})
+
+    def do_GET(self):
+        cuckoo = self.server.cuckoo
+        parts = self.path.strip('/').split('/')
+        try:
+            if parts[:2] == ['tasks', 'view']:
+                task = cuckoo.get_task(int(parts[2]))
+                if not task:
+                    return self.send_json({'error': True, 'error_value': 'Task not found'}, 404)
+                return self.send_json({'task': task})
+            if parts[:2] == ['tasks', 'list']:
+                limit = int(parts[2]) if len(parts) > 2 else None
+                offset = int(parts[3]) if len(parts) > 3 else 0
+                return self.send_json({'tasks': cuckoo.list_tasks(limit, offset)})
+            if parts[:2] == ['tasks', 'report']:
+                return self.send_report(int(parts[2]))
+            if parts[:2] == ['tasks', 'delete']:
+                if cuckoo.delete_task(int(parts[2])):
+                    return self.send_json({'status': 'OK'})
+                return self.send_json({'error': True, 'error_value': 'Task not found'}, 404)
+            if parts[:2] == ['machines', 'list']:
+                return self.send_json({'machines': cuckoo.machine_list()})
+            if parts[:2] == ['cuckoo', 'status']:
+                return self.send_json(cuckoo.cuckoo_status())
+            if parts[0] == 'analyses' and cuckoo.options.reference and len(parts) == 4 and \
+                    parts[2] == 'converted' and parts[3].endswith('.pdf'):
+                name = parts[3][:-len('.pdf')]
+                return self.send_converted(int(parts[1]), None if name == 'result' else name)
+            if parts[0] == 'analyses' and cuckoo.options.conversion and parts[2:] == ['reports', 'conversion.json']:
+                return self.send_conversion_report(int(parts[1]))
+        except (IndexError, ValueError):
+            pass
+        self.send_json({'error': True, 'error_value': 'not found'}, 404)
+
+    def _reported_task(self, task_id):
+        cuckoo = self.server.cuckoo
+        with cuckoo.lock:
+            cuckoo.advance()
+            task = cuckoo.tasks.get(task_id)
+            if task and cuckoo.status(task, time.time()) == 'reported':
+                return task
+        return None
+
+    def send_report(self, task_id):
+        task = self._reported_task(task_id)
+        if not task:
+            return self.send_json({'error': True, 'error_value': 'Report not found'}, 404)
+        cuckoo = self.server.cuckoo
+        head, padding_size, tail = parts = cuckoo.report_parts(task)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(head) + padding_size + len(tail)))
+        self.end_headers()
+        cuckoo.write_report(self.wfile, parts)
+
+    def send_conversion_report(self, task_id):
+        task = self._reported_task(task_id)
+        if not task:
+            return self.send_json({'error': True, 'error_value': 'File not found'}, 404)
+        body = self.server.cuckoo.conversion_report(task)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_converted(self, task_id, name = None):
+        task = self._reported_task(task_id)
+        if not task or (name is not None and not name in (task.documents or {})):
+            return self.send_json({'error': True, 'error_value': 'File not found'}, 404)
+        data = self.server.cuckoo.converted_file(task, name)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class Server(ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description = '가짜 쿠쿠 REST API 서버')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8090)
+    parser.add_argument('--machines', type = int, default = 4, help = '가상 머신 수 (동시에 실행되는 작업 수)')
+    parser.add_argument('--run-time', type = float, default = 20.0, help = '가상 머신에서 실행되는 시간 (초)')
+    parser.add_argument('--report-time', type = float, default = 3.0, help = '실행이 끝난 후 레포트 작성에 걸리는 시간 (초)')
+    parser.add_argument('--machine-overhead', type = float, default = 0.0,
+                        help = '작업이 끝난 후 가상 머신을 다시 사용할 수 있을 때까지 걸리는 시간 (초, 스냅샷 복원 등)')
+    parser.add_argument('--batch-document-time', type = float, default = None,
+                        help = '배치 작업에서 두 번째 문서부터 문서마다 늘어나는 실행 시간 (초, 기본값: --run-time의 1/4)')
+    parser.add_argument('--jitter', type = float, default = 0.2, help = '실행/레포트 작성 시간의 무작위 변동 비율 (0 ~ 1)')
+    parser.add_argument('--report-size', type = int, default = 100 * 1024, help = '레포트에 추가할 데이터의 크기 (바이트)')
+    parser.add_argument('--pdf-size', type = int, default = 50 * 1024, help = '변환된 파일의 크기 (바이트)')
+    parser.add_argument('--error-rate', type = float, default = 0.0, help = '작업이 에러로 끝나는 비율 (0 ~ 1)')
+    parser.add_argument('--signature-rate', type = float, default = 0.0,
+                        help = 'abnormal_doc 시그니처가 발견되는 비율 (0 ~ 1)')
+    parser.add_argument('--reference', action = 'store_true',
+                        help = '레포트에는 파일 정보만 넣고 변환된 파일은 /analyses/에서 제공함 (converted 모듈의 mode = reference)')
+    parser.add_argument('--conversion', action = 'store_true',
+                        help = '/analyses/<작업ID>/reports/conversion.json을 제공함 (conversion 레포팅 모듈 사용)')
+    parser.add_argument('--old-tasks', type = int, default = 0, help = '시작할 때 추가할 하루 전에 끝난 작업의 수')
+    parser.add_argument('--list-order', choices = ['newest', 'completed'], default = 'newest',
+                        help = '/tasks/list의 순서 (newest: 최신 작업부터(쿠쿠 1.x), completed: 완료 시각 순(쿠쿠 2.x))')
+    parser.add_argument('--seed', type = int, default = None, help = '난수 시드 (같은 값이면 같은 결과)')
+    parser.add_argument('--verbose', action = 'store_true', help = '요청마다 로그를 출력함')
+    return parser
+
+
+def create_server(options):
+    server = Server((options.host, options.port), Handler)
+    server.cuckoo = FakeCuckoo(options)
+    return server
+
+
+def main(argv):
+    options = create_parser().parse_args(argv)
+    server = create_server(options)
+    print('fake cuckoo listening on http://{}:{} (machines: {})'.format(options.host, options.port, options.machines))
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,400 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""작업마다 실행되는 코드(레포트 분석, 변환 대상 조회, 결과 전달)의 수행 시간을 측정합니다. (리눅스, 샌드박스 불필요)
+ - report_full / report_stream: JsonReportAnalyser.analyse() / analyse_stream()
+   (1 MB ~ 500 MB의 가상 레포트, 시그니처 수를 바꾸어 가며 측정)
+   레포트 측정 후 같은 레포트에서 stream 모드가 full 모드보다 느린 항목을 표시하며,
+   --check-stream을 지정하면 그런 항목이 있을 때 종료 코드 1을 반환합니다.
+ - linker_get_first / linker_get_next / linker_get_idle: FileLinker.get()
+   (항목이 100 ~ 100,000개인 디렉토리에서 첫 조회, 이후 조회, 대상이 없을 때의 조회)
+ - linker_success / linker_fail: FileLinker.success() / fail() (결과 파일 크기별)
+
+측정 결과는 JSON으로 저장하여 기준값(baseline)으로 사용할 수 있으며,
+--compare로 기준값과 비교하면 기준값보다 --threshold 이상 느려진 항목을 표시하고 종료 코드 1을 반환합니다.
+
+사용 예:
+    python micro_benchmark.py --save baseline.json          # 코드를 바꾸기 전에 기준값 저장
+    python micro_benchmark.py --compare baseline.json       # 코드를 바꾼 후 비교
+    python micro_benchmark.py --large --only report         # 100 MB·500 MB 레포트 및 100,000개 디렉토리 포함
+"""
+
+import os
+import sys
+import time
+import json
+import shutil
+import base64
+import argparse
+import platform
+import tempfile
+import subprocess
+import logging
+
+BENCHMARK_DIR = os.path.dirname(os.path.realpath(__file__))
+AGENT_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), 'doc_conv_agent')
+sys.path.insert(0, AGENT_DIR)
+
+from report_analyser import JsonReportAnalyser
+from linker import FileLinker, ResultFile
+
+MB = 1024 * 1024
+
+# 레포트의 behavior 항목을 채울 API 호출 기록 (실제 쿠쿠 레포트와 비슷한 구조)
+CALL = json.dumps({'category': 'filesystem', 'status': 1, 'return': '0x00000000',
+                   'timestamp': '2016-05-01 12:34:56,789', 'thread_id': '1234', 'repeated': 0,
+                   'api': 'NtCreateFile', 'id': 0,
+                   'arguments': [{'name': 'FileName', 'value': 'C:\\Users\\user\\AppData\\Local\\Temp\\~$doc.tmp'},
+                                 {'name': 'DesiredAccess', 'value': '0x80100080'},
+                                 {'name': 'Comment', 'value': u'\ud55c\uae00 \"quoted\"\n'}]})
+# 레포트의 network 항목을 채울 통신 기록
+HOST = json.dumps({'ip': '192.168.56.1', 'country_name': '', 'hostname': 'update.example.com', 'inaddrarpa': '',
+                   'dns': {'request': 'update.example.com', 'type': 'A', 'answers': [{'type': 'A', 'data': '10.0.0.1'}]},
+                   'http': {'method': 'GET', 'uri': 'http://update.example.com/check?v=1&lang=ko', 'port': 80,
+                            'user-agent': 'Mozilla/4.0 (compatible; MSIE 7.0; Windows NT 6.1)'}})
+# 레포트의 debug.log 항목을 채울 분석기 로그 한 줄
+LOG_LINE = json.dumps('2016-05-01 12:34:56,789 [lib.api.process] INFO: Successfully injected process with pid 1234 '
+                      '("C:\\Program Files\\viewer.exe")\n')[1:-1]
+
+
+def write_report(path, size, signature_count, blocked_signature = False):
+    """size 바이트 정도의 가상 레포트를 만듭니다.
+    @param signature_count: 검사 대상이 아닌 시그니처의 수
+    @param blocked_signature: True이면 검사 대상 시그니처(abnormal_doc)를 맨 앞에 추가함
+    """
+    signatures = [{'name': 'benign_{}'.format(i), 'description': 'benchmark signature', 'severity': 1,
+                   'data': [{'file': 'C:\\dummy\\{}.txt'.format(i)}]} for i in range(signature_count)]
+    if blocked_signature:
+        signatures.insert(0, {'name': 'abnormal_doc', 'description': 'benchmark', 'severity': 3, 'data': []})
+
+    converted_size = max(min(size // 10, 10 * MB), 1024)
+    converted = base64.encodestring(os.urandom(converted_size))
+
+    # 실제 쿠쿠 레포트와 같이 behavior가 가장 크고 network, debug가 그 다음이며, converted는 jsondumpex와 같이 맨 뒤에 있음.
+    static = {'office': {'macros': [], 'metadata': {'SummaryInformation': {'title': 'benchmark', 'author': 'user'}}}}
+    target = {'category': 'file', 'file': {'name': 'sample.doc', 'size': 1024, 'type': 'Composite Document File V2',
+                                           'sha256': '0' * 64, 'yara': []}}
+    with open(path, 'wb') as f:
+        f.write('{"info": {"id": 1, "category": "file", "package": "doc_conv"}, ')
+        f.write('"signatures": ' + json.dumps(signatures) + ', ')
+        f.write('"target": ' + json.dumps(target) + ', "static": ' + json.dumps(static) + ', ')
+        remaining = size - len(converted) - f.tell()
+        f.write('"behavior": {"processes": [{"process_name": "viewer.exe", "calls": [')
+        write_blocks(f, ', '.join([CALL] * 1000), ', ', remaining * 7 // 10)
+        f.write(']}]}, "network": {"hosts": [')
+        write_blocks(f, ', '.join([HOST] * 1000), ', ', remaining * 15 // 100)
+        f.write(']}, "debug": {"log": "')
+        write_blocks(f, LOG_LINE * 1000, '', remaining * 15 // 100)
+        f.write('"}, "converted": ' + json.dumps(converted) + '}')
+
+
+def write_blocks(f, block, separator, size):
+    """block을 separator로 이어서 size 바이트 정도를 기록합니다. (최소 한 번)"""
+    f.write(block)
+    size -= len(block)
+    while size > 0:
+        f.write(separator + block)
+        size -= len(separator) + len(block)
+
+
+def measure(func, repeat):
+    """func를 repeat번 실행하여 (최소, 중앙값) 수행 시간을 반환합니다.
+    func는 준비 작업을 수행한 후 측정할 함수를 반환하고, 측정할 함수는 정리 작업을 수행할 함수(혹은 None)를 반환합니다.
+    """
+    times = []
+    for i in range(repeat):
+        target = func()
+        start = time.time()
+        cleanup = target()
+        times.append(time.time() - start)
+        if cleanup:
+            cleanup()
+    times.sort()
+    return times[0], times[len(times) // 2]
+
+
+def bench_report(work_dir, sizes, signature_counts, repeat, results):
+    analyser = JsonReportAnalyser()
+    analyser.set_signature_list(['abnormal_doc', 'creates_exe'])
+
+    for size_mb in sizes:
+        cases = [(count, False) for count in signature_counts] + [(signature_counts[-1], True)]
+        for signature_count, blocked in cases:
+            path = os.path.join(work_dir, 'report.json')
+            write_report(path, size_mb * MB, signature_count, blocked)
+            suffix = '{}mb_sig{}{}'.format(size_mb, signature_count, '_hit' if blocked else '')
+            params = {'size_mb': size_mb, 'signatures': signature_count, 'blocked_signature': blocked}
+
+            def prepare_full():
+                with open(path, 'rb') as f:
+                    text = f.read()
+                return lambda: analyser.analyse(text) and None
+
+            def prepare_stream():
+                f = open(path, 'rb')
+                result_file = ResultFile(work_dir)
+                def run():
+                    analyser.analyse_stream(f, 1, result_file)
+                    return lambda: (f.close(), result_file.discard())
+                return run
+
+            if not blocked:
+                add_result(results, 'report_full_' + suffix, measure(prepare_full, repeat), params)
+            add_result(results, 'report_stream_' + suffix, measure(prepare_stream, repeat), params)
+            os.remove(path)
+
+
+def create_entries(target_dir, count):
+    """변환 대상(<이름>.doc, <이름>.eof) count쌍을 만듭니다."""
+    for i in range(count):
+        root = os.path.join(target_dir, 'doc{:06d}'.format(i))
+        with open(root + '.doc', 'wb') as f:
+            f.write('x')
+        with open(root + '.eof', 'wb'):
+            pass
+
+
+def age_dir(path):
+    """디렉토리의 수정 시각을 과거로 돌려서 FileLinker가 최근에 바뀐 디렉토리로 취급하지 않도록 합니다."""
+    past = time.time() - 60
+    os.utime(path, (past, past))
+
+
+def create_linker(work_dir):
+    linker = FileLinker()
+    linker.set_target_dir(os.path.join(work_dir, 'target'))
+    linker.set_result_dir(os.path.join(work_dir, 'result'))
+    linker.set_error_dir(os.path.join(work_dir, 'error'))
+    return linker
+
+
+def remove_ing(target_dir, file_paths):
+    for file_path in file_paths:
+        if file_path:
+            os.remove(os.path.splitext(file_path)[0] + '.ing')
+    age_dir(target_dir)
+
+
+def bench_linker_get(work_dir, counts, repeat, results):
+    target_dir = os.path.join(work_dir, 'target')
+    for count in counts:
+        shutil.rmtree(target_dir, True)
+        os.makedirs(target_dir)
+        create_entries(target_dir, count)
+        age_dir(target_dir)
+        params = {'entries': count}
+        calls = min(100, count)
+
+        def prepare_first():
+            linker = create_linker(work_dir)
+            def run():
+                file_path = linker.get()
+                return lambda: remove_ing(target_dir, [file_path])
+            return run
+        add_result(results, 'linker_get_first_{}'.format(count), measure(prepare_first, repeat), params)
+
+        def prepare_next():
+            linker = create_linker(work_dir)
+            first = linker.get()
+            def run():
+                file_paths = [linker.get() for i in range(calls)]
+                return lambda: remove_ing(target_dir, [first] + file_paths)
+            return run
+        best, median = measure(prepare_next, repeat)
+        add_result(results, 'linker_get_next_{}'.format(count), (best / calls, median / calls), params)
+
+        # 모든 대상에 .ing 파일이 있는 상태에서 조회 (대상이 없을 때 반복해서 호출되는 경우)
+        linker = create_linker(work_dir)
+        claimed = linker.get_many(count)
+        age_dir(target_dir)
+        def prepare_idle():
+            idle_linker = create_linker(work_dir)
+            idle_linker.get()
+            return lambda: [idle_linker.get() for i in range(calls)] and None
+        best, median = measure(prepare_idle, repeat)
+        add_result(results, 'linker_get_idle_{}'.format(count), (best / calls, median / calls), params)
+        remove_ing(target_dir, claimed)
+
+    shutil.rmtree(target_dir, True)
+
+
+def bench_linker_result(work_dir, payload_sizes, repeat, results):
+    target_dir = os.path.join(work_dir, 'target')
+    result_dir = os.path.join(work_dir, 'result')
+    for path in [target_dir, result_dir]:
+        shutil.rmtree(path, True)
+        os.makedirs(path)
+    linker = create_linker(work_dir)
+
+    def prepare_origin():
+        create_entries(target_dir, 1)
+        origin = os.path.join(target_dir, 'doc000000.doc')
+        with open(os.path.join(target_dir, 'doc000000.ing'), 'wb'):
+            pass
+        return origin
+
+    def clear_results():
+        for path in [target_dir, result_dir, os.path.join(work_dir, 'error')]:
+            for name in os.listdir(path):
+                os.remove(os.path.join(path, name))
+
+    for size_mb in payload_sizes:
+        payload = os.urandom(size_mb * MB)
+        params = {'payload_mb': size_mb}
+
+        def prepare_bytes():
+            origin = prepare_origin()
+            return lambda: linker.success(origin, payload) or clear_results
+        add_result(results, 'linker_success_bytes_{}mb'.format(size_mb), measure(prepare_bytes, repeat), params)
+
+        def prepare_result_file():
+            origin = prepare_origin()
+            result_file = linker.create_result_file()
+            result_file.write(payload)
+            return lambda: linker.success(origin, result_file) or clear_results
+        add_result(results, 'linker_success_result_file_{}mb'.format(size_mb), measure(prepare_result_file, repeat), params)
+
+    def prepare_fail():
+        origin = prepare_origin()
+        return lambda: linker.fail(origin, '30001') or clear_results
+    add_result(results, 'linker_fail', measure(prepare_fail, repeat * 10), {})
+
+
+def compare_parse_modes(results):
+    """같은 레포트에서 stream 모드가 full 모드보다 느린 항목의 이름 목록을 반환합니다. (중앙값 기준)"""
+    slower = []
+    print('')
+    print('{:<45} {:>12} {:>12} {:>8}'.format('report', 'full', 'stream', 'ratio'))
+    for name in sorted(results):
+        if not name.startswith('report_full_'):
+            continue
+        suffix = name[len('report_full_'):]
+        full = results[name]['median']
+        stream = results['report_stream_' + suffix]['median']
+        ratio = stream / full if full > 0 else 1.0
+        mark = ''
+        if ratio > 1:
+            slower.append('report_stream_' + suffix)
+            mark = '  <== stream이 느림'
+        print('{:<45} {:>11.6f}s {:>11.6f}s {:>7.2f}x{}'.format(suffix, full, stream, ratio, mark))
+    return slower
+
+
+def add_result(results, name, times, params):
+    best, median = times
+    results[name] = {'min': best, 'median': median, 'params': params}
+    print('{:<45} min {:>10.6f}s  median {:>10.6f}s'.format(name, best, median))
+    sys.stdout.flush()
+
+
+def get_meta():
+    meta = {'python': platform.python_version(), 'platform': platform.platform(), 'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+    try:
+        meta['commit'] = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd = BENCHMARK_DIR,
+                                                 stderr = open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return meta
+
+
+def compare(results, baseline, threshold):
+    """기준값과 비교하여 threshold 이상 느려진 항목의 이름 목록을 반환합니다. (중앙값 기준)"""
+    regressions = []
+    print('')
+    print('{:<45} {:>12} {:>12} {:>8}'.format('name', 'baseline', 'current', 'ratio'))
+    for name in sorted(results):
+        if not name in baseline:
+            continue
+        base = baseline[name]['median']
+        current = results[name]['median']
+        ratio = current / base if base > 0 else 1.0
+        mark = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            mark = '  <== 느려짐'
+        print('{:<45} {:>11.6f}s {:>11.6f}s {:>7.2f}x{}'.format(name, base, current, ratio, mark))
+    return regressions
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description = 'doc_conv_agent 마이크로 벤치마크')
+    parser.add_argument('--only', choices = ['report', 'linker'], help = '지정한 항목만 측정')
+    parser.add_argument('--large', action = 'store_true', help = '100 MB·500 MB 레포트, 100,000개 디렉토리, 100 MB 결과 파일 포함')
+    parser.add_argument('--check-stream', action = 'store_true',
+                        help = 'stream 모드가 full 모드보다 느린 레포트가 있으면 종료 코드 1을 반환함')
+    parser.add_argument('--repeat', type = int, default = 3, help = '항목별 반복 횟수')
+    parser.add_argument('--save', default = '', help = '측정 결과를 저장할 JSON 파일 경로')
+    parser.add_argument('--compare', default = '', help = '비교할 기준값 JSON 파일 경로')
+    parser.add_argument('--threshold', type = float, default = 0.2, help = '느려진 것으로 판단할 비율 (0.2 = 20%%)')
+    parser.add_argument('--work-dir', default = '', help = '작업 디렉토리 (지정하지 않으면 임시 디렉토리 사용)')
+    return parser
+
+
+def main(argv):
+    options = create_parser().parse_args(argv)
+    logging.getLogger().addHandler(logging.NullHandler()) # 시그니처 검출 등의 에러 로그는 출력하지 않음.
+
+    report_sizes = [1, 10] + ([100, 500] if options.large else [])
+    dir_counts = [100, 1000, 10000] + ([100000] if options.large else [])
+    payload_sizes = [1, 10] + ([100] if options.large else [])
+
+    work_dir = options.work_dir or tempfile.mkdtemp(prefix = 'doc_conv_micro_')
+    for name in ['target', 'result', 'error']:
+        if not os.path.isdir(os.path.join(work_dir, name)):
+            os.makedirs(os.path.join(work_dir, name))
+
+    results = {}
+    slower_streams = []
+    try:
+        if options.only in (None, 'report'):
+            bench_report(work_dir, report_sizes, [0, 100], options.repeat, results)
+            slower_streams = compare_parse_modes(results)
+        if options.only in (None, 'linker'):
+            bench_linker_get(work_dir, dir_counts, options.repeat, results)
+            bench_linker_result(work_dir, payload_sizes, options.repeat, results)
+    finally:
+        if not options.work_dir:
+            shutil.rmtree(work_dir, True)
+
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump({'meta': get_meta(), 'results': results}, f, indent = 4, sort_keys = True)
+        print('saved: {}'.format(options.save))
+
+    if options.compare:
+        with open(options.compare, 'r') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, options.threshold)
+        if regressions:
+            print('{}개 항목이 기준값보다 {:.0f}% 이상 느려졌습니다.'.format(len(regressions), options.threshold * 100))
+            return 1
+
+    if options.check_stream and slower_streams:
+        print('{}개 레포트에서 stream 모드가 full 모드보다 느립니다.'.format(len(slower_streams)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,220 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""운영 중에 남긴 부하 기록([Trace] CaptureFile)대로 TargetDir에 파일을 만들어 같은 부하를 다시 만듭니다.
+ - 도착 간격을 그대로(--speed 1) 혹은 빠르게/느리게(--speed 2 = 두 배 빠르게) 재현합니다.
+ - 파일의 크기와 확장자는 기록과 같고, 내용은 파일마다 다릅니다. (캐시/작업 합치기의 영향을 받지 않도록)
+ - --mark-outcomes를 지정하면 파일 앞부분에 기록된 결과를 표시하여 가짜 쿠쿠 서버(fake_cuckoo.py)가 같은 결과를 내도록 합니다.
+   (시그니처 발견은 같은 에러 코드로 재현되며, 그 밖의 실패는 가짜 쿠쿠 서버의 에러로 재현되므로 에러 코드는 다를 수 있음)
+
+가짜 쿠쿠 서버와 에이전트까지 함께 띄워서 측정하려면 run_benchmark.py --trace 를 사용합니다.
+
+사용 예: python replay_trace.py capture.tsv --target-dir /data/target --speed 2
+         python replay_trace.py capture.tsv --summary
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+BENCHMARK_DIR = os.path.dirname(os.path.realpath(__file__))
+AGENT_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), 'doc_conv_agent')
+sys.path.insert(0, AGENT_DIR)
+
+from load_trace import read_records
+from fake_cuckoo import OUTCOME_MARKER
+
+DEFAULT_SIZE = 20 * 1024 # 크기가 기록되지 않은 경우 (재시작 전에 가져온 작업 등)
+DEFAULT_EXT = 'doc'
+UNSUPPORTED_RESULT = '10000' # 지원하지 않는 확장자 (에이전트가 쿠쿠에 보내지 않음)
+SIGNATURE_RESULT = '30001'
+
+
+def fake_outcome(result):
+    """부하 기록의 결과를 가짜 쿠쿠 서버의 결과 표시로 바꿉니다. 쿠쿠까지 가지 않는 결과이면 None."""
+    if result == '0':
+        return 'success'
+    if result == SIGNATURE_RESULT:
+        return 'signature'
+    if result == UNSUPPORTED_RESULT:
+        return None
+    return 'error'
+
+
+def get_supported_exts(records):
+    """부하 기록에서 에이전트가 지원한 확장자 목록 (SupportFilenameExtensions 설정용)"""
+    exts = set(record['ext'] or DEFAULT_EXT for record in records if record['result'] != UNSUPPORTED_RESULT)
+    return sorted(exts)
+
+
+class TraceReplayer:
+    """부하 기록에 남은 도착 간격대로 TargetDir에 파일과 .eof 파일을 만듭니다.
+    (run_benchmark.py의 FileFeeder와 같은 방식으로 사용합니다.)
+    """
+    def __init__(self, target_dir, records, speed = 1.0, mark_outcomes = False, seed = None):
+        self.target_dir = target_dir
+        self.records = records
+        self.mark_outcomes = mark_outcomes
+        first = records[0]['arrived_time'] if records else 0
+        self.offsets = [(record['arrived_time'] - first) / speed for record in records]
+        self.count = len(records)
+        self.created = 0
+        self.arrived_times = {} # 확장자를 제외한 파일명 -> .eof 파일을 만든 시각
+        rand = random.Random(seed)
+        self.block = ''.join(chr(rand.randint(0, 255)) for i in range(64 * 1024))
+
+    def create_one(self):
+        record = self.records[self.created]
+        root = 'replay{:07d}'.format(self.created)
+        ext = record['ext'] or DEFAULT_EXT
+        size = record['size'] if record['size'] is not None else DEFAULT_SIZE
+
+        # 내용이 모두 다르도록 앞부분에 파일명을 기록함.
+        head = root + '\n'
+        outcome = fake_outcome(record['result'])
+        if self.mark_outcomes and outcome:
+            head += OUTCOME_MARKER + outcome + '\n'
+        remaining = max(size - len(head), 0)
+        with open(os.path.join(self.target_dir, root + '.' + ext), 'wb') as f:
+            f.write(head)
+            while remaining > 0:
+                data = self.block[:remaining]
+                f.write(data)
+                remaining -= len(data)
+        with open(os.path.join(self.target_dir, root + '.eof'), 'w') as f:
+            pass
+        self.arrived_times[root] = time.time()
+        self.created += 1
+
+    def feed(self, start_time, now):
+        """start_time부터 지금까지 도착했어야 하는 파일을 만듭니다."""
+        while self.created < self.count and self.offsets[self.created] <= now - start_time:
+            self.create_one()
+
+    def time_until_next(self, start_time, now):
+        """다음 파일을 만들 때까지 남은 시간. 모두 만들었으면 None."""
+        if self.done():
+            return None
+        return max(self.offsets[self.created] - (now - start_time), 0)
+
+    def done(self):
+        return self.created >= self.count
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(int(round(p / 100.0 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def summarize(records):
+    """부하 기록의 요약 (건수, 기간, 확장자/결과별 건수, 크기와 처리 시간의 백분위수)"""
+    if not records:
+        return {'jobs': 0}
+    span = records[-1]['arrived_time'] - records[0]['arrived_time']
+    exts = {}
+    results = {}
+    for record in records:
+        exts[record['ext']] = exts.get(record['ext'], 0) + 1
+        results[record['result']] = results.get(record['result'], 0) + 1
+    sizes = [record['size'] for record in records if record['size'] is not None]
+    durations = [record['duration'] for record in records]
+    # 1초 동안 가장 많이 도착한 건수 (몰림 정도)
+    peak = 0
+    begin = 0
+    for end in range(len(records)):
+        while records[end]['arrived_time'] - records[begin]['arrived_time'] >= 1.0:
+            begin += 1
+        peak = max(peak, end - begin + 1)
+    return {'jobs': len(records),
+            'span_seconds': span,
+            'jobs_per_second': len(records) / span if span > 0 else None,
+            'peak_jobs_per_second': peak,
+            'exts': exts,
+            'results': results,
+            'size_bytes': dict(('p{}'.format(p), percentile(sizes, p)) for p in [50, 90, 99, 100]),
+            'duration_seconds': dict(('p{}'.format(p), percentile(durations, p)) for p in [50, 90, 95, 99, 100])}
+
+
+def print_summary(summary):
+    print('jobs: {}'.format(summary['jobs']))
+    if not summary['jobs']:
+        return
+    print('span: {:.1f}s, average: {}, peak: {} jobs/s'.format(
+            summary['span_seconds'],
+            '{:.2f} jobs/s'.format(summary['jobs_per_second']) if summary['jobs_per_second'] else '-',
+            summary['peak_jobs_per_second']))
+    print('exts: ' + ', '.join('{}={}'.format(k or '-', v) for k, v in sorted(summary['exts'].items())))
+    print('results: ' + ', '.join('{}={}'.format(k, v) for k, v in sorted(summary['results'].items())))
+    print('size: ' + ', '.join('{}={}'.format(k, v) for k, v in _by_percentile(summary['size_bytes'])))
+    print('duration: ' + ', '.join('{}={:.2f}s'.format(k, v) for k, v in _by_percentile(summary['duration_seconds'])))
+
+
+def _by_percentile(values):
+    return sorted(values.items(), key = lambda item: int(item[0][1:]))
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description = '부하 기록 재현')
+    parser.add_argument('trace', help = '부하 기록 파일 ([Trace] CaptureFile)')
+    parser.add_argument('--target-dir', default = '', help = '파일을 만들 디렉토리 (에이전트의 TargetDir)')
+    parser.add_argument('--speed', type = float, default = 1.0, help = '재현 속도 (2 = 두 배 빠르게)')
+    parser.add_argument('--limit', type = int, default = 0, help = '앞에서부터 재현할 작업 수 (0이면 모두)')
+    parser.add_argument('--mark-outcomes', action = 'store_true', help = '가짜 쿠쿠 서버가 기록과 같은 결과를 내도록 표시함')
+    parser.add_argument('--summary', action = 'store_true', help = '부하 기록의 요약만 출력함')
+    return parser
+
+
+def main(argv):
+    options = create_parser().parse_args(argv)
+    records = read_records(options.trace)
+    if options.limit:
+        records = records[:options.limit]
+    print_summary(summarize(records))
+    if options.summary:
+        return 0
+    if not options.target_dir:
+        print('--target-dir를 지정해야 합니다.')
+        return 1
+
+    replayer = TraceReplayer(options.target_dir, records, options.speed, options.mark_outcomes)
+    start_time = time.time()
+    while not replayer.done():
+        replayer.feed(start_time, time.time())
+        wait = replayer.time_until_next(start_time, time.time())
+        if wait:
+            time.sleep(min(wait, 1.0))
+        if replayer.created % 1000 == 0 or replayer.done():
+            sys.stdout.write('\rreplayed: {}/{} ({:.1f}s)'.format(replayer.created, replayer.count, time.time() - start_time))
+            sys.stdout.flush()
+    print('')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,306 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""가짜 쿠쿠 서버(fake_cuckoo.py)를 띄우고 doc_conv_agent로 대량의 파일을 변환하여 처리량을 측정합니다.
+ - 처리량: 작업자 시작부터 마지막 결과가 나올 때까지 초당 처리한 파일 수
+ - 지연 시간: .eof 파일을 만든 시각부터 결과 .eof 파일이 생긴 시각까지 (백분위수)
+ - 최대 메모리 사용량: 에이전트 프로세스(들)의 VmHWM (리눅스 전용)
+
+fake_cuckoo.py의 옵션(--machines, --run-time, --report-size 등)은 그대로 넘겨줍니다.
+에이전트 설정은 --set 섹션.항목=값 으로 바꿀 수 있습니다.
+--trace를 지정하면 무작위로 파일을 만드는 대신 운영 중에 남긴 부하 기록([Trace] CaptureFile)을 재현합니다. (replay_trace.py 참고)
+
+사용 예: python run_benchmark.py --files 2000 --engine thread --machines 16 --run-time 2 --report-time 0.5 \\
+            --set ConvertResultProcessor.ExpectedDuration=default:2 --json result.json
+        python run_benchmark.py --trace capture.tsv --speed 4 --machines 16 --run-time 2 --json result.json
+"""
+
+import os
+import sys
+import time
+import json
+import shutil
+import random
+import argparse
+import tempfile
+import subprocess
+import urllib2
+
+from replay_trace import TraceReplayer, read_records, get_supported_exts, summarize, percentile
+
+BENCHMARK_DIR = os.path.dirname(os.path.realpath(__file__))
+AGENT_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), 'doc_conv_agent')
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description = 'doc_conv_agent 처리량 측정',
+                                     epilog = '그 밖의 옵션은 fake_cuckoo.py로 넘겨줍니다. (python fake_cuckoo.py --help 참고)')
+    parser.add_argument('--files', type = int, default = 1000, help = '변환할 파일 수')
+    parser.add_argument('--size', type = int, default = 20 * 1024, help = '파일 하나의 평균 크기 (바이트)')
+    parser.add_argument('--ext', default = 'doc,docx,xls,ppt', help = '파일 확장자 목록 (무작위로 고름)')
+    parser.add_argument('--rate', type = float, default = 0, help = '초당 생성할 파일 수 (0이면 시작 전에 모두 생성함)')
+    parser.add_argument('--trace', default = '', help = '재현할 부하 기록 파일 (지정하면 --files, --size, --ext, --rate는 무시함)')
+    parser.add_argument('--speed', type = float, default = 1.0, help = '부하 기록의 재현 속도 (2 = 두 배 빠르게)')
+    parser.add_argument('--engine', default = 'process', choices = ['process', 'thread'], help = '[Engine] Mode')
+    parser.add_argument('--port', type = int, default = 18090, help = '가짜 쿠쿠 서버의 포트')
+    parser.add_argument('--timeout', type = float, default = 600, help = '최대 측정 시간 (초)')
+    parser.add_argument('--set', action = 'append', default = [], metavar = 'SECTION.OPTION=VALUE',
+                        help = '에이전트 설정 변경 (여러 번 지정 가능)')
+    parser.add_argument('--json', default = '', help = '결과를 JSON으로 저장할 경로')
+    parser.add_argument('--work-dir', default = '', help = '작업 디렉토리 (지정하지 않으면 임시 디렉토리를 만들고 끝나면 삭제함)')
+    return parser
+
+
+def start_fake_cuckoo(port, fake_args):
+    command = [sys.executable, os.path.join(BENCHMARK_DIR, 'fake_cuckoo.py'), '--port', str(port)] + fake_args
+    process = subprocess.Popen(command)
+    url = 'http://127.0.0.1:{}/cuckoo/status'.format(port)
+    for i in range(100):
+        if process.poll() is not None:
+            raise RuntimeError('가짜 쿠쿠 서버를 시작하지 못했습니다. (종료 코드: {})'.format(process.returncode))
+        try:
+            urllib2.urlopen(url, timeout = 1).read()
+            return process
+        except Exception:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('가짜 쿠쿠 서버가 응답하지 않습니다.')
+
+
+class FileFeeder:
+    """TargetDir에 변환할 파일과 .eof 파일을 만듭니다.
+    @param rate: 초당 만들 파일 수. 0이면 처음에 모두 만듦.
+    """
+    def __init__(self, target_dir, count, size, exts, rate = 0, seed = None):
+        self.target_dir = target_dir
+        self.count = count
+        self.size = size
+        self.exts = exts
+        self.rate = rate
+        self.random = random.Random(seed)
+        self.created = 0
+        self.arrived_times = {} # 확장자를 제외한 파일명 -> .eof 파일을 만든 시각
+        self.block = ''.join(chr(self.random.randint(0, 255)) for i in range(64 * 1024))
+
+    def create_one(self):
+        root = 'bench{:07d}'.format(self.created)
+        ext = self.random.choice(self.exts)
+        size = max(int(self.random.expovariate(1.0 / self.size)), 16)
+        # 내용이 모두 다르도록 앞부분에 파일명을 기록함. (캐시/작업 합치기의 영향을 받지 않도록)
+        data = root + '\n' + (self.block * (size // len(self.block) + 1))[:size]
+        with open(os.path.join(self.target_dir, root + '.' + ext), 'wb') as f:
+            f.write(data)
+        with open(os.path.join(self.target_dir, root + '.eof'), 'w') as f:
+            pass
+        self.arrived_times[root] = time.time()
+        self.created += 1
+
+    def feed(self, start_time, now):
+        """rate에 맞추어 지금까지 만들어야 하는 파일을 만듭니다. rate가 0이면 모두 만듭니다."""
+        target = self.count if not self.rate else min(int((now - start_time) * self.rate) + 1, self.count)
+        while self.created < target:
+            self.create_one()
+
+    def done(self):
+        return self.created >= self.count
+
+
+class ResultCollector:
+    """ResultDir에 생기는 결과 .eof 파일을 모아 지연 시간과 에러 코드를 기록합니다."""
+    def __init__(self, result_dir):
+        self.result_dir = result_dir
+        self.seen = set()
+        self.finished_times = {} # 확장자를 제외한 파일명 -> 결과 .eof 파일이 생긴 시각
+        self.results = {} # 확장자를 제외한 파일명 -> .eof 파일의 내용 ('0'이면 성공, 그 외는 에러 코드)
+
+    def collect(self):
+        for name in os.listdir(self.result_dir):
+            if name in self.seen or not name.endswith('.eof'):
+                continue
+            path = os.path.join(self.result_dir, name)
+            try:
+                with open(path, 'r') as f:
+                    content = f.read().strip()
+                finished_time = os.path.getmtime(path)
+            except (IOError, OSError):
+                continue
+            if not content:
+                continue # 아직 기록 중
+            self.seen.add(name)
+            root = name[:-len('.eof')]
+            self.finished_times[root] = finished_time
+            self.results[root] = content
+        return len(self.seen)
+
+
+def read_peak_rss(pid):
+    """프로세스의 최대 메모리 사용량(VmHWM)을 반환합니다. (단위: KB) 알 수 없으면 0."""
+    try:
+        with open('/proc/{}/status'.format(pid), 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (IOError, ValueError):
+        pass
+    return 0
+
+
+def build_conf(agent, options, fake_args, work_dir, exts):
+    conf = agent.load_config()
+    conf['Path'].update({'TargetDir': os.path.join(work_dir, 'target'),
+                         'ResultDir': os.path.join(work_dir, 'result'),
+                         'ErrorDir': os.path.join(work_dir, 'error')})
+    conf['DocConverter']['SandboxRestApiUrlRoot'] = 'http://127.0.0.1:{}'.format(options.port)
+    conf['DocConverter']['SupportFilenameExtensions'] = ','.join(exts)
+    if '--reference' in fake_args or '--conversion' in fake_args:
+        conf['DocConverter']['ConvertedFileUrlRoot'] = 'http://127.0.0.1:{}/analyses'.format(options.port)
+    conf.setdefault('Journal', {})['Path'] = os.path.join(work_dir, 'journal.db')
+    conf.setdefault('Cache', {})['CacheDir'] = os.path.join(work_dir, 'cache')
+    conf.setdefault('Engine', {})['Mode'] = options.engine
+
+    for item in options.set:
+        key, value = item.split('=', 1)
+        section, option = key.split('.', 1)
+        conf.setdefault(section, {})[option] = value
+    return conf
+
+
+def run(options, fake_args):
+    work_dir = options.work_dir or tempfile.mkdtemp(prefix = 'doc_conv_bench_')
+    for name in ['target', 'result', 'error', 'cache']:
+        path = os.path.join(work_dir, name)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    # 에이전트 모듈은 import할 때 로그 디렉토리가 있어야 함.
+    if not os.path.isdir(os.path.join(AGENT_DIR, 'log')):
+        os.makedirs(os.path.join(AGENT_DIR, 'log'))
+    sys.path.insert(0, AGENT_DIR)
+    import doc_conv_agent as agent
+
+    records = None
+    if options.trace:
+        records = read_records(options.trace)
+        exts = get_supported_exts(records)
+    else:
+        exts = [x.strip() for x in options.ext.split(',')]
+
+    conf = build_conf(agent, options, fake_args, work_dir, exts)
+    fake = start_fake_cuckoo(options.port, fake_args)
+    workers = []
+    e = None
+    try:
+        target_dir = conf['Path']['TargetDir']
+        if records is not None:
+            feeder = TraceReplayer(target_dir, records, options.speed, mark_outcomes = True)
+        else:
+            feeder = FileFeeder(target_dir, options.files, options.size, exts, options.rate)
+            if not options.rate:
+                feeder.feed(0, 0)
+
+        collector = ResultCollector(conf['Path']['ResultDir'])
+        agent.recover_journal(conf)
+        e, workers = agent.create_workers(conf)
+
+        start_time = time.time()
+        for worker in workers:
+            worker.start()
+        pids = [os.getpid()] + [worker.pid for worker in workers if getattr(worker, 'pid', None)]
+
+        peak_rss = dict((pid, 0) for pid in pids)
+        while collector.collect() < feeder.count and time.time() - start_time < options.timeout:
+            feeder.feed(start_time, time.time())
+            for pid in pids:
+                peak_rss[pid] = max(peak_rss[pid], read_peak_rss(pid))
+            time.sleep(0.1)
+        end_time = time.time()
+    finally:
+        if e:
+            e.clear()
+        for worker in workers:
+            worker.join()
+        fake.terminate()
+        fake.wait()
+
+    latencies = [collector.finished_times[root] - feeder.arrived_times[root]
+                 for root in collector.finished_times if root in feeder.arrived_times]
+    errors = {}
+    for root, content in collector.results.items():
+        if content != '0':
+            errors[content] = errors.get(content, 0) + 1
+    finished = len(collector.results)
+    elapsed = (max(collector.finished_times.values()) if collector.finished_times else end_time) - start_time
+
+    result = {'engine': options.engine,
+              'files': feeder.count,
+              'finished': finished,
+              'succeeded': finished - sum(errors.values()),
+              'errors': errors,
+              'elapsed_seconds': elapsed,
+              'jobs_per_second': finished / elapsed if elapsed > 0 else 0,
+              'latency_seconds': dict(('p{}'.format(p), percentile(latencies, p)) for p in [50, 90, 95, 99, 100]),
+              'peak_rss_kb': {'max_process': max(peak_rss.values()), 'sum': sum(peak_rss.values())},
+              'fake_cuckoo_args': fake_args,
+              'agent_conf_overrides': options.set}
+    if records is not None:
+        # 운영 중의 결과와 비교할 수 있도록 부하 기록의 요약을 함께 남김.
+        result['trace'] = {'path': options.trace, 'speed': options.speed, 'summary': summarize(records)}
+
+    if not options.work_dir:
+        shutil.rmtree(work_dir, True)
+    return result
+
+
+def print_result(result):
+    print('')
+    print('engine: {engine}, files: {files}, finished: {finished} (succeeded: {succeeded}, errors: {errors})'.format(**result))
+    print('elapsed: {:.1f}s, throughput: {:.2f} jobs/s'.format(result['elapsed_seconds'], result['jobs_per_second']))
+    latency = result['latency_seconds']
+    if latency['p50'] is not None:
+        print('latency: p50 {p50:.2f}s, p90 {p90:.2f}s, p95 {p95:.2f}s, p99 {p99:.2f}s, max {p100:.2f}s'.format(**latency))
+    print('peak RSS: {max_process} KB (largest process), {sum} KB (sum of processes)'.format(**result['peak_rss_kb']))
+    if 'trace' in result:
+        trace = result['trace']['summary']
+        if trace['jobs']:
+            print('trace ({}, speed x{}): results {}, latency p50 {p50:.2f}s, p95 {p95:.2f}s, p99 {p99:.2f}s'.format(
+                    result['trace']['path'], result['trace']['speed'], trace['results'], **trace['duration_seconds']))
+    if result['engine'] == 'thread':
+        print('  (thread 모드에서는 측정 스크립트와 에이전트가 같은 프로세스에서 동작하므로 측정 스크립트의 메모리도 포함됨)')
+
+
+def main(argv):
+    options, fake_args = create_parser().parse_known_args(argv)
+    result = run(options, fake_args)
+    print_result(result)
+    if options.json:
+        with open(options.json, 'w') as f:
+            json.dump(result, f, indent = 4, sort_keys = True)
+    if result['finished'] < result['files']:
+        print('제한 시간 안에 모든 파일을 처리하지 못했습니다.')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
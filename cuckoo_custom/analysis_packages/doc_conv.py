@@ -17,16 +17,22 @@
 
 
 import os
-import re
+import json
 import time
+import zipfile
+import tempfile
 
-import _winreg
-import win32ui, dde # pywin32 설치 필요
-
+from lib.api.process import Process
 from lib.common.abstracts import Package
 from lib.common.exceptions import CuckooPackageError
 from lib.common.results import upload_to_host
 
+# 인쇄 명령 조회 및 DDE 연결 (이 파일과 같은 디렉토리에 복사해야 함)
+from print_command import (DEFAULT_TABLE_PATH, WinRegistry, PrintCommandResolver, DdeClient,
+                           load_table, split_command, connect_dde)
+# 인쇄 감시 (이 파일과 같은 디렉토리에 복사해야 함)
+from print_watchdog import WinProbe, PrintWatchdog
+
 import logging
 log = logging.getLogger(__name__)
 
@@ -34,128 +40,47 @@ log = logging.getLogger(__name__)
 class DocConv(Package):
     """Document converting analysis package."""
 
+    # 배치 작업(options에 batch=yes)인 경우 zip 파일에서 풀어낸 문서들의 경로 목록. 일반 작업이면 None.
+    batch = None
+    # 확장자별 인쇄 명령 (PrintCommandResolver, 처음 사용할 때 만듦)
+    print_commands = None
+    # DDE 서버에 명령을 보낼 때 사용하는 DdeClient (처음 사용할 때 만들며, 배치 작업에서는 문서마다 재사용함)
+    dde_client = None
+    # 인쇄 중인 문서의 PrintWatchdog (분석 옵션 watchdog=no이면 사용하지 않음)
+    watchdog = None
+    # 감시기가 판단한 실패 원인 (print_watchdog.VIEWER_EXITED 등). 실패하지 않았으면 None.
+    failure = None
+
     def get_converted_file_path(self):
         return r'c:\converted'
 
-    def get_reg_value(self, key, sub_key, value_name):
-        """ 지정된 경로로부터 레지스트리 값을 가져옵니다.
-
-        @param key: 레지스트리키 (HKEY_CLASSES_ROOT와 같이 사전에 정의된 키, 혹은 이미 열려 있는 키)
-        @param sub_key: 하위 레지스트리키
-        @param value_name: 값을 가져올 변수의 이름. (빈문자열일 경우 기본값에 저장된 값을 반환)
-        @return: 변수의 값. 값이 없거나 해당 경로(레지스트리키)가 존재하지 않을 경우 빈문자열.
-        """
-        value = ''
-        hkey = None
-        try:
-            hkey = _winreg.OpenKey(key, sub_key)
-            value, value_type = _winreg.QueryValueEx(hkey, value_name)
-        except WindowsError:
-            pass
-        finally:
-            if hkey:
-                _winreg.CloseKey(hkey)
-                hkey = None
-        return value
-
     def get_print_command(self, extension):
         """ 쉘에서 인쇄 명령(print verb) 실행 시 수행되는 명령어를 찾습니다.
+        스냅샷을 만들 때 print_command.py로 미리 만든 목록(분석 옵션 print_command_table, 기본값: DEFAULT_TABLE_PATH)에서
+        먼저 찾고, 목록에 없으면 레지스트리를 조회합니다.
 
         @param extension: 파일 확장자. (맨 앞에 .을 포함하든 하지 않든 상관 없습니다.) 예: doc, .doc, pdf, .pdf, ...
-
-        @return: 레지스트리에 등록되어 있는 프린트 명령 문자열 정보 dict. 못 찾은 경우 None
-              예시1)
-              {'command': '"c:\\Program Files\\Microsoft Office\\Office12\\EXCEL.EXE" /e',
-               'ddeexec': '[open("%1")][print()][close()]',
-               'application': 'Excel',
-               'topic': 'system'}
-
-              예시2)
-              {'command': '"C:\Program Files (x86)\Adobe\Acrobat Reader DC\Reader\AcroRd32.exe" /p /h "%1"',
-               'ddeexec': '',
-               'application': '',
-               'topic': ''}
+        @return: print_command.lookup_print_command()와 같음. 못 찾은 경우 None
         """
-        extension = extension.lower()
-        if not extension.startswith('.'):
-            extension += '.' + extension
-
-        sub_key = 'Software\\Microsoft\\Windows\\CurrentVersion\\Explorer\\FileExts\\' + \
-                  extension + '\\UserChoice'
-        prog_id = self.get_reg_value(_winreg.HKEY_CURRENT_USER, sub_key, 'ProgId')
-
-        if not prog_id: # if prog_id is empty string
-            sub_key = extension
-            prog_id = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, sub_key, '')
-
-        command = ''
-        dde_command = ''
-        dde_svr_name = ''
-        dde_topic = ''
-
-        # 1차 조사
-        if prog_id:
-            sub_key = prog_id + '\\CurVer'
-            cur_ver = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, sub_key, '')
-            if cur_ver:
-                prog_id = cur_ver
-            sub_key = prog_id + '\\shell\\print\\command'
-            command = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, sub_key, '')
-            sub_key = prog_id + '\\shell\\print\\ddeexec'
-            dde_command = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, sub_key, '')
-            dde_svr_name = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, sub_key + '\\application', '')
-            dde_topic = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, sub_key + '\\topic', '')
-
-        # 2차 조사
-        if not command:
-            sub_key = extension + '\\shell\\print\\command'
-            command = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, sub_key, '')
-            sub_key = extension + '\\shell\\print\\ddeexec'
-            dde_command = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, sub_key, '')
-            dde_svr_name = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, sub_key + '\\application', '')
-            dde_topic = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, sub_key + '\\topic', '')
-
-        # 3차 조사
-        if not command:
-            sub_key = 'SystemFileAssociations\\' + extension + '\\shell\\print\\command'
-            command = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, sub_key, '')
-            sub_key = 'SystemFileAssociations\\' + extension + '\\shell\\print\\ddeexec'
-            dde_command = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, sub_key, '')
-            dde_svr_name = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, sub_key + '\\application', '')
-            dde_topic = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, sub_key + '\\topic', '')
-
-
-        # 추가 조사
-        if not command:
-            sub_key = extension
-            perceived_type = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, sub_key, 'PerceivedType')
-            sub_key_list = []
-            if perceived_type:
-                sub_key_list.append('SystemFileAssociations\\' + perceived_type + '\\shell\\print')
-            sub_key_list.append('*\\shell\\print')
-            sub_key_list.append('AllFilesystemObjects\\shell\\print')
-            sub_key_list.append('Unknown\\shell\\print')
-            for k in sub_key_list:
-                command = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, k + '\\command', '')
-                if command:
-                    dde_command = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, k + '\\ddeexec', '')
-                    dde_svr_name = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, k + '\\ddeexec\\application', '')
-                    dde_topic = self.get_reg_value(_winreg.HKEY_CLASSES_ROOT, k + '\\ddeexec\\topic', '')
-                    break
-
-        if command:
-            cmd_info = {}
-            cmd_info['command'] = command
-            cmd_info['ddeexec'] = dde_command
-            cmd_info['application'] = dde_svr_name
-            cmd_info['topic'] = dde_topic
-            return cmd_info
-        else:
-            return None
+        if self.print_commands is None:
+            table_path = self.options.get('print_command_table', DEFAULT_TABLE_PATH)
+            self.print_commands = PrintCommandResolver(WinRegistry(), load_table(table_path))
+        return self.print_commands.get(extension)
 
     def start(self, path):
         """
-        @param path: 변환(분석)할 문서 파일의 경로
+        @param path: 변환(분석)할 문서 파일의 경로 (배치 작업인 경우 문서들을 묶은 zip 파일의 경로)
+        @return: 프로세스 ID
+        """
+        if self.options.get('batch') == 'yes':
+            return self.start_batch(path)
+        pid = self.print_document(path)
+        self.start_watchdog(pid)
+        return pid
+
+    def print_document(self, path):
+        """문서를 인쇄하는 프로그램을 실행합니다.
+        @param path: 인쇄할 문서 파일의 경로
         @return: 프로세스 ID
         """
         # 확장자에 맞는 인쇄 명령을 찾음.
@@ -166,23 +91,19 @@ class DocConv(Package):
         if not print_cmd:
             raise  CuckooPackageError('Not supported extension: ' + file_ext)
 
+        # 스냅샷에 뷰어가 미리 실행되어 있으면(warm 모드) 새로 실행하지 않고 그 뷰어에 인쇄를 요청함.
+        # (분석 옵션 warm=no로 끌 수 있음)
+        if print_cmd.get('warm') and self.options.get('warm', 'yes') == 'yes':
+            pid = self.print_warm(print_cmd, path)
+            if pid:
+                return pid
+            log.warning('Can not use the warm viewer. Start a new viewer. ({})'.format(print_cmd['warm']))
+
         # 인쇄 명령어에서 실행 프로그램의 경로와 각 파라미터를 분리 시킴.
-        regex = re.compile(r'((?:(?:[^\s"]+)|"(?:""|[^"])*")+)(?:\s|$)')
-        found = regex.findall(print_cmd['command'])
-        if len(found) < 2 :
-            raise CuckooPackageError('Wrong print command: ' + print_cmd['command'])
-
-        # 프로그램 실행 경로
-        execute_path = found[0]
-        if execute_path.startswith('"'):
-            execute_path = execute_path[1:-1] # 양 끝의 "(큰따옴표)를 제거함.
-
-        # 프로그램 파라미터
-        execute_param = []
-        for param in found[1:]:
-            if param.startswith('"') and param.endswith('"'):
-                param = param[1:-1] # 양 끝의 "(큰따옴표)를 제거함.
-            execute_param.append(param.replace('%1', '{}'.format(path)))
+        try:
+            execute_path, execute_param = split_command(print_cmd['command'], path)
+        except ValueError as e:
+            raise CuckooPackageError(str(e))
 
         pid = self.execute(execute_path, args = execute_param)
 
@@ -195,18 +116,15 @@ class DocConv(Package):
             if not print_cmd['topic']:
                 raise CuckooPackageError('No dde topic. dde info: ' + str(print_cmd))
 
-            time.sleep(5) # dde 서버가 실행되는 동안 기다림
-
+            # 정해진 시간만큼 기다리지 않고, dde 서버가 응답할 때까지 짧은 간격으로 연결을 시도함.
+            # (분석 옵션 dde_timeout: 최대 대기 시간, dde_interval: 재시도 간격. 단위: 초)
             try:
-                log.debug('dde start')
-                server = dde.CreateServer()
-                log.debug('dde server create1')
-                server.Create('PrintClient')
-                log.debug('dde server create2')
-                conversation = dde.CreateConversation(server)
-                log.debug('dde conversation created')
-                conversation.ConnectTo(print_cmd['application'], print_cmd['topic'])
-                log.debug('dde connected')
+                if self.dde_client is None:
+                    self.dde_client = DdeClient()
+                    log.debug('dde client created')
+                conversation = connect_dde(self.dde_client, print_cmd['application'], print_cmd['topic'],
+                                           float(self.options.get('dde_timeout', 15)),
+                                           float(self.options.get('dde_interval', 0.2)))
                 conversation.Exec(print_cmd['ddeexec'].replace('%1', path))
                 log.debug('dde exec.')
             except Exception as e:
@@ -214,9 +132,181 @@ class DocConv(Package):
 
         return pid
 
+    def print_warm(self, print_cmd, path):
+        """스냅샷에 미리 실행해 둔 뷰어(print_command.py --warm)에 DDE로 인쇄를 요청합니다.
+        뷰어가 없거나, 모니터를 주입하지 못했거나, DDE 서버가 응답하지 않으면 None을 반환합니다. (뷰어를 새로 실행해야 함)
+        @return: 뷰어의 프로세스 ID
+        """
+        pid = print_cmd['warm']['pid']
+        process = Process(pid = pid)
+        try:
+            if not process.is_alive():
+                return None
+            # 프로세스 ID가 다른 프로세스에 재사용된 경우는 사용하지 않음.
+            image = os.path.basename(process.get_filepath() or '')
+            if image.lower() != print_cmd['warm']['image'].lower():
+                log.warning('Warm viewer pid {} is not {}. ({})'.format(pid, print_cmd['warm']['image'], image))
+                return None
+            # 새로 실행한 뷰어와 같이 행위를 감시할 수 있도록 모니터를 주입함. (주입하지 못하면 시그니처 검사를 할 수 없으므로 사용하지 않음)
+            process.inject()
+        except Exception as e:
+            log.error('Can not inject the warm viewer. (pid: {}, {})'.format(pid, e))
+            return None
+
+        # 이미 실행 중인 뷰어이므로 오래 기다리지 않음. (분석 옵션 warm_dde_timeout. 단위: 초)
+        try:
+            if self.dde_client is None:
+                self.dde_client = DdeClient()
+            conversation = connect_dde(self.dde_client, print_cmd['application'], print_cmd['topic'],
+                                       float(self.options.get('warm_dde_timeout', 2)),
+                                       float(self.options.get('dde_interval', 0.2)))
+            conversation.Exec(print_cmd['ddeexec'].replace('%1', path))
+        except Exception as e:
+            log.error('Warm viewer does not respond. (pid: {}, {})'.format(pid, e))
+            return None
+
+        log.debug('dde exec. (warm viewer pid: {})'.format(pid))
+        return pid
+
+    def start_watchdog(self, pid):
+        """인쇄하는 뷰어(pid)의 감시를 시작합니다. (이전 문서의 감시는 끝남)
+        분석 옵션 stall_timeout: 뷰어가 실행 중일 때 인쇄가 진행되지 않아도 기다릴 최대 시간 (기본값: 60초)
+                 exit_grace: 뷰어가 모두 종료되거나 인쇄 작업이 에러 상태가 된 후 기다릴 시간 (기본값: 10초)
+                 printer_processes: 가상 프린터의 실행 파일 이름 목록. ;로 구분 (기본값: pdfcreator.exe)
+        """
+        self.watchdog = None
+        if self.options.get('watchdog', 'yes') != 'yes' or not pid:
+            return
+        self.watchdog = PrintWatchdog(WinProbe(), pid, self.get_converted_file_path(),
+                                      float(self.options.get('stall_timeout', 60)),
+                                      float(self.options.get('exit_grace', 10)),
+                                      [name for name in self.options.get('printer_processes', 'pdfcreator.exe').split(';')
+                                       if name])
+
+    def check_watchdog(self):
+        """감시기가 인쇄가 더 이상 진행될 수 없다고 판단했으면 실패 원인을 self.failure에 기록하고 True를 반환합니다."""
+        if self.failure:
+            return True
+        if self.watchdog is None:
+            return False
+        try:
+            self.failure = self.watchdog.check()
+        except Exception as e:
+            # 감시할 수 없으면 쿠쿠의 분석 제한 시간에 맡김.
+            log.error('Watchdog error. ({}) stop watching.'.format(e))
+            self.watchdog = None
+        return bool(self.failure)
+
+    def start_batch(self, path):
+        """zip 파일에 묶인 문서들을 풀어서 첫 번째 문서를 인쇄합니다.
+        나머지 문서는 check()에서 앞 문서의 인쇄가 끝날 때마다(새로운 .eof 파일이 생길 때마다) 하나씩 인쇄합니다.
+        (에이전트는 쿠쿠의 enforce_timeout을 지정하므로, 뷰어가 종료되어도 check()가 False를 반환할 때까지 분석이 계속됨)
+        @return: 첫 번째 문서를 인쇄하는 프로세스 ID
+        """
+        self.batch_dir = os.path.join(os.path.dirname(path), 'doc_conv_batch')
+        self.batch_converted_dir = os.path.join(self.batch_dir, 'converted')
+        if not os.path.isdir(self.batch_converted_dir):
+            os.makedirs(self.batch_converted_dir)
+
+        self.batch = []
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.namelist():
+                file_name = os.path.basename(member) # zip 파일 안의 경로는 무시함.
+                if not file_name:
+                    continue
+                document_path = os.path.join(self.batch_dir, file_name)
+                with open(document_path, 'wb') as document_file:
+                    document_file.write(archive.read(member))
+                self.batch.append(document_path)
+
+        if not self.batch:
+            raise CuckooPackageError('No document in batch file: ' + path)
+
+        self.document_timeout = float(self.options.get('document_timeout', 30))
+        self.batch_index = -1
+        self.batch_results = {} # 문서 이름 -> 변환된 파일의 경로
+        self.seen_eof_files = set(self.list_eof_files()) # 이전 문서들이 만든 .eof 파일 (새로 생긴 것만 확인하기 위함)
+        log.info('Batch: {} documents.'.format(len(self.batch)))
+        return self.print_next_document()
+
+    def get_document_name(self, document_path):
+        """배치 작업 안에서의 문서 이름. (zip 파일 안의 파일명에서 확장자를 뺀 것)"""
+        return os.path.splitext(os.path.basename(document_path))[0]
+
+    def print_next_document(self):
+        """배치 작업의 다음 문서를 인쇄합니다. 인쇄를 시작하지 못한 문서는 건너뜁니다.
+        @return: 프로세스 ID. 남은 문서가 없으면 None.
+        """
+        while self.batch_index + 1 < len(self.batch):
+            self.batch_index += 1
+            self.document_start_time = time.time()
+            document_path = self.batch[self.batch_index]
+            log.debug('Batch: print {} ({}/{})'.format(document_path, self.batch_index + 1, len(self.batch)))
+            try:
+                pid = self.print_document(document_path)
+                self.start_watchdog(pid)
+                return pid
+            except CuckooPackageError as e:
+                log.error('Batch: can not print {}. ({})'.format(document_path, e))
+
+        self.batch_index = len(self.batch) # 모든 문서를 처리함.
+        return None
+
+    def list_eof_files(self):
+        return [file_name for file_name in os.listdir(self.get_converted_file_path())
+                if os.path.splitext(file_name)[-1] == '.eof']
+
+    def collect_converted_file(self):
+        """인쇄 중인 문서의 .eof 파일이 생겼으면 변환된 파일을 문서 이름으로 옮겨 둡니다.
+        (가상 프린터가 문서 제목으로 파일명을 정하는 경우 다음 문서가 같은 이름으로 덮어쓰지 않도록 함)
+        @return: 인쇄가 끝났으면 True
+        """
+        new_eof_files = sorted(set(self.list_eof_files()) - self.seen_eof_files)
+        if not new_eof_files:
+            return False
+        self.seen_eof_files.update(new_eof_files)
+
+        name = self.get_document_name(self.batch[self.batch_index])
+        root, ext = os.path.splitext(new_eof_files[0])
+        converted_file_path = os.path.join(self.get_converted_file_path(), root + '.pdf')
+        if os.path.isfile(converted_file_path):
+            batch_file_path = os.path.join(self.batch_converted_dir, name + '.pdf')
+            os.rename(converted_file_path, batch_file_path)
+            self.batch_results[name] = batch_file_path
+            log.debug('Batch: {} converted. ({})'.format(name, converted_file_path))
+        else:
+            log.error('Batch: eof file exist. But pdf file not exist. (document: {}, path: {})'
+                      .format(name, converted_file_path))
+        return True
+
+    def check_batch(self):
+        """배치 작업의 check(). 인쇄가 끝나면 다음 문서를 인쇄하며, 모든 문서를 처리하면 False를 반환합니다.
+        document_timeout이 지나도 인쇄가 끝나지 않으면 나머지 문서는 인쇄하지 않고 끝냅니다.
+        (늦게 생긴 .eof 파일을 다음 문서의 결과로 잘못 가져가지 않기 위함. 결과가 없는 문서는 에이전트가 하나씩 다시 변환함)
+        """
+        if self.batch_index >= len(self.batch):
+            return False
+
+        if self.collect_converted_file():
+            self.print_next_document()
+        elif self.check_watchdog():
+            log.error('Batch: print failed. ({}: {}) skip remaining {} documents.'
+                      .format(self.failure, self.batch[self.batch_index], len(self.batch) - self.batch_index - 1))
+            self.batch_index = len(self.batch)
+        elif time.time() - self.document_start_time > self.document_timeout:
+            log.error('Batch: print timeout. ({}) skip remaining {} documents.'
+                      .format(self.batch[self.batch_index], len(self.batch) - self.batch_index - 1))
+            self.batch_index = len(self.batch)
+
+        return self.batch_index < len(self.batch)
+
     def check(self):
         """지정된 경로에 ~.eof 파일이 있으면 False를 반환하도록 한다.
+        (배치 작업인 경우 모든 문서의 인쇄가 끝나면 False를 반환함)
         """
+        if self.batch is not None:
+            return self.check_batch()
+
         file_names = os.listdir(self.get_converted_file_path())
         for file_name in file_names:
             ext = os.path.splitext(file_name)[-1]
@@ -224,7 +314,8 @@ class DocConv(Package):
                 log.debug('found eof file. ({})'.format(os.path.join(self.get_converted_file_path(), file_name)))
                 return False
 
-        return True
+        # 뷰어가 비정상 종료되었거나 인쇄가 멈춘 경우 쿠쿠의 분석 제한 시간까지 기다리지 않고 끝냄.
+        return not self.check_watchdog()
 
     def find_converted_file(self):
         file_names = os.listdir(self.get_converted_file_path())
@@ -238,16 +329,44 @@ class DocConv(Package):
                 else:
                     log.error('eof file exist. But pdf file not exist. (path: {})  find another file...'.format(converted_file_path))
 
+    def finish_batch(self):
+        """배치 작업의 변환된 파일들을 converted/<문서 이름>.pdf로 업로드합니다."""
+        # 제한 시간이 지나서 분석이 끝난 경우에도 마지막 문서의 인쇄가 끝났는지 확인함.
+        if self.batch_index < len(self.batch):
+            self.collect_converted_file()
+
+        for name, converted_file_path in sorted(self.batch_results.items()):
+            upload_path = os.path.join('converted', name + '.pdf')
+            upload_to_host(converted_file_path, upload_path)
+        log.info('Batch: {}/{} documents converted.'.format(len(self.batch_results), len(self.batch)))
+        return True
+
     def finish(self):
         Package.finish(self)
 
-        for i in range(0, 60):
+        if self.batch is not None:
+            return self.finish_batch()
+
+        # 변환된 파일이 생길 때까지 최대 finish_timeout(분석 옵션, 기본값: 60초)만큼 기다리되,
+        # 감시기가 인쇄가 더 이상 진행될 수 없다고 판단하면 바로 끝냄.
+        deadline = time.time() + float(self.options.get('finish_timeout', 60))
+        while True:
             converted_file_path = self.find_converted_file()
             if converted_file_path:
                 upload_path = os.path.join('converted', 'result.pdf')
                 upload_to_host(converted_file_path, upload_path)
+                return True
+            if self.check_watchdog() or time.time() >= deadline:
                 break
-            else:
-                time.sleep(1)
+            time.sleep(0.5)
 
+        if self.failure:
+            self.upload_failure()
         return True
+
+    def upload_failure(self):
+        """감시기가 판단한 실패 원인을 converted/watchdog.json으로 업로드합니다. (converted 처리 모듈이 레포트에 넣음)"""
+        failure_path = os.path.join(tempfile.gettempdir(), 'doc_conv_watchdog.json')
+        with open(failure_path, 'w') as failure_file:
+            json.dump({'reason': self.failure}, failure_file)
+        upload_to_host(failure_path, os.path.join('converted', 'watchdog.json'))
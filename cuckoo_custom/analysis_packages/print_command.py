@@ -0,0 +1,373 @@
+# encoding: utf-8
+
+# Copyright (C) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""doc_conv 분석 패키지가 사용하는 인쇄 명령 조회 및 DDE 연결 모듈.
+윈도 전용 모듈(_winreg, win32ui, dde)은 사용할 때만 불러오므로, DictRegistry와 가짜 DDE 객체를 넘겨주면
+리눅스에서도 조회 과정과 재시도 과정을 확인할 수 있습니다.
+
+가상 머신의 스냅샷을 찍기 전에 다음과 같이 실행하면 확장자별 인쇄 명령 목록을 미리 만들어 둡니다.
+(분석할 때마다 레지스트리를 조회하지 않기 위함. 목록에 없는 확장자는 분석할 때 레지스트리를 조회함)
+    python print_command.py c:\\doc_conv\\print_commands.json doc docx xls xlsx ppt pptx
+
+--warm을 함께 지정하면 DDE를 사용하는 뷰어(MS 오피스 등)를 문서 없이 미리 실행해 두고 목록에 프로세스 ID를 기록합니다.
+이 상태로 스냅샷을 찍으면 분석 패키지는 뷰어를 새로 실행하지 않고 실행 중인 뷰어에 인쇄를 요청합니다. (warm 모드)
+    python print_command.py --warm c:\\doc_conv\\print_commands.json doc docx xls xlsx ppt pptx
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import subprocess
+
+import logging
+log = logging.getLogger(__name__)
+
+
+# 미리 만든 인쇄 명령 목록의 기본 경로 (분석 옵션 print_command_table로 바꿀 수 있음)
+DEFAULT_TABLE_PATH = r'c:\doc_conv\print_commands.json'
+
+
+class DdeConnectError(Exception):
+    """제한 시간 안에 DDE 서버에 연결하지 못했음을 의미함."""
+    pass
+
+
+class WinRegistry:
+    """_winreg로 레지스트리 값을 읽습니다."""
+
+    def get_value(self, root, sub_key, value_name):
+        """ 지정된 경로로부터 레지스트리 값을 가져옵니다.
+
+        @param root: 루트 키의 이름 (예: 'HKEY_CLASSES_ROOT', 'HKEY_CURRENT_USER')
+        @param sub_key: 하위 레지스트리키
+        @param value_name: 값을 가져올 변수의 이름. (빈문자열일 경우 기본값에 저장된 값을 반환)
+        @return: 변수의 값. 값이 없거나 해당 경로(레지스트리키)가 존재하지 않을 경우 빈문자열.
+        """
+        import _winreg
+
+        value = ''
+        hkey = None
+        try:
+            hkey = _winreg.OpenKey(getattr(_winreg, root), sub_key)
+            value, value_type = _winreg.QueryValueEx(hkey, value_name)
+        except WindowsError:
+            pass
+        finally:
+            if hkey:
+                _winreg.CloseKey(hkey)
+                hkey = None
+        return value
+
+
+class DictRegistry:
+    """dict에 담긴 값을 레지스트리처럼 읽습니다. (리눅스에서 조회 과정을 확인할 때 사용)"""
+
+    def __init__(self, values):
+        """
+        @param values: (루트 키의 이름, 하위 키, 값 이름) -> 값 dict.
+            예: {('HKEY_CLASSES_ROOT', '.doc', ''): 'Word.Document.8'}
+        """
+        self.values = dict(((root, sub_key.lower(), value_name.lower()), value)
+                           for (root, sub_key, value_name), value in values.items())
+        self.reads = 0 # get_value()가 호출된 횟수
+
+    def get_value(self, root, sub_key, value_name):
+        self.reads += 1
+        return self.values.get((root, sub_key.lower(), value_name.lower()), '')
+
+
+def normalize_extension(extension):
+    """'.DOC', 'doc' 등을 'doc'으로 바꿉니다."""
+    return extension.lower().lstrip('.')
+
+
+def lookup_print_command(registry, extension):
+    """ 쉘에서 인쇄 명령(print verb) 실행 시 수행되는 명령어를 레지스트리에서 찾습니다.
+
+    @param registry: get_value(root, sub_key, value_name) 메소드를 가진 객체 (WinRegistry, DictRegistry)
+    @param extension: 파일 확장자. (맨 앞에 .을 포함하든 하지 않든 상관 없습니다.) 예: doc, .doc, pdf, .pdf, ...
+
+    @return: 레지스트리에 등록되어 있는 프린트 명령 문자열 정보 dict. 못 찾은 경우 None
+          예시1)
+          {'command': '"c:\\Program Files\\Microsoft Office\\Office12\\EXCEL.EXE" /e',
+           'ddeexec': '[open("%1")][print()][close()]',
+           'application': 'Excel',
+           'topic': 'system'}
+
+          예시2)
+          {'command': '"C:\Program Files (x86)\Adobe\Acrobat Reader DC\Reader\AcroRd32.exe" /p /h "%1"',
+           'ddeexec': '',
+           'application': '',
+           'topic': ''}
+    """
+    extension = '.' + normalize_extension(extension)
+    classes_root = 'HKEY_CLASSES_ROOT'
+
+    def read_verb(sub_key):
+        """sub_key(...\\shell\\print) 아래의 (command, ddeexec, application, topic)"""
+        return (registry.get_value(classes_root, sub_key + '\\command', ''),
+                registry.get_value(classes_root, sub_key + '\\ddeexec', ''),
+                registry.get_value(classes_root, sub_key + '\\ddeexec\\application', ''),
+                registry.get_value(classes_root, sub_key + '\\ddeexec\\topic', ''))
+
+    sub_key = 'Software\\Microsoft\\Windows\\CurrentVersion\\Explorer\\FileExts\\' + \
+              extension + '\\UserChoice'
+    prog_id = registry.get_value('HKEY_CURRENT_USER', sub_key, 'ProgId')
+
+    if not prog_id: # if prog_id is empty string
+        prog_id = registry.get_value(classes_root, extension, '')
+
+    command = ''
+
+    # 1차 조사
+    if prog_id:
+        cur_ver = registry.get_value(classes_root, prog_id + '\\CurVer', '')
+        if cur_ver:
+            prog_id = cur_ver
+        command, dde_command, dde_svr_name, dde_topic = read_verb(prog_id + '\\shell\\print')
+
+    # 2차 조사
+    if not command:
+        command, dde_command, dde_svr_name, dde_topic = read_verb(extension + '\\shell\\print')
+
+    # 3차 조사
+    if not command:
+        command, dde_command, dde_svr_name, dde_topic = \
+            read_verb('SystemFileAssociations\\' + extension + '\\shell\\print')
+
+    # 추가 조사
+    if not command:
+        perceived_type = registry.get_value(classes_root, extension, 'PerceivedType')
+        sub_key_list = []
+        if perceived_type:
+            sub_key_list.append('SystemFileAssociations\\' + perceived_type + '\\shell\\print')
+        sub_key_list.append('*\\shell\\print')
+        sub_key_list.append('AllFilesystemObjects\\shell\\print')
+        sub_key_list.append('Unknown\\shell\\print')
+        for k in sub_key_list:
+            command, dde_command, dde_svr_name, dde_topic = read_verb(k)
+            if command:
+                break
+
+    if command:
+        return {'command': command,
+                'ddeexec': dde_command,
+                'application': dde_svr_name,
+                'topic': dde_topic}
+    else:
+        return None
+
+
+def build_table(registry, extensions):
+    """확장자별 인쇄 명령 목록을 만듭니다.
+    @return: 확장자(소문자, . 제외) -> lookup_print_command()의 반환값 dict. (찾지 못한 확장자는 제외)
+    """
+    table = {}
+    for extension in extensions:
+        print_cmd = lookup_print_command(registry, extension)
+        if print_cmd:
+            table[normalize_extension(extension)] = print_cmd
+    return table
+
+
+def save_table(table, path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as table_file:
+        json.dump(table, table_file, indent = 4, sort_keys = True)
+
+
+def load_table(path):
+    """save_table()로 만든 목록을 읽습니다. 목록이 없거나 읽을 수 없으면 빈 dict."""
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, 'r') as table_file:
+            table = json.load(table_file)
+    except (IOError, ValueError) as e:
+        log.warning('Can not load print command table. ({}: {})'.format(path, e))
+        return {}
+    return dict((normalize_extension(ext), print_cmd) for ext, print_cmd in table.items())
+
+
+class PrintCommandResolver:
+    """확장자별 인쇄 명령을 찾습니다.
+    미리 만든 목록에 있으면 그 값을 사용하고, 없으면 레지스트리를 조회한 후 결과를 기억해 둡니다.
+    """
+
+    def __init__(self, registry, table = None):
+        """
+        @param registry: get_value(root, sub_key, value_name) 메소드를 가진 객체 (WinRegistry, DictRegistry)
+        @param table: 미리 만든 목록 (load_table()의 반환값)
+        """
+        self.registry = registry
+        self.table = dict(table or {})
+
+    def get(self, extension):
+        """
+        @return: lookup_print_command()와 같음.
+        """
+        extension = normalize_extension(extension)
+        if not extension in self.table:
+            log.debug('Print command of {} is not in the table. Look up registry.'.format(extension))
+            self.table[extension] = lookup_print_command(self.registry, extension)
+        print_cmd = self.table[extension]
+        if print_cmd:
+            return dict(print_cmd)
+        return None
+
+
+def split_command(command, path):
+    """인쇄 명령어에서 실행 프로그램의 경로와 각 파라미터를 분리하고 %1을 문서 경로로 바꿉니다.
+    @return: (실행 프로그램의 경로, 파라미터 목록)
+    @raise ValueError: 명령어의 형식이 올바르지 않을 때.
+    """
+    regex = re.compile(r'((?:(?:[^\s"]+)|"(?:""|[^"])*")+)(?:\s|$)')
+    found = regex.findall(command)
+    if len(found) < 2 :
+        raise ValueError('Wrong print command: ' + command)
+
+    # 프로그램 실행 경로
+    execute_path = found[0]
+    if execute_path.startswith('"'):
+        execute_path = execute_path[1:-1] # 양 끝의 "(큰따옴표)를 제거함.
+
+    # 프로그램 파라미터
+    execute_param = []
+    for param in found[1:]:
+        if param.startswith('"') and param.endswith('"'):
+            param = param[1:-1] # 양 끝의 "(큰따옴표)를 제거함.
+        execute_param.append(param.replace('%1', '{}'.format(path)))
+
+    return (execute_path, execute_param)
+
+
+def get_viewer_args(command):
+    """인쇄 명령어에서 문서 경로(%1)가 들어가는 파라미터를 뺀 실행 명령을 만듭니다. (문서 없이 뷰어만 실행하기 위함)
+    예: '"C:\\...\\WINWORD.EXE" /n /dde' -> ['C:\\...\\WINWORD.EXE', '/n', '/dde']
+    @return: [실행 프로그램의 경로, 파라미터, ...]
+    @raise ValueError: 명령어의 형식이 올바르지 않을 때.
+    """
+    execute_path, execute_param = split_command(command, '%1')
+    return [execute_path] + [param for param in execute_param if not '%1' in param]
+
+
+def _launch(args):
+    return subprocess.Popen(args).pid
+
+
+def warm_viewers(table, dde_client, launch = _launch, timeout = 60.0):
+    """인쇄 명령 목록 중 DDE를 사용하는 뷰어를 문서 없이 실행하고, DDE 서버가 응답하면 목록에 프로세스 정보를 기록합니다.
+    (목록의 각 항목에 'warm': {'pid': 프로세스 ID, 'image': 실행 파일명}을 추가함)
+    같은 DDE 서버(application, topic)를 사용하는 확장자(예: doc, docx)는 하나의 뷰어를 함께 사용합니다.
+    @param table: build_table()의 반환값 (내용이 바뀜)
+    @param dde_client: connect(application, topic) 메소드를 가진 객체 (DdeClient)
+    @param launch: 실행 명령(list)을 받아서 프로세스를 실행하고 프로세스 ID를 반환하는 함수
+    @param timeout: 뷰어의 DDE 서버가 응답할 때까지 기다릴 최대 시간 (단위: 초)
+    @return: 실행한 뷰어의 수
+    """
+    launched = {} # (application, topic) -> 'warm' 항목. 실행하지 못한 뷰어는 None
+    for extension, print_cmd in sorted(table.items()):
+        if not print_cmd or not print_cmd['ddeexec'] or not print_cmd['application'] or not print_cmd['topic']:
+            continue
+
+        key = (print_cmd['application'].lower(), print_cmd['topic'].lower())
+        if not key in launched:
+            launched[key] = None
+            try:
+                args = get_viewer_args(print_cmd['command'])
+                pid = launch(args)
+                connect_dde(dde_client, print_cmd['application'], print_cmd['topic'], timeout)
+            except Exception as e:
+                log.error('Can not warm up the viewer of {}. ({})'.format(extension, e))
+                continue
+            launched[key] = {'pid': pid, 'image': os.path.basename(args[0])}
+
+        if launched[key]:
+            print_cmd['warm'] = launched[key]
+
+    return len([warm for warm in launched.values() if warm])
+
+
+class DdeClient:
+    """pywin32의 dde 모듈로 DDE 서버에 연결합니다. (pywin32 설치 필요)"""
+
+    def __init__(self, client_name = 'PrintClient'):
+        import win32ui, dde # dde 모듈보다 win32ui를 먼저 불러와야 함.
+        self.dde = dde
+        self.server = dde.CreateServer()
+        self.server.Create(client_name)
+
+    def connect(self, application, topic):
+        """
+        @return: Exec(command) 메소드를 가진 대화(conversation) 객체
+        @raise Exception: DDE 서버가 응답하지 않을 때. (dde.error)
+        """
+        conversation = self.dde.CreateConversation(self.server)
+        conversation.ConnectTo(application, topic)
+        return conversation
+
+
+def connect_dde(client, application, topic, timeout = 15.0, interval = 0.2, sleep = time.sleep, clock = time.time):
+    """DDE 서버가 응답할 때까지 interval 간격으로 연결을 시도합니다.
+    (뷰어 프로그램을 실행한 직후에는 DDE 서버가 아직 준비되지 않았을 수 있음)
+    @param client: connect(application, topic) 메소드를 가진 객체 (DdeClient)
+    @param timeout: 최대 대기 시간 (단위: 초)
+    @param interval: 다시 시도하기 전에 기다릴 시간 (단위: 초)
+    @return: client.connect()의 반환값
+    @raise DdeConnectError: timeout 안에 연결하지 못했을 때.
+    """
+    start_time = clock()
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            conversation = client.connect(application, topic)
+        except Exception as e:
+            if clock() - start_time + interval > timeout:
+                raise DdeConnectError('DDE server did not answer in {} seconds. ({} attempts, application: {}, '
+                                      'topic: {}, last error: {})'.format(timeout, attempts, application, topic, e))
+            sleep(interval)
+        else:
+            log.debug('DDE connected. ({:.1f} seconds, {} attempts)'.format(clock() - start_time, attempts))
+            return conversation
+
+
+def main(argv):
+    warm = '--warm' in argv
+    argv = [arg for arg in argv if arg != '--warm']
+    if len(argv) < 2:
+        print('usage: python print_command.py [--warm] <table path> <extension> [<extension> ...]')
+        return 1
+
+    table = build_table(WinRegistry(), argv[1:])
+    if warm:
+        count = warm_viewers(table, DdeClient())
+        print('{} viewers are running. Take the snapshot while they are running.'.format(count))
+    save_table(table, argv[0])
+    for extension in argv[1:]:
+        print_cmd = table.get(normalize_extension(extension))
+        print('{}: {}'.format(extension, json.dumps(print_cmd) if print_cmd else 'NOT FOUND'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
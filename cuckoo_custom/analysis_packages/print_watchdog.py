@@ -0,0 +1,212 @@
+# encoding: utf-8
+
+# Copyright (C) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""doc_conv 분석 패키지가 사용하는 인쇄 감시 모듈.
+뷰어의 프로세스 트리, 가상 프린터의 프로세스, 인쇄 스풀러의 작업 상태, 출력 디렉토리의 파일 크기를 주기적으로 확인하여
+인쇄가 더 이상 진행될 수 없으면(뷰어가 비정상 종료됨, 대화상자 등으로 멈춤, 스풀러 에러) 실패 원인을 반환합니다.
+(쿠쿠의 분석 제한 시간까지 가상 머신을 붙잡고 있지 않기 위함)
+윈도 전용 모듈(ctypes.windll, win32print)은 사용할 때만 불러오므로, 가짜 probe 객체를 넘겨주면
+리눅스에서도 판단 과정을 확인할 수 있습니다.
+"""
+
+import os
+import time
+import ctypes
+
+import logging
+log = logging.getLogger(__name__)
+
+
+# 실패 원인 (converted/watchdog.json의 reason. 에이전트는 각각 다른 에러 코드로 처리함)
+VIEWER_EXITED = 'viewer_exited' # 인쇄가 끝나기 전에 뷰어(및 자식 프로세스)가 모두 종료됨
+PRINT_STALLED = 'print_stalled' # 뷰어는 실행 중이지만 인쇄가 진행되지 않음 (대화상자, 무한 대기 등)
+SPOOL_ERROR = 'spool_error'     # 인쇄 작업이 에러 상태임
+
+# 에러로 판단할 인쇄 작업 상태 (JOB_STATUS_ERROR | JOB_STATUS_OFFLINE | JOB_STATUS_PAPEROUT |
+#                               JOB_STATUS_BLOCKED_DEVQ | JOB_STATUS_USER_INTERVENTION)
+JOB_STATUS_FAILED = 0x0002 | 0x0020 | 0x0040 | 0x0200 | 0x0400
+
+TH32CS_SNAPPROCESS = 0x00000002
+INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+
+
+class PROCESSENTRY32(ctypes.Structure):
+    _fields_ = [('dwSize', ctypes.c_ulong),
+                ('cntUsage', ctypes.c_ulong),
+                ('th32ProcessID', ctypes.c_ulong),
+                ('th32DefaultHeapID', ctypes.c_size_t),
+                ('th32ModuleID', ctypes.c_ulong),
+                ('cntThreads', ctypes.c_ulong),
+                ('th32ParentProcessID', ctypes.c_ulong),
+                ('pcPriClassBase', ctypes.c_long),
+                ('dwFlags', ctypes.c_ulong),
+                ('szExeFile', ctypes.c_char * 260)]
+
+
+def _declare_kernel32(kernel32):
+    """핸들을 반환하거나 인자로 받는 함수의 형식을 지정합니다.
+    (지정하지 않으면 반환값이 c_int로 잘려서 INVALID_HANDLE_VALUE와 비교할 수 없고, 64비트에서 핸들이 잘림)
+    """
+    kernel32.CreateToolhelp32Snapshot.argtypes = [ctypes.c_ulong, ctypes.c_ulong]
+    kernel32.CreateToolhelp32Snapshot.restype = ctypes.c_void_p
+    kernel32.Process32First.argtypes = [ctypes.c_void_p, ctypes.POINTER(PROCESSENTRY32)]
+    kernel32.Process32First.restype = ctypes.c_int
+    kernel32.Process32Next.argtypes = [ctypes.c_void_p, ctypes.POINTER(PROCESSENTRY32)]
+    kernel32.Process32Next.restype = ctypes.c_int
+    kernel32.CloseHandle.argtypes = [ctypes.c_void_p]
+    kernel32.CloseHandle.restype = ctypes.c_int
+
+
+class WinProbe:
+    """윈도 API로 프로세스, 인쇄 작업, 출력 파일의 상태를 조회합니다."""
+
+    def list_processes(self):
+        """@return: 실행 중인 프로세스 ID -> (부모 프로세스 ID, 소문자로 바꾼 실행 파일 이름) dict"""
+        kernel32 = ctypes.windll.kernel32
+        _declare_kernel32(kernel32)
+        snapshot = kernel32.CreateToolhelp32Snapshot(TH32CS_SNAPPROCESS, 0)
+        if snapshot == INVALID_HANDLE_VALUE:
+            raise ctypes.WinError()
+
+        processes = {}
+        try:
+            entry = PROCESSENTRY32()
+            entry.dwSize = ctypes.sizeof(PROCESSENTRY32)
+            found = kernel32.Process32First(snapshot, ctypes.byref(entry))
+            while found:
+                processes[entry.th32ProcessID] = (entry.th32ParentProcessID, entry.szExeFile.lower())
+                found = kernel32.Process32Next(snapshot, ctypes.byref(entry))
+        finally:
+            kernel32.CloseHandle(snapshot)
+        return processes
+
+    def list_print_jobs(self):
+        """로컬 프린터들의 인쇄 작업 목록.
+        @return: (프린터 이름, 작업 ID, 상태, 인쇄된 페이지 수, 전체 페이지 수) 목록
+        """
+        import win32print
+
+        jobs = []
+        for flags, description, name, comment in win32print.EnumPrinters(win32print.PRINTER_ENUM_LOCAL, None, 1):
+            handle = win32print.OpenPrinter(name)
+            try:
+                for job in win32print.EnumJobs(handle, 0, 999, 1):
+                    jobs.append((name, job['JobId'], job['Status'], job['PagesPrinted'], job['TotalPages']))
+            finally:
+                win32print.ClosePrinter(handle)
+        return jobs
+
+    def list_output_files(self, directory):
+        """@return: 파일명 -> 파일 크기 dict"""
+        files = {}
+        for file_name in os.listdir(directory):
+            try:
+                files[file_name] = os.path.getsize(os.path.join(directory, file_name))
+            except OSError:
+                pass # 확인하는 사이에 이름이 바뀌거나 삭제됨.
+        return files
+
+
+class PrintWatchdog:
+    """문서 하나의 인쇄를 감시합니다. (문서마다 새로 만들어야 함)
+    다음 중 하나가 바뀌면 인쇄가 진행 중인 것으로 봅니다.
+      - 인쇄 작업 목록 (작업 추가/삭제, 인쇄된 페이지 수)
+      - 출력 디렉토리의 파일 목록 및 크기
+    뷰어가 모두 종료되어도 가상 프린터의 프로세스가 실행 중이거나 인쇄 작업이 남아 있으면 뷰어가 종료된 것으로 보지 않고
+    인쇄가 진행되는지 확인합니다. (뷰어의 프로세스 트리 밖에서 가상 프린터가 파일을 마저 쓰는 경우를 위함)
+    """
+
+    def __init__(self, probe, root_pid, output_dir, stall_timeout = 60.0, exit_grace = 10.0, printer_processes = (),
+                 clock = time.time):
+        """
+        @param probe: list_processes(), list_print_jobs(), list_output_files(directory) 메소드를 가진 객체 (WinProbe)
+        @param root_pid: 인쇄하는 뷰어의 프로세스 ID (뷰어가 실행한 자식 프로세스도 함께 감시함)
+        @param output_dir: 변환된 파일이 만들어지는 디렉토리
+        @param stall_timeout: 뷰어가 실행 중일 때 인쇄가 진행되지 않아도 기다릴 최대 시간 (단위: 초)
+        @param exit_grace: 뷰어가 모두 종료되거나 인쇄 작업이 에러 상태가 된 후 기다릴 시간 (단위: 초)
+            (뷰어가 종료된 후에 가상 프린터가 파일을 마저 쓰는 경우, 에러 상태가 잠깐 나타났다 사라지는 경우를 위함)
+        @param printer_processes: 가상 프린터의 실행 파일 이름 목록 (예: ['pdfcreator.exe'], 대소문자 구분 안 함)
+            (spoolsv.exe는 항상 실행 중이므로 넣지 않음. 스풀러는 인쇄 작업 목록으로 확인함)
+        """
+        self.probe = probe
+        self.output_dir = output_dir
+        self.stall_timeout = stall_timeout
+        self.exit_grace = exit_grace
+        self.printer_processes = set(name.lower() for name in printer_processes)
+        self.clock = clock
+        self.pids = set([root_pid]) # 감시 중인 프로세스 (뷰어와 그 자식 프로세스들)
+        self.state = None           # 마지막으로 확인한 (인쇄 작업 목록, 출력 파일 목록)
+        self.progress_time = clock()
+        self.exit_time = None       # 뷰어가 모두 종료된 것을 처음 확인한 시각
+        self.error_time = None      # 인쇄 작업의 에러 상태를 처음 확인한 시각
+        self.reason = None
+
+    def update_pids(self, processes):
+        """감시 중인 프로세스의 자식 프로세스를 추가하고, 종료된 프로세스는 뺍니다.
+        @param processes: probe.list_processes()의 반환값
+        @return: 실행 중인 프로세스가 하나라도 있으면 True
+        """
+        added = True
+        while added:
+            children = set(pid for pid, (parent_pid, name) in processes.items() if parent_pid in self.pids)
+            added = bool(children - self.pids)
+            self.pids.update(children)
+        self.pids.intersection_update(processes.keys())
+        return bool(self.pids)
+
+    def check(self):
+        """인쇄가 더 이상 진행될 수 없는지 확인합니다. check()의 호출 간격마다 한 번씩 호출해야 합니다.
+        @return: 실패 원인(VIEWER_EXITED, PRINT_STALLED, SPOOL_ERROR). 아직 진행될 수 있으면 None
+        """
+        if self.reason:
+            return self.reason
+
+        now = self.clock()
+        processes = self.probe.list_processes()
+        alive = self.update_pids(processes)
+        printers = sorted(pid for pid, (parent_pid, name) in processes.items() if name in self.printer_processes)
+        jobs = self.probe.list_print_jobs()
+        state = (sorted((name, job_id, pages_printed) for name, job_id, status, pages_printed, total_pages in jobs),
+                 sorted(self.probe.list_output_files(self.output_dir).items()))
+        if state != self.state:
+            self.state = state
+            self.progress_time = now
+
+        if [job for job in jobs if job[2] & JOB_STATUS_FAILED]:
+            if self.error_time is None:
+                self.error_time = now
+            if now - self.error_time >= self.exit_grace:
+                self.reason = SPOOL_ERROR
+        else:
+            self.error_time = None
+
+        if alive or printers or jobs:
+            # 뷰어가 종료되었어도 가상 프린터가 실행 중이거나 남은 인쇄 작업이 있으면 작업이 진행되는지 확인함.
+            self.exit_time = None
+            if now - self.progress_time >= self.stall_timeout:
+                self.reason = self.reason or PRINT_STALLED
+        else:
+            if self.exit_time is None:
+                self.exit_time = now
+            if now - max(self.exit_time, self.progress_time) >= self.exit_grace:
+                self.reason = VIEWER_EXITED
+
+        if self.reason:
+            log.error('Print can not progress. ({}, pids: {}, printer pids: {}, jobs: {})'
+                      .format(self.reason, sorted(self.pids), printers, jobs))
+        return self.reason
@@ -17,7 +17,9 @@
 
 
 import os
+import json
 import base64
+import hashlib
 
 from lib.cuckoo.common.abstracts import Processing
 from lib.cuckoo.common.exceptions import CuckooProcessingError
@@ -30,14 +32,64 @@ class Converted(Processing):
     def get_converted_file_path(self):
         return os.path.join(self.analysis_path, 'converted', 'result.pdf')
 
-    def run(self):
-        self.key = "converted"
+    def get_file_info(self, converted_file_path):
+        """변환된 파일의 내용 대신 파일 정보만 반환합니다. (mode = reference)
+        @return: {'size': 파일 크기, 'sha256': 해시값, 'path': 분석 디렉토리 내 상대 경로}
+        """
+        sha256 = hashlib.sha256()
+        size = 0
+        with open(converted_file_path, 'rb') as converted_file:
+            while True:
+                data = converted_file.read(1024 * 1024)
+                if not data:
+                    break
+                sha256.update(data)
+                size += len(data)
 
-        converted_file_path = self.get_converted_file_path()
-        if not os.path.isfile(converted_file_path):
-            log.debug('Does not exist converted file. path: {}'.format(converted_file_path))
+        if size == 0:
+            log.debug('Converted file is empty. path: {}'.format(converted_file_path))
             return ''
 
+        relative_path = os.path.relpath(converted_file_path, self.analysis_path)
+        return {'size': size,
+                'sha256': sha256.hexdigest(),
+                'path': relative_path.replace(os.sep, '/')}
+
+    def get_batch_file_paths(self):
+        """배치 작업(여러 문서를 하나의 작업으로 변환)인 경우 문서별로 변환된 파일의 경로를 반환합니다.
+        분석 패키지는 문서마다 converted/<문서 이름>.pdf로 업로드합니다.
+        @return: 문서 이름 -> 변환된 파일의 경로 dict
+        """
+        converted_dir = os.path.join(self.analysis_path, 'converted')
+        if not os.path.isdir(converted_dir):
+            return {}
+
+        paths = {}
+        for file_name in os.listdir(converted_dir):
+            root, ext = os.path.splitext(file_name)
+            if ext.lower() == '.pdf' and file_name != 'result.pdf':
+                paths[root] = os.path.join(converted_dir, file_name)
+        return paths
+
+    def get_watchdog_failure(self):
+        """분석 패키지가 업로드한 converted/watchdog.json의 실패 원인. 없으면 None."""
+        failure_path = os.path.join(self.analysis_path, 'converted', 'watchdog.json')
+        if not os.path.isfile(failure_path):
+            return None
+        try:
+            with open(failure_path, 'r') as failure_file:
+                return json.load(failure_file).get('reason')
+        except (IOError, ValueError, AttributeError) as e:
+            log.warning('Can not read watchdog failure. ({}: {})'.format(failure_path, e))
+            return None
+
+    def encode_file(self, converted_file_path):
+        """변환된 파일을 레포트에 넣을 값으로 만듭니다."""
+        # inline: 변환된 파일을 base64로 인코딩하여 레포트에 포함함. (기본값)
+        # reference: 파일 정보만 레포트에 포함하고, 파일은 에이전트가 따로 받아감.
+        if self.options.get('mode', 'inline') == 'reference':
+            return self.get_file_info(converted_file_path)
+
         file_content = None
         with open(converted_file_path, 'rb') as converted_file:
             file_content = converted_file.read()
@@ -47,3 +99,26 @@ class Converted(Processing):
             return ''
 
         return base64.encodestring(file_content)
+
+    def run(self):
+        self.key = "converted"
+
+        converted_file_path = self.get_converted_file_path()
+        if os.path.isfile(converted_file_path):
+            return self.encode_file(converted_file_path)
+
+        # 배치 작업인 경우 {'documents': {문서 이름: 값}} 형식으로 반환함.
+        batch_file_paths = self.get_batch_file_paths()
+        if batch_file_paths:
+            documents = {}
+            for name, path in batch_file_paths.items():
+                documents[name] = self.encode_file(path)
+            return {'documents': documents}
+
+        # 분석 패키지의 감시기가 인쇄 실패를 보고한 경우 {'error': 실패 원인} 형식으로 반환함.
+        failure = self.get_watchdog_failure()
+        if failure:
+            return {'error': failure}
+
+        log.debug('Does not exist converted file. path: {}'.format(converted_file_path))
+        return ''
@@ -0,0 +1,58 @@
+# encoding: utf-8
+
+# Copyright (C) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import json
+from collections import OrderedDict
+
+from lib.cuckoo.common.abstracts import Report
+from lib.cuckoo.common.exceptions import CuckooReportError
+
+class Conversion(Report):
+    """Saves a compact conversion report. (reports/conversion.json)
+    파일 변환 에이전트가 사용하는 항목만 정해진 형식으로 기록합니다.
+    (정적 분석, 네트워크, 디버그 정보 등을 모두 기록하는 jsondumpex보다 레포트 작성 시간과 전송량이 작음)
+
+    {"info": {"id", "package", "started", "ended", "duration"},
+     "signatures": [{"name", "severity"}, ...],
+     "converted": converted 처리 모듈의 결과 (결과가 없으면 기록하지 않음)}
+
+    에이전트가 레포트를 읽으면서 분석할 때 시그니처가 발견되면 나머지는 받지 않도록 converted를 맨 뒤에 기록합니다.
+    """
+
+    def run(self, results):
+        """Writes report.
+        @param results: Cuckoo results dict.
+        @raise CuckooReportError: if fails to write report.
+        """
+        info = results.get('info', {})
+        report = OrderedDict()
+        report['info'] = OrderedDict((key, info.get(key)) for key in ('id', 'package', 'started', 'ended', 'duration'))
+        report['signatures'] = [OrderedDict([('name', signature.get('name')),
+                                             ('severity', signature.get('severity'))])
+                                for signature in results.get('signatures', [])]
+        # converted가 없으면 jsondumpex와 같이 기록하지 않음. (에이전트가 변환된 파일이 없는 것(30002)으로 처리하도록)
+        if 'converted' in results:
+            report['converted'] = results['converted']
+
+        try:
+            path = os.path.join(self.reports_path, 'conversion.json')
+            with open(path, 'w') as report_file:
+                json.dump(report, report_file, default = str)
+        except (TypeError, ValueError, IOError) as e:
+            raise CuckooReportError('Failed to generate conversion report: {}'.format(e))
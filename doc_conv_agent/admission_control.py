@@ -0,0 +1,94 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import time
+import threading
+import traceback
+
+from doc_converter import DocConverterError
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """샌드박스에 동시에 맡기는 작업의 수를 가상 머신 수 + 여유분(headroom)으로 제한합니다.
+    가상 머신 수는 주기적으로 다시 조회하므로 가상 머신이 추가되거나 없어지면 제한도 함께 바뀝니다.
+    제한을 넘는 파일은 에이전트의 대기열에 남겨두어 처리 순서를 바꿀 수 있도록 합니다.
+    ※ 여러 스레드가 공유할 수 있습니다. (작업을 생성 중인 스레드의 몫을 예약해 두어 제한을 넘지 않도록 함)
+    """
+    def __init__(self, doc_converter):
+        self.doc_converter = doc_converter
+        self.headroom = 2
+        self.refresh_interval = 30.0
+        self.machine_count = None # 마지막으로 조회한 가상 머신의 수 (조회한 적이 없거나 알 수 없으면 None)
+        self.last_refresh_time = 0
+        self.reserved = 0 # acquire() 후 아직 release()하지 않은 수 (작업을 생성 중인 스레드의 수)
+        self.lock = threading.Lock()
+
+    def set_headroom(self, headroom):
+        """가상 머신 수보다 더 맡길 작업의 수를 지정합니다.
+        (작업이 끝나고 다음 작업이 생성될 때까지 가상 머신이 쉬지 않도록 하기 위함)
+        """
+        self.headroom = headroom
+
+    def set_refresh_interval(self, refresh_interval):
+        """가상 머신 수를 다시 조회하는 주기를 지정합니다. (단위: 초)"""
+        self.refresh_interval = refresh_interval
+
+    def get_limit(self, now = None):
+        """동시에 진행할 수 있는 작업의 수를 반환합니다. 가상 머신 수를 알 수 없으면 None(제한 없음)."""
+        if now is None:
+            now = time.time()
+        if now - self.last_refresh_time >= self.refresh_interval:
+            self.last_refresh_time = now
+            try:
+                machine_count = self.doc_converter.get_machine_count()
+            except DocConverterError as e:
+                # 조회에 실패하면 마지막으로 조회한 값을 계속 사용함.
+                log.warning(traceback.format_exc(e))
+            else:
+                if machine_count != self.machine_count:
+                    log.info('가상 머신 수가 바뀌었습니다. ({} -> {})'.format(self.machine_count, machine_count))
+                self.machine_count = machine_count
+
+        if self.machine_count is None:
+            return None
+        return self.machine_count + self.headroom
+
+    def acquire(self, in_flight, now = None):
+        """작업을 더 맡길 수 있으면 한 자리를 예약하고 True 반환.
+        True를 반환한 경우, 작업을 생성하여 작업 기록에 반영한 후(혹은 생성할 대상이 없으면) 반드시 release()를 호출해야 합니다.
+        @param in_flight: 샌드박스에서 진행 중인 작업의 수 (작업 기록 기준)
+        """
+        with self.lock:
+            limit = self.get_limit(now)
+            if limit is not None and in_flight + self.reserved >= limit:
+                return False
+            self.reserved += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.reserved -= 1
@@ -0,0 +1,94 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import os
+import time
+
+
+class BatchCollector:
+    """크기가 작은 문서들을 모아서 하나의 배치 작업으로 보낼 묶음을 만듭니다.
+    가상 머신의 스냅샷 복원, 부팅, 종료에 드는 시간은 문서마다 같으므로, 인쇄 시간이 짧은 작은 문서는
+    여러 개를 하나의 작업으로 변환하는 것이 가상 머신을 덜 사용합니다.
+    묶음은 문서 수가 max_documents에 도달하거나 첫 문서를 넣은 후 max_wait가 지나면 보냅니다.
+    ※ 요청 처리기마다 따로 만들어야 합니다. (여러 스레드가 공유할 수 없음)
+    """
+    def __init__(self, max_documents, max_wait, max_document_size, extensions):
+        """
+        @param max_documents: 배치 작업 하나에 묶을 최대 문서 수
+        @param max_wait: 첫 문서를 넣은 후 묶음을 보내기까지 기다릴 최대 시간 (단위: 초)
+        @param max_document_size: 묶을 수 있는 문서의 최대 크기 (단위: 바이트)
+        @param extensions: 묶을 수 있는 확장자 목록 (대소문자 차이는 무시됨)
+        """
+        self.max_documents = max_documents
+        self.max_wait = max_wait
+        self.max_document_size = max_document_size
+        self.extensions = [x.lower() for x in extensions]
+        self.documents = [] # (작업 기록의 ID, 원본 파일의 경로) 목록
+        self.first_added_time = None
+
+    def accepts(self, file_path, file_size):
+        """배치 작업에 묶을 수 있는 문서인지 반환합니다.
+        @param file_size: 원본 파일의 크기. 알 수 없으면 None (묶지 않음)
+        """
+        root, ext = os.path.splitext(file_path)
+        if not ext[1:].lower() in self.extensions:
+            return False
+        return file_size is not None and file_size <= self.max_document_size
+
+    def add(self, job_id, file_path, now = None):
+        if now is None:
+            now = time.time()
+        if not self.documents:
+            self.first_added_time = now
+        self.documents.append((job_id, file_path))
+
+    def is_ready(self, now = None):
+        """묶음을 보낼 때가 되었는지 반환합니다."""
+        if not self.documents:
+            return False
+        if len(self.documents) >= self.max_documents:
+            return True
+        if now is None:
+            now = time.time()
+        return now - self.first_added_time >= self.max_wait
+
+    def time_until_ready(self, now = None):
+        """묶음을 보낼 때까지 남은 시간을 반환합니다. 모아 둔 문서가 없으면 None."""
+        if not self.documents:
+            return None
+        if now is None:
+            now = time.time()
+        return max(self.first_added_time + self.max_wait - now, 0)
+
+    def take(self):
+        """모아 둔 문서들을 꺼냅니다.
+        @return: (작업 기록의 ID, 원본 파일의 경로) 목록
+        """
+        documents = self.documents
+        self.documents = []
+        self.first_added_time = None
+        return documents
+
+    def __len__(self):
+        return len(self.documents)
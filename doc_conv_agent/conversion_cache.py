@@ -0,0 +1,168 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import os
+import time
+import hashlib
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # POSIX가 아닌 환경(윈도 등)에서는 파일 잠금 없이 삭제함
+
+from linker import create_temp_file
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def hash_file(file_path):
+    """파일의 sha256 해시값을 반환합니다."""
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            data = f.read(1024 * 1024)
+            if not data:
+                break
+            sha256.update(data)
+    return sha256.hexdigest()
+
+
+class ConversionCache:
+    """원본 파일의 해시값을 키로 하여 변환된 파일을 디스크에 보관합니다.
+    전체 크기가 지정한 크기를 넘으면 가장 오래 사용되지 않은 파일부터 삭제합니다. (LRU)
+    ※ 사용 시각은 파일의 수정 시각으로 기록하므로 여러 프로세스가 같은 디렉토리를 함께 사용할 수 있습니다.
+      (전체 크기는 프로세스마다 보관한 파일의 크기를 더해 두었다가, 최대 크기를 넘거나 scan_interval이 지나면
+       파일 잠금을 잡은 상태에서 디스크의 파일 크기를 다시 합산함)
+    """
+    def __init__(self, cache_dir, max_size):
+        """
+        @param cache_dir: 변환된 파일을 보관할 디렉토리
+        @param max_size: 보관할 파일들의 최대 크기 (단위: 바이트)
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.scan_interval = 60
+
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        self.lock_path = os.path.join(cache_dir, '.lock')
+        self.total_size = sum(size for mtime, size, name in self._list_entries())
+        self.last_scan_time = time.time()
+
+    def set_scan_interval(self, scan_interval):
+        """
+        @param scan_interval: 다른 프로세스가 보관한 파일을 반영하기 위해 디스크의 전체 크기를 다시 합산할 간격 (단위: 초)
+        """
+        self.scan_interval = scan_interval
+
+    def _path(self, digest):
+        return os.path.join(self.cache_dir, digest + '.pdf')
+
+    def _list_entries(self):
+        """보관 중인 파일 목록을 (수정 시각, 크기, 파일명) 형식으로 반환합니다."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.pdf'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue # 다른 프로세스가 삭제한 경우
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def open(self, digest):
+        """보관 중인 변환된 파일을 엽니다.
+        (경로를 반환하면 호출한 쪽에서 열기 전에 다른 프로세스가 삭제할 수 있으므로 연 파일을 반환함.
+         연 후에 삭제되어도 닫을 때까지 읽을 수 있음)
+        @param digest: 원본 파일의 해시값 (hash_file()의 반환값)
+        @return: 읽기 모드로 연 파일 객체. 보관 중인 파일이 없으면 None.
+        """
+        path = self._path(digest)
+        try:
+            cached_file = open(path, 'rb')
+        except IOError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path, None) # 최근 사용 시각 갱신
+        except OSError:
+            pass # 연 후에 다른 프로세스가 삭제한 경우
+
+        self.hits += 1
+        log.debug('변환 결과 캐시 사용. 해시값: {}, 적중: {}, 실패: {}'.format(digest, self.hits, self.misses))
+        return cached_file
+
+    def put(self, digest, result_file_binary):
+        """변환된 파일을 보관합니다.
+        @param digest: 원본 파일의 해시값 (hash_file()의 반환값)
+        @param result_file_binary: 변환된 파일의 바이너리 데이터 혹은 Linker.create_result_file()이 반환한 객체.
+        """
+        temp_path = create_temp_file(self.cache_dir)
+        try:
+            with open(temp_path, 'wb') as temp_file:
+                if hasattr(result_file_binary, 'copy_to'):
+                    result_file_binary.copy_to(temp_file)
+                else:
+                    temp_file.write(result_file_binary)
+            size = os.path.getsize(temp_path)
+            os.rename(temp_path, self._path(digest))
+        except:
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+            raise
+
+        # 매번 디스크를 다시 합산하지 않고 최대 크기를 넘었을 때와 scan_interval마다만 합산함.
+        self.total_size += size
+        if self.total_size > self.max_size or time.time() - self.last_scan_time >= self.scan_interval:
+            self._evict()
+
+    def _evict(self):
+        """전체 크기가 최대 크기를 넘으면 최대 크기의 90%가 될 때까지 가장 오래 사용되지 않은 파일부터 삭제합니다.
+        (여러 프로세스가 동시에 삭제하지 않도록 파일 잠금을 잡은 상태에서 디스크의 파일 목록으로 계산함.
+         fcntl이 없으면 잠금 없이 삭제하며, 이미 삭제된 파일은 무시하므로 여러 프로세스가 함께 삭제해도 됨)
+        삭제 후 남은 전체 크기를 self.total_size에 반영함.
+        """
+        with open(self.lock_path, 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            entries = self._list_entries()
+            total_size = sum(size for mtime, size, name in entries)
+            self.total_size = total_size
+            self.last_scan_time = time.time()
+            if total_size <= self.max_size:
+                return
+
+            entries.sort()
+            for mtime, size, name in entries:
+                if total_size <= self.max_size * 0.9:
+                    break
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+                total_size -= size
+            self.total_size = total_size
@@ -23,7 +23,7 @@
 
 
 from multiprocessing import Process, Queue, Event
-from Queue import Empty
+import threading
 import time
 
 import os
@@ -31,9 +31,17 @@ import sys
 
 from ConfigParser import ConfigParser
 
-from linker import FileLinker
+from linker import FileLinker, InotifyFileLinker, SynchronizedLinker
 from doc_converter import SandboxDocConverter, UnsupportedFileTypeError, DocConverterError
-from report_analyser import JsonReportAnalyser
+from report_analyser import JsonReportAnalyser, BatchResult
+from poll_scheduler import PollScheduler
+from conversion_cache import ConversionCache, hash_file
+from journal import JobJournal
+from job_scheduler import create_schedule_policy
+from admission_control import AdmissionController
+from batch_collector import BatchCollector
+from metrics import Metrics, QueueMetrics, MetricsCollector, start_metrics_server
+from job_trace import JobTracer
 
 import traceback
 import logging
@@ -60,20 +68,70 @@ log = logging.getLogger(__name__)
 
 
 class RequestProcessor:
+    def __init__(self):
+        self.cache = None
+        self.coalesce_window = 0
+        self.admission_controller = None
+        self.batch_collector = None
+        self.metrics = Metrics()
+        self.tracer = None
+
     def set_linker(self, linker):
         self.linker = linker
 
+    def set_tracer(self, tracer):
+        """
+        @param tracer: 작업의 처리 과정을 기록할 JobTracer 객체. None이면 기록하지 않음.
+        """
+        self.tracer = tracer
+
+    def set_metrics(self, metrics):
+        """
+        @param metrics: 단계별 처리 시간을 기록할 Metrics 객체.
+        """
+        self.metrics = metrics
+
+    def set_admission_controller(self, admission_controller):
+        """
+        @param admission_controller: AdmissionController 객체. None이면 진행 중인 작업의 수를 제한하지 않음.
+        """
+        self.admission_controller = admission_controller
+
+    def set_journal(self, journal):
+        """
+        @param journal: 작업의 상태 변화를 기록할 JobJournal 객체.
+        """
+        self.journal = journal
+
+    def set_cache(self, cache):
+        """
+        @param cache: ConversionCache 객체. None이면 캐시를 사용하지 않음.
+        """
+        self.cache = cache
+
+    def set_coalesce_window(self, coalesce_window):
+        """내용이 같은 파일의 변환 작업을 하나로 합칠 수 있는 시간을 지정합니다.
+        작업을 생성한 후 이 시간 안에 내용이 같은 파일이 들어오면 새로운 작업을 만들지 않고 기존 작업의 결과를 함께 받습니다.
+        @param coalesce_window: 단위: 초. 0이면 작업을 합치지 않음.
+        """
+        self.coalesce_window = coalesce_window
+
+    def set_batch_collector(self, batch_collector):
+        """
+        @param batch_collector: 작은 문서들을 배치 작업으로 묶을 BatchCollector 객체. None이면 묶지 않음.
+            (묶음에 넣은 후 배치 작업을 생성하기 전에 에이전트가 종료되면, 재시작할 때 문서별로 다시 생성함)
+        """
+        self.batch_collector = batch_collector
+
     def set_doc_converter(self, doc_converter):
         self.doc_converter = doc_converter
 
-    def run(self, q, flag, conf):
+    def run(self, flag, conf):
         """작업을 수행합니다.
-        @param q: 작업 대상을 저장할 Queue 객체.
         @param flag: 작업을 수행/중단을 통제하기 위한 Event 객체.
                         (반드시 셋팅된 상태로 넘겨주어야 합니다.)
         @param conf: 에이전트 설정이 저장되어 있는 dict 객체.
         """
-        self.q = q
         self.flag = flag
         self.conf = conf
 
@@ -82,82 +140,462 @@ class RequestProcessor:
                 self._do()
             except Exception as e:
                 log.error(traceback.format_exc(e))
+            self.metrics.flush()
 
     def _do(self):
-        file_path = self.linker.get()
+        if not self.admission_controller:
+            return self._process_next()
+
+        # 샌드박스에 맡긴 작업이 제한에 도달하면 새로운 작업을 만들지 않고 대상을 대기열에 남겨둠.
+        if not self.admission_controller.acquire(self.journal.count_active_tasks()):
+            self.linker.wait(float(self.conf['RequestProcessor']['DelayTime']))
+            return
+        try:
+            self._process_next()
+        finally:
+            self.admission_controller.release()
+
+    def _process_next(self):
+        if self.batch_collector is not None and self.batch_collector.is_ready():
+            self._submit_batch()
+            return
 
-        if file_path:
+        # 에이전트가 재시작되기 전에 가져왔으나 작업을 생성하지 못한 파일(혹은 실패한 배치 작업의 문서)을 먼저 처리함.
+        job = self.journal.take_requeued()
+        if job:
+            job_id, file_path, digest = job
+            log.info('작업을 다시 생성합니다. 파일: {}'.format(file_path))
+            if not os.path.exists(file_path):
+                self._fail(job_id, file_path, '10001')
+                return
+        else:
+            file_path = self.linker.get()
+            if not file_path:
+                self.linker.wait(self._get_delay_time())
+                return
+            arrived_time = self._observe_pickup_delay(file_path)
+
+            try:
+                file_size = os.path.getsize(file_path)
+            except OSError:
+                file_size = None
+
+            digest = None
+            job_id = self.journal.claim(file_path, digest, arrived_time, file_size)
+
+        # 해시값은 작업 기록을 남긴 후에 계산함. (계산 중에 에이전트가 종료되어도 다시 시작할 때 작업을 다시 생성하도록)
+        if digest is None and (self.cache or self.coalesce_window):
+            digest = hash_file(file_path)
+            self.journal.set_digest(job_id, digest)
+
+        if self.cache and digest:
+            cached_file = self.cache.open(digest)
+            if cached_file:
+                # 같은 내용의 파일을 변환한 적이 있으면 샌드박스를 거치지 않고 바로 완료 처리함.
+                with cached_file:
+                    self.linker.success(file_path, cached_file)
+                self.journal.delivered(job_id)
+                self.metrics.inc('delivered_total')
+                if self.tracer:
+                    self.tracer.write(job_id, file_path)
+                return
+
+        task_id = self._find_inflight_task(digest)
+        if task_id is not None:
+            # 내용이 같은 파일을 변환 중이면 새로운 작업을 만들지 않고 기존 작업의 결과를 함께 받음.
+            log.debug('진행 중인 작업에 합칩니다. 작업ID: {}, 파일: {}'.format(task_id, file_path))
+            self.journal.submitted(job_id, task_id, coalesced = True)
+            return
+
+        # 다시 생성하는 작업은 배치 작업으로 묶지 않음. (배치 작업이 실패한 문서는 따로 변환해야 하므로)
+        if not job and self.batch_collector is not None and self.batch_collector.accepts(file_path, file_size):
             try:
-                task_id = self.doc_converter.create_task(file_path)
+                self.doc_converter.check_extension(file_path)
             except UnsupportedFileTypeError as e:
                 log.error(traceback.format_exc(e))
-                self.linker.fail(file_path, '10000')
-            except DocConverterError as e:
-                log.error(traceback.format_exc(e))
-                self.linker.fail(file_path, '10001')
+                self._fail(job_id, file_path, '10000')
+                return
+            self.batch_collector.add(job_id, file_path)
+            if self.batch_collector.is_ready():
+                self._submit_batch()
+            return
 
-            try:
-                self.q.put((task_id, file_path), timeout = int(conf['RequestProcessor']['MaxWaitTime']))
-            except Empty as e:
-                self.linker.fail(file_path, '10002') # 큐가 가득차서 더는 작업을 받아들일 수 없는 상태임.
+        self._create_task(job_id, file_path)
 
-        else:
-            time.sleep(float(conf['RequestProcessor']['DelayTime']))
+    def _create_task(self, job_id, file_path):
+        start_time = time.time()
+        try:
+            task_id = self.doc_converter.create_task(file_path)
+        except UnsupportedFileTypeError as e:
+            log.error(traceback.format_exc(e))
+            self._fail(job_id, file_path, '10000')
+            return
+        except DocConverterError as e:
+            log.error(traceback.format_exc(e))
+            self._fail(job_id, file_path, '10001')
+            return
+        finally:
+            self.metrics.observe('create_task_seconds', time.time() - start_time)
+
+        # 기록된 작업은 결과 처리기가 가져가서 상태를 조회함.
+        self.journal.submitted(job_id, task_id)
+
+    def _submit_batch(self):
+        """모아 둔 문서들로 배치 작업을 생성합니다. (문서가 하나뿐이면 일반 작업으로 생성함)
+        배치 작업 안에서의 문서 이름은 작업 기록의 ID를 사용합니다. (원본 파일명이 겹치거나 zip에 넣을 수 없는 문자가 있어도 되도록)
+        """
+        documents = self.batch_collector.take()
+        if len(documents) == 1:
+            job_id, file_path = documents[0]
+            self._create_task(job_id, file_path)
+            return
+
+        start_time = time.time()
+        try:
+            task_id = self.doc_converter.create_batch_task(
+                [(str(document_job_id), document_path) for document_job_id, document_path in documents])
+        except (UnsupportedFileTypeError, DocConverterError) as e:
+            # 배치 작업을 생성하지 못하면 문서별로 다시 생성함.
+            log.error(traceback.format_exc(e))
+            self.journal.requeue([document_job_id for document_job_id, document_path in documents])
+            return
+        finally:
+            self.metrics.observe('create_task_seconds', time.time() - start_time)
+
+        self.metrics.observe('batch_documents', len(documents))
+        for job_id, file_path in documents:
+            self.journal.submitted(job_id, task_id, str(job_id))
+
+    def _get_delay_time(self):
+        """변환 대상이 없을 때 기다릴 시간. 모아 둔 문서가 있으면 묶음을 보낼 시각까지만 기다림."""
+        delay_time = float(self.conf['RequestProcessor']['DelayTime'])
+        if self.batch_collector is not None:
+            time_until_ready = self.batch_collector.time_until_ready()
+            if time_until_ready is not None:
+                delay_time = min(delay_time, time_until_ready)
+        return delay_time
+
+    def _fail(self, job_id, file_path, err_code):
+        self.linker.fail(file_path, err_code)
+        self.journal.failed(job_id, err_code)
+        self.metrics.inc('errors_total', {'code': err_code})
+        if self.tracer:
+            self.tracer.write(job_id, file_path, err_code = err_code)
+
+    def _observe_pickup_delay(self, file_path):
+        """.eof 파일이 생성된 후 변환 대상으로 가져오기까지 걸린 시간을 기록합니다.
+        @return: .eof 파일이 생성된 시각(수정 시각). 알 수 없으면 None.
+        """
+        file_root, file_ext = os.path.splitext(file_path)
+        try:
+            arrived_time = os.path.getmtime(file_root + '.eof')
+        except OSError:
+            return None
+        self.metrics.observe('pickup_delay_seconds', max(time.time() - arrived_time, 0))
+        return arrived_time
+
+    def _find_inflight_task(self, digest):
+        """내용이 같은 파일을 변환 중인 작업의 ID를 반환합니다. 없으면 None."""
+        if not self.coalesce_window or not digest:
+            return None
+        return self.journal.find_task(digest, time.time() - self.coalesce_window)
 
 
 class ConvertResultProcessor:
+    def __init__(self):
+        self.cache = None
+        self.coalesce_window = 0
+        self.finished = {} # 작업ID -> 완료된 작업의 결과 (작업이 합쳐진 경우, 완료된 후에 합쳐진 파일을 처리하기 위함)
+        self.batch_members = {} # 배치 작업에 포함된 작업 기록의 ID -> (배치 작업 안에서의 문서 이름, 원본 파일의 해시값)
+        self.metrics = Metrics()
+        self.tracer = None
+
     def set_linker(self, linker):
         self.linker = linker
 
+    def set_tracer(self, tracer):
+        """
+        @param tracer: 작업의 처리 과정을 기록할 JobTracer 객체. None이면 기록하지 않음.
+        """
+        self.tracer = tracer
+
+    def set_metrics(self, metrics):
+        """
+        @param metrics: 단계별 처리 시간을 기록할 Metrics 객체.
+        """
+        self.metrics = metrics
+
+    def set_journal(self, journal):
+        """
+        @param journal: 작업의 상태 변화를 기록할 JobJournal 객체.
+        """
+        self.journal = journal
+
+    def set_cache(self, cache):
+        """
+        @param cache: ConversionCache 객체. None이면 캐시를 사용하지 않음.
+        """
+        self.cache = cache
+
     def set_doc_converter(self, doc_converter):
         self.doc_converter = doc_converter
 
-    def run(self, q, flag, conf):
-        self.q = q
+    def set_poll_scheduler(self, poll_scheduler):
+        self.poll_scheduler = poll_scheduler
+
+    def set_coalesce_window(self, coalesce_window):
+        """RequestProcessor.set_coalesce_window()와 같은 값을 지정합니다.
+        작업이 완료된 후 이 시간 동안은 결과를 기억해 두었다가, 그 사이에 합쳐진 파일도 같은 결과로 처리합니다.
+        (완료된 작업의 삭제도 이 시간이 지난 후에 수행함)
+        """
+        self.coalesce_window = coalesce_window
+
+    def run(self, flag, conf):
         self.flag = flag
         self.conf = conf
+        self.keep_time = float(get_conf(conf, 'Journal', 'KeepDays', '7')) * 24 * 60 * 60
+        self.last_purge_time = 0
 
         while self.flag.is_set():
             try:
                 self._do()
             except Exception as e:
                 log.error(traceback.format_exc(e))
+            self.metrics.flush()
 
-    def _do(self):
+    def _receive_tasks(self):
+        """새로 생성된 작업을 작업 기록에서 가져와 스케줄러에 등록합니다.
+        새로운 작업이 없으면 다음 조회 시각까지만 기다립니다.
+        """
+        jobs = self.journal.take_submitted()
+        for job_id, task_id, file_path, digest, batch_member in jobs:
+            if batch_member is not None:
+                self.batch_members[job_id] = (batch_member, digest)
+            if task_id in self.finished:
+                self._handle_finished(task_id, job_id, file_path)
+            else:
+                self.poll_scheduler.add(task_id, job_id, file_path, digest)
+
+        if not jobs:
+            timeout = self.poll_scheduler.time_until_next_poll()
+            if timeout is None or timeout > 1:
+                timeout = 1
+            time.sleep(max(timeout, 0.01))
+
+    def _cache_result(self, digest, result_data):
+        """변환 결과를 캐시에 보관합니다.
+        캐시는 최적화일 뿐이므로 보관하지 못해도(디스크 공간 부족 등) 경고만 남기고 결과는 그대로 전달함.
+        """
+        if not self.cache or not digest:
+            return
         try:
-            task_id, file_path = self.q.get(timeout = 1)
-        except Empty as e:
+            self.cache.put(digest, result_data)
+        except (IOError, OSError) as e:
+            log.warning('변환 결과를 캐시에 보관하지 못했습니다. 해시값: {}, 원인: {}'.format(digest, e))
+
+    def _handle_finished(self, task_id, job_id, file_path):
+        """이미 완료된 작업에 합쳐진 파일을 처리합니다."""
+        finished = self.finished[task_id]
+        if not finished['success']:
+            self._fail(job_id, file_path, finished['result'], task_id)
+            return
+
+        cached_file = None
+        if self.cache and finished['digest']:
+            cached_file = self.cache.open(finished['digest'])
+        if cached_file:
+            with cached_file:
+                self._success(job_id, file_path, cached_file, task_id)
+        else:
+            # 결과를 다시 받아옴. (완료된 작업은 coalesce_window가 지난 후에 삭제되므로 아직 남아 있음)
+            self.poll_scheduler.add(task_id, job_id, file_path, finished['digest'])
+
+    def _purge_journal(self):
+        """완료된 지 오래된 작업 기록을 삭제합니다. (1시간에 한 번)"""
+        now = time.time()
+        if now - self.last_purge_time < 60 * 60:
+            return
+        self.last_purge_time = now
+        count = self.journal.purge(now - self.keep_time)
+        if count:
+            log.info('오래된 작업 기록을 삭제했습니다. (개수: {})'.format(count))
+
+    def _expire_finished(self):
+        now = time.time()
+        for task_id, finished in self.finished.items():
+            if now - finished['time'] > self.coalesce_window:
+                del self.finished[task_id]
+                if finished['success'] and self.poll_scheduler.get(task_id) is None and \
+                        self.conf['ConvertResultProcessor']['DeleteCompleteTask'] == 'yes':
+                    self.doc_converter.delete_task(task_id)
+
+    def _finish(self, task_id, digest, is_success, result):
+        """작업이 완료되었음을 기록합니다. 완료된 작업의 삭제는 coalesce_window가 지난 후에 수행합니다."""
+        if not self.coalesce_window:
+            if is_success and self.conf['ConvertResultProcessor']['DeleteCompleteTask'] == 'yes':
+                self.doc_converter.delete_task(task_id)
+            return
+
+        self.finished[task_id] = {'time': time.time(),
+                                  'digest': digest,
+                                  'success': is_success,
+                                  'result': result}
+
+    def _do(self):
+        self._receive_tasks()
+        self._expire_finished()
+        self._purge_journal()
+
+        task_ids = self.poll_scheduler.due()
+        if not task_ids:
             return
 
         try:
-            status = self.doc_converter.get_status(task_id)
+            statuses = self.doc_converter.get_status_many(task_ids)
         except Exception as e:
             log.error(traceback.format_exc(e))
-            return
+            statuses = {}
+
+        for task_id in task_ids:
+            status = statuses.get(task_id)
+            try:
+                self._handle_status(task_id, status)
+            except Exception as e:
+                log.error(traceback.format_exc(e))
+                # 처리 중 에러가 발생한 작업은 추후 다시 조회.
+                if self.poll_scheduler.get(task_id):
+                    self.poll_scheduler.reschedule(task_id)
+
+    def _handle_status(self, task_id, status):
+        task = self.poll_scheduler.get(task_id)
 
         if status == 'completed':
-            is_success, result_data = self.doc_converter.get_result(task_id)
-            if is_success:
-                self.linker.success(file_path, result_data)
-                if conf['ConvertResultProcessor']['DeleteCompleteTask'] == 'yes':
-                    self.doc_converter.delete_task(task_id)
-            else:
-                self.linker.fail(file_path, result_data)
+            # 결과 파일은 메모리에 올리지 않고 결과 디렉토리의 임시 파일에 바로 기록함.
+            result_file = self.linker.create_result_file()
+            try:
+                # 결과 조회 중 에러(연결 제한 시간 초과 등)가 발생하면 추후 다시 조회할 수 있도록 결과를 가져온 후에 제거함.
+                try:
+                    is_success, result_data = self.doc_converter.get_result(task_id, result_file)
+                finally:
+                    spans = self.doc_converter.pop_spans(task_id)
+                self.poll_scheduler.remove(task_id)
+                if self._is_batch(task):
+                    if is_success and isinstance(result_data, BatchResult):
+                        self.journal.fetched([job_id for job_id, file_path in task['jobs']])
+                        self._deliver_batch(task_id, task['jobs'], result_data, spans)
+                    else:
+                        # 문서별 결과가 없는 레포트(배치 작업을 지원하지 않는 분석 패키지)는 30002로 처리함.
+                        self._requeue(task_id, task['jobs'], result_data if not is_success else '30002')
+                elif is_success:
+                    self.journal.fetched([job_id for job_id, file_path in task['jobs']])
+                    self._cache_result(task['digest'], result_data)
+                    self._deliver(task_id, task['jobs'], result_data, spans)
+                else:
+                    for job_id, file_path in task['jobs']:
+                        self._fail(job_id, file_path, result_data, task_id, spans)
+                self._finish(task_id, task['digest'], is_success, None if is_success else result_data)
+            finally:
+                # success()에서 공개되지 않은 임시 파일은 삭제함.
+                if result_file:
+                    result_file.discard()
         elif status == 'error':
+            self.poll_scheduler.remove(task_id)
             log.error('파일 변환 실패. 작업ID: {}'.format(task_id))
-            self.linker.fail(file_path, '20001')
+            if self._is_batch(task):
+                self._requeue(task_id, task['jobs'], '20001')
+            else:
+                for job_id, file_path in task['jobs']:
+                    self._fail(job_id, file_path, '20001', task_id)
+            self._finish(task_id, task['digest'], False, '20001')
         else:
             # 아직 완료되지 않았으므로 추후 다시 조회.
-            self.q.put((task_id, file_path))
+            self.poll_scheduler.reschedule(task_id)
 
-        time.sleep(float(conf['ConvertResultProcessor']['DelayTime']))
+
+    def _deliver(self, task_id, jobs, result_data, spans):
+        """하나의 변환 결과를 같은 작업을 기다리던 모든 파일에 전달합니다."""
+        for job_id, file_path in jobs[:-1]:
+            if hasattr(result_data, 'open'):
+                with result_data.open() as result_file:
+                    self._success(job_id, file_path, result_file, task_id, spans)
+            else:
+                self._success(job_id, file_path, result_data, task_id, spans)
+
+        # 마지막 파일에는 임시 파일을 복사하지 않고 그대로 전달함.
+        job_id, file_path = jobs[-1]
+        self._success(job_id, file_path, result_data, task_id, spans)
+
+    def _is_batch(self, task):
+        return any(job_id in self.batch_members for job_id, file_path in task['jobs'])
+
+    def _deliver_batch(self, task_id, jobs, batch_result, spans):
+        """배치 작업의 문서별 변환 결과를 각 문서에 전달합니다.
+        결과가 없거나 실패한 문서는 다른 문서의 인쇄가 늦어져 건너뛰었을 수 있으므로 하나씩 다시 변환합니다.
+        @param batch_result: 문서 이름 -> (성공 여부, 결과 파일 데이터 혹은 에러 코드) (BatchResult)
+        """
+        for job_id, file_path in jobs:
+            member, digest = self.batch_members[job_id]
+            is_success, result_data = batch_result.get(member, (False, '30002'))
+            if is_success:
+                del self.batch_members[job_id]
+                self._cache_result(digest, result_data)
+                self._success(job_id, file_path, result_data, task_id, spans)
+            else:
+                self._requeue(task_id, [(job_id, file_path)], result_data)
+
+    def _requeue(self, task_id, jobs, err_code):
+        """실패한 배치 작업의 문서들을 문서별로 다시 변환하도록 합니다.
+        배치 작업 전체에 대한 실패(시그니처 검출, 분석 에러 등)는 어느 문서 때문인지 알 수 없으므로
+        각 문서를 따로 변환하여 원인이 된 문서만 실패하도록 합니다.
+        @param err_code: 배치 작업의 에러 코드 (로그 및 batch_requeued_total 기록용)
+        """
+        log.warning('배치 작업이 실패하여 문서별로 다시 변환합니다. 작업ID: {}, 에러 코드: {}, 문서 수: {}'
+                    .format(task_id, err_code, len(jobs)))
+        for job_id, file_path in jobs:
+            self.batch_members.pop(job_id, None)
+        self.journal.requeue([job_id for job_id, file_path in jobs])
+        self.metrics.inc('batch_requeued_total', {'code': err_code}, len(jobs))
+
+    def _success(self, job_id, file_path, result_data, task_id, spans = None):
+        """
+        @param spans: 처리 과정 기록에 추가할 DocConverter의 단계별 소요 시간 (DocConverter.pop_spans()의 반환값)
+        """
+        start_time = time.time()
+        self.linker.success(file_path, result_data)
+        end_time = time.time()
+        self.metrics.observe('deliver_seconds', end_time - start_time)
+        self.journal.delivered(job_id)
+        self.metrics.inc('delivered_total')
+        if self.tracer:
+            deliver_span = {'name': 'deliver', 'start': start_time, 'end': end_time}
+            self.tracer.write(job_id, file_path, task_id, (spans or []) + [deliver_span])
+
+    def _fail(self, job_id, file_path, err_code, task_id, spans = None):
+        self.linker.fail(file_path, err_code)
+        self.journal.failed(job_id, err_code)
+        self.metrics.inc('errors_total', {'code': err_code})
+        if self.tracer:
+            self.tracer.write(job_id, file_path, task_id, spans, err_code)
 
 
 def create_linker(conf):
-    linker = FileLinker()
+    watch_mode = get_conf(conf, 'Path', 'WatchMode', 'poll')
+    if watch_mode == 'inotify':
+        linker = InotifyFileLinker()
+        linker.set_rescan_interval(float(get_conf(conf, 'Path', 'RescanInterval', '60')))
+    else:
+        linker = FileLinker()
     linker.set_target_dir(conf['Path']['TargetDir'])
     linker.set_result_dir(conf['Path']['ResultDir'])
     linker.set_error_dir(conf['Path']['ErrorDir'])
+
+    weights = {}
+    for item in get_conf(conf, 'Scheduler', 'ExtensionWeight', '').split(','):
+        if item.strip():
+            ext, weight = item.split(':')
+            weights[ext.strip()] = float(weight)
+    policy = create_schedule_policy(get_conf(conf, 'Scheduler', 'Policy', 'fifo'), weights)
+    linker.set_schedule_policy(policy, float(get_conf(conf, 'Scheduler', 'MaxWait', '0')))
     return linker
 
 
@@ -172,9 +610,45 @@ def create_doc_converter(conf):
     ext_list = [x.strip() for x in ext_list]
     doc_converter.set_supports_extensions(ext_list)
 
+    doc_converter.set_pool_size(int(get_conf(conf, 'DocConverter', 'PoolSize', '10')))
+    timeouts = {}
+    for operation, option in [('connect', 'ConnectTimeout'), ('create', 'CreateTaskTimeout'),
+                              ('status', 'StatusTimeout'), ('report', 'ReportTimeout'),
+                              ('delete', 'DeleteTaskTimeout')]:
+        value = get_conf(conf, 'DocConverter', option, '')
+        if value:
+            timeouts[operation] = float(value)
+    doc_converter.set_timeouts(timeouts)
+    doc_converter.set_stream_report(get_conf(conf, 'JsonReportAnalyser', 'ParseMode', 'full') == 'stream')
+    doc_converter.set_converted_file_url_root(get_conf(conf, 'DocConverter', 'ConvertedFileUrlRoot', ''))
+    doc_converter.set_report_source(get_conf(conf, 'DocConverter', 'ReportSource', 'api'))
+    doc_converter.set_report_gzip(get_conf(conf, 'DocConverter', 'ReportGzip', 'yes') == 'yes')
+    doc_converter.set_stream_upload(get_conf(conf, 'DocConverter', 'StreamUpload', 'yes') == 'yes')
+    doc_converter.set_batch_timeout(float(get_conf(conf, 'Batch', 'BaseTimeout', '60')),
+                                    float(get_conf(conf, 'Batch', 'DocumentTimeout', '30')))
+
+    doc_converter.set_list_page_size(int(get_conf(conf, 'DocConverter', 'ListPageSize', '100')),
+                                     int(get_conf(conf, 'DocConverter', 'ListMaxPages', '10')))
+
     return doc_converter
 
 
+def create_poll_scheduler(conf):
+    poll_scheduler = PollScheduler()
+
+    poll_scheduler.set_poll_interval(float(get_conf(conf, 'ConvertResultProcessor', 'MinPollInterval', '1')),
+                                     float(get_conf(conf, 'ConvertResultProcessor', 'MaxPollInterval', '30')))
+
+    durations = get_conf(conf, 'ConvertResultProcessor', 'ExpectedDuration', 'default:60')
+    expected_durations = {}
+    for item in durations.split(','):
+        ext, duration = item.split(':')
+        expected_durations[ext.strip()] = float(duration)
+    poll_scheduler.set_expected_durations(expected_durations)
+
+    return poll_scheduler
+
+
 def create_report_analyser(conf):
     report_analyser = JsonReportAnalyser()
     
@@ -186,26 +660,195 @@ def create_report_analyser(conf):
     return report_analyser
 
 
-def process_request(q, flag, conf):
-    """파일 변환 요청을 처리합니다."""
-    linker = create_linker(conf)
+def create_cache(conf):
+    """설정([Cache] 섹션)에 따라 ConversionCache 객체를 만듭니다. 캐시를 사용하지 않으면 None 반환."""
+    if get_conf(conf, 'Cache', 'Enabled', 'no') != 'yes':
+        return None
+    max_size = int(float(get_conf(conf, 'Cache', 'MaxSize', '1024')) * 1024 * 1024)
+    cache = ConversionCache(conf['Cache']['CacheDir'], max_size)
+    cache.set_scan_interval(float(get_conf(conf, 'Cache', 'ScanInterval', '60')))
+    return cache
+
+
+def create_admission_controller(conf, doc_converter):
+    """설정([Admission] 섹션)에 따라 AdmissionController 객체를 만듭니다. 사용하지 않으면 None 반환."""
+    if get_conf(conf, 'Admission', 'Enabled', 'no') != 'yes':
+        return None
+    admission_controller = AdmissionController(doc_converter)
+    admission_controller.set_headroom(int(get_conf(conf, 'Admission', 'Headroom', '2')))
+    admission_controller.set_refresh_interval(float(get_conf(conf, 'Admission', 'RefreshInterval', '30')))
+    return admission_controller
+
+
+def create_batch_collector(conf):
+    """설정([Batch] 섹션)에 따라 BatchCollector 객체를 만듭니다. 배치 작업을 사용하지 않으면 None 반환."""
+    if get_conf(conf, 'Batch', 'Enabled', 'no') != 'yes':
+        return None
+    exts = [x.strip() for x in get_conf(conf, 'Batch', 'Extensions', 'doc,docx').split(',') if x.strip()]
+    return BatchCollector(int(get_conf(conf, 'Batch', 'MaxDocuments', '10')),
+                          float(get_conf(conf, 'Batch', 'MaxWait', '10')),
+                          int(float(get_conf(conf, 'Batch', 'MaxDocumentSize', '1')) * 1024 * 1024),
+                          exts)
+
+
+def get_coalesce_window(conf):
+    """내용이 같은 파일의 작업을 합칠 수 있는 시간을 반환합니다. 작업을 합치지 않으면 0."""
+    if get_conf(conf, 'RequestProcessor', 'Coalesce', 'no') != 'yes':
+        return 0
+    return float(get_conf(conf, 'RequestProcessor', 'CoalesceWindow', '600'))
+
+
+def get_journal_path(conf):
+    """작업 기록(SQLite) 파일의 경로를 반환합니다. 지정하지 않으면 에이전트와 같은 디렉토리에 생성합니다."""
+    journal_path = get_conf(conf, 'Journal', 'Path', '')
+    if not journal_path:
+        this_dir, this_file_name = os.path.split(os.path.realpath(__file__))
+        journal_path = os.path.join(this_dir, 'journal.db')
+    return journal_path
+
+
+def recover_journal(conf):
+    """이전에 실행되던 에이전트가 처리하지 못한 작업을 되살립니다. (작업자를 시작하기 전에 호출)"""
+    journal = JobJournal(get_journal_path(conf))
+    try:
+        requeued, resubmitted = journal.recover()
+    finally:
+        journal.close()
+    if requeued or resubmitted:
+        log.info('처리하지 못한 작업을 되살렸습니다. (다시 생성: {}, 다시 조회: {})'.format(requeued, resubmitted))
+    return requeued, resubmitted
+
+
+def create_tracer(conf, linker, journal):
+    """설정([Trace] 섹션)에 따라 JobTracer 객체를 만듭니다. 기록하지 않으면 None 반환."""
+    write_sidecar = get_conf(conf, 'Trace', 'Enabled', 'no') == 'yes'
+    jsonl_path = get_conf(conf, 'Trace', 'JsonLinesFile', '')
+    capture_path = get_conf(conf, 'Trace', 'CaptureFile', '')
+    if not write_sidecar and not jsonl_path and not capture_path:
+        return None
+    tracer = JobTracer(linker, journal)
+    tracer.set_write_sidecar(write_sidecar)
+    tracer.set_jsonl_path(jsonl_path)
+    tracer.set_capture_path(capture_path)
+    return tracer
+
+
+def process_request(flag, conf, linker = None, admission_controller = None, metrics = None):
+    """파일 변환 요청을 처리합니다.
+    @param linker: 여러 스레드가 공유할 Linker 객체. None이면 새로 생성합니다.
+    @param admission_controller: 여러 스레드가 공유할 AdmissionController 객체. None이면 설정에 따라 새로 생성합니다.
+    @param metrics: 단계별 처리 시간을 기록할 Metrics 객체. None이면 기록하지 않습니다.
+    """
+    if not linker:
+        linker = create_linker(conf)
+    if not metrics:
+        metrics = Metrics()
     doc_converter = create_doc_converter(conf)
+    doc_converter.set_metrics(metrics)
+    if not admission_controller:
+        admission_controller = create_admission_controller(conf, doc_converter)
+
+    journal = JobJournal(get_journal_path(conf))
 
     p = RequestProcessor()
     p.set_linker(linker)
+    p.set_journal(journal)
+    p.set_tracer(create_tracer(conf, linker, journal))
     p.set_doc_converter(doc_converter)
-    p.run(q, flag, conf)
-
-
-def process_conv_result(q, flag, conf):
-    """파일 변환 결과를 처리합니다."""
-    linker = create_linker(conf)
+    p.set_cache(create_cache(conf))
+    p.set_coalesce_window(get_coalesce_window(conf))
+    p.set_batch_collector(create_batch_collector(conf))
+    p.set_admission_controller(admission_controller)
+    p.set_metrics(metrics)
+    p.run(flag, conf)
+
+
+def process_conv_result(flag, conf, linker = None, metrics = None):
+    """파일 변환 결과를 처리합니다.
+    @param linker: 여러 스레드가 공유할 Linker 객체. None이면 새로 생성합니다.
+    @param metrics: 단계별 처리 시간을 기록할 Metrics 객체. None이면 기록하지 않습니다.
+    """
+    if not linker:
+        linker = create_linker(conf)
+    if not metrics:
+        metrics = Metrics()
     doc_converter = create_doc_converter(conf)
+    doc_converter.set_metrics(metrics)
+
+    journal = JobJournal(get_journal_path(conf))
 
     p = ConvertResultProcessor()
     p.set_linker(linker)
+    p.set_journal(journal)
+    p.set_tracer(create_tracer(conf, linker, journal))
     p.set_doc_converter(doc_converter)
-    p.run(q, flag, conf)
+    p.set_cache(create_cache(conf))
+    p.set_coalesce_window(get_coalesce_window(conf))
+    p.set_poll_scheduler(create_poll_scheduler(conf))
+    p.set_metrics(metrics)
+    p.run(flag, conf)
+
+
+def create_process_workers(conf, metrics = None):
+    """요청 처리 프로세스와 결과 처리 프로세스를 각각 1개씩 생성합니다. (기존 방식)
+    @param metrics: 각 프로세스가 기록한 값을 모을 Metrics 객체. None이면 기록하지 않습니다.
+        (각 프로세스는 QueueMetrics로 값을 보내며, MetricsCollector 스레드가 받아서 합침)
+    @return: (작업 수행/중단을 통제하는 Event 객체, 작업자 목록)
+    """
+    e = Event()
+    e.set()
+
+    workers = []
+    if metrics:
+        q = Queue(1000)
+        workers.append(Process(target=process_request, args=(e, conf, None, None, QueueMetrics(q))))
+        workers.append(Process(target=process_conv_result, args=(e, conf, None, QueueMetrics(q))))
+        workers.append(MetricsCollector(q, metrics, e))
+    else:
+        workers.append(Process(target=process_request, args=(e, conf)))
+        workers.append(Process(target=process_conv_result, args=(e, conf)))
+    return e, workers
+
+
+def create_thread_workers(conf, metrics = None):
+    """하나의 프로세스 안에서 동시에 동작하는 요청 처리/결과 처리 스레드를 생성합니다.
+    각 스레드는 DocConverter와 JobJournal을 따로 가지며, Linker는 SynchronizedLinker로 감싸서 공유합니다.
+    (AdmissionController와 Metrics도 스레드들이 공유함)
+    @param metrics: 각 스레드가 값을 기록할 Metrics 객체. None이면 기록하지 않습니다.
+    @return: (작업 수행/중단을 통제하는 Event 객체, 작업자 목록)
+    """
+    e = threading.Event()
+    e.set()
+
+    linker = SynchronizedLinker(create_linker(conf))
+    admission_controller = create_admission_controller(conf, create_doc_converter(conf))
+
+    workers = []
+    for i in range(int(get_conf(conf, 'Engine', 'RequestWorkers', '1'))):
+        workers.append(threading.Thread(target=process_request, args=(e, conf, linker, admission_controller, metrics)))
+    for i in range(int(get_conf(conf, 'Engine', 'ResultWorkers', '1'))):
+        workers.append(threading.Thread(target=process_conv_result, args=(e, conf, linker, metrics)))
+    return e, workers
+
+
+def create_workers(conf, metrics = None):
+    """설정([Engine] 섹션의 Mode)에 맞는 작업자들을 생성합니다.
+    @param metrics: 작업자들이 기록한 값을 모을 Metrics 객체. None이면 기록하지 않습니다.
+    """
+    mode = get_conf(conf, 'Engine', 'Mode', 'process')
+    if mode == 'thread':
+        return create_thread_workers(conf, metrics)
+    elif mode == 'process':
+        return create_process_workers(conf, metrics)
+    else:
+        raise ValueError('알 수 없는 Engine Mode입니다. (Mode: {})'.format(mode))
+
+
+def get_conf(conf, section, option, default):
+    """설정 값을 반환합니다. 설정 파일에 항목이 없으면 default를 반환합니다.
+    (이전 버전의 설정 파일과 호환성을 유지하기 위함)
+    """
+    return conf.get(section, {}).get(option, default)
 
 
 def load_config():
@@ -238,18 +881,24 @@ if __name__ == '__main__':
         print('Can not load config. Cause: {}'.format(e))
         sys.exit()
 
-    q = Queue()
-    e = Event()
-    e.set()
+    print('recover jobs...')
+    requeued, resubmitted = recover_journal(conf)
+    print('recovered jobs. (requeued: {}, resubmitted: {})'.format(requeued, resubmitted))
+
+    metrics = None
+    if get_conf(conf, 'Metrics', 'Enabled', 'no') == 'yes':
+        print('starting metrics server...')
+        metrics = Metrics()
+        start_metrics_server(metrics, int(get_conf(conf, 'Metrics', 'Port', '9464')),
+                             get_conf(conf, 'Metrics', 'Host', '127.0.0.1'))
 
     print('set-up worker...')
-    p1 = Process(target=process_request, args=(q, e, conf))
-    p2 = Process(target=process_conv_result, args=(q, e, conf))
+    e, workers = create_workers(conf, metrics)
 
     print('starting worker...')
-    p1.start()
-    p2.start()
-    print('all worker started.')
+    for worker in workers:
+        worker.start()
+    print('all worker started. (count: {})'.format(len(workers)))
 
     while True:
         command = raw_input('Please type "exit" to quit this agent. ')
@@ -262,8 +911,8 @@ if __name__ == '__main__':
     print('quit signal on.')
 
     print('wait for worker')
-    p1.join()
-    p2.join()
+    for worker in workers:
+        worker.join()
 
     print('Bye!')
     sys.exit()
@@ -23,8 +23,18 @@
 
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
+import hashlib
+import time
+import tempfile
+import zipfile
+from cStringIO import StringIO
+
+from metrics import Metrics
+from multipart import MultipartFileEncoder
+from report_analyser import BatchResult
 
 import logging
 log = logging.getLogger(__name__)
@@ -50,6 +60,22 @@ class DocConverter:
         """
         pass
 
+    def create_batch_task(self, documents):
+        """여러 문서를 하나의 작업(배치 작업)으로 변환하도록 생성합니다.
+        배치 작업의 get_result()는 문서 이름별 결과를 담은 BatchResult를 반환합니다.
+        @param documents: (문서 이름, 파일 경로) 목록. 문서 이름은 결과를 구분하는 데 사용합니다.
+        @return: 작업 ID
+        @raise UnsupportedFileTypeError: 지원하지 않는 파일 형식이 포함되어 있을 때.
+        @raise DocConverterError: 기타 에러 발생 시. (배치 작업을 지원하지 않는 경우 포함)
+        """
+        raise DocConverterError('배치 작업을 지원하지 않습니다.')
+
+    def check_extension(self, target_path):
+        """변환할 수 있는 파일 형식인지 확인합니다.
+        @raise UnsupportedFileTypeError: 지원하지 않는 파일 형식일 때.
+        """
+        pass
+
     def get_status(self, task_id):
         """현재 진행 상태를 반환합니다.
         @param task_id: create_work이 반환한 값.
@@ -57,11 +83,24 @@ class DocConverter:
         """
         pass
 
-    def get_result(self, task_id):
+    def get_status_many(self, task_ids):
+        """여러 작업의 현재 진행 상태를 한 번에 반환합니다.
+        @param task_ids: 작업ID 목록
+        @return: 작업ID -> 진행 상태(get_status()의 반환값과 같음) dict
+        """
+        statuses = {}
+        for task_id in task_ids:
+            statuses[task_id] = self.get_status(task_id)
+        return statuses
+
+    def get_result(self, task_id, result_file = None):
         """파일 변환 결과를 반환합니다.
+        @param result_file: 결과 파일의 데이터를 기록할 파일 객체 (Linker.create_result_file()의 반환값)
+            None이거나 지원하지 않는 경우 결과 파일의 데이터를 메모리에 올려서 반환합니다.
         @return: (성공 여부, 결과 파일 데이터 혹은 에러 코드)
-            첫 번째 값이 True일 때 두 번째 값은 결과 파일의 바이너리 데이터입니다.
+            첫 번째 값이 True일 때 두 번째 값은 결과 파일의 바이너리 데이터 혹은 데이터를 기록한 result_file입니다.
             첫 번째 값이 False일 때 두 번째 값은 에러 코드(문자열)입니다.
+            배치 작업인 경우 두 번째 값은 문서별 결과를 담은 BatchResult입니다. (result_file은 사용하지 않음)
         """
         pass
 
@@ -70,12 +109,42 @@ class DocConverter:
         """
         pass
 
+    def get_machine_count(self):
+        """동시에 변환 작업을 수행할 수 있는 가상 머신의 수를 반환합니다.
+        @return: 가상 머신의 수. 알 수 없으면 None.
+        @raise DocConverterError: 조회 중 에러 발생 시.
+        """
+        return None
+
+    def pop_spans(self, task_id):
+        """get_result()까지 측정한 작업의 단계별 소요 시간을 반환하고 지웁니다.
+        @return: {'name', 'start', 'end'} dict 목록
+        """
+        return []
+
 
 class SandboxDocConverter(DocConverter):
     def __init__(self):
         self.root_url = ''
         self.report_analyser = None
         self.supports_extensions = []
+        self.list_page_size = 100
+        self.list_max_pages = 10
+        self.stream_report = False
+        self.stream_upload = True
+        self.report_source = 'api'
+        self.converted_file_url_root = ''
+        self.batch_timeout = (60, 60) # 배치 작업의 분석 제한 시간 = 기본 시간 + 문서 수 x 문서당 시간 (단위: 초)
+        self.timeouts = {'connect': 5, 'create': 60, 'status': 10, 'report': 120, 'delete': 10}
+        self.session = requests.Session() # cuckoo REST API 서버와의 연결을 재사용하기 위함
+        self.set_pool_size(10)
+        self.metrics = Metrics()
+        self.task_times = {} # 작업ID -> 레포트 작성이 끝난 작업의 (added_on, started_on, completed_on, 완료를 확인한 시각)
+        self.task_spans = {} # 작업ID -> get_result()에서 측정한 단계별 소요 시간 목록
+
+    def set_metrics(self, metrics):
+        """단계별 처리 시간을 기록할 Metrics 객체를 지정합니다."""
+        self.metrics = metrics
 
     def set_server_url(self, root_url):
         """
@@ -83,6 +152,68 @@ class SandboxDocConverter(DocConverter):
         """
         self.root_url = root_url
 
+    def set_pool_size(self, pool_size):
+        """cuckoo REST API 서버와 유지할 연결의 최대 개수를 지정합니다."""
+        adapter = HTTPAdapter(pool_connections = 1, pool_maxsize = pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def set_timeouts(self, timeouts):
+        """요청 종류별 제한 시간을 지정합니다. (단위: 초)
+        @param timeouts: 'connect'(연결), 'create'(작업 생성), 'status'(상태 조회),
+            'report'(레포트 조회), 'delete'(작업 삭제) 중 변경할 항목만 담은 dict
+        """
+        self.timeouts.update(timeouts)
+
+    def set_report_gzip(self, use_gzip):
+        """레포트를 gzip으로 압축하여 전송해 달라고 요청할지 지정합니다.
+        (API 서버 혹은 그 앞단의 웹서버가 gzip 압축을 지원해야 효과가 있음)
+        """
+        if use_gzip:
+            self.session.headers['Accept-Encoding'] = 'gzip'
+        else:
+            self.session.headers['Accept-Encoding'] = 'identity'
+
+    def set_stream_report(self, stream_report):
+        """레포트를 스트림으로 읽으면서 분석할지(ReportAnalyser.analyse_stream() 사용) 지정합니다."""
+        self.stream_report = stream_report
+
+    def set_stream_upload(self, stream_upload):
+        """작업을 생성할 때 파일을 조금씩 읽으면서 보낼지(MultipartFileEncoder 사용) 지정합니다.
+        False이면 requests가 요청 본문 전체를 메모리에 만든 후 보냅니다.
+        """
+        self.stream_upload = stream_upload
+
+    def set_converted_file_url_root(self, url_root):
+        """레포트에 파일 정보만 포함된 경우 변환된 파일을 받아올 기본 경로를 지정합니다.
+        파일은 <url_root>/<작업ID>/<분석 디렉토리 내 상대 경로>에서 받아옵니다.
+        @param url_root: cuckoo의 분석 디렉토리(storage/analyses)를 제공하는 웹서버의 주소 (예: 'http://127.0.0.1:8080/analyses')
+            혹은 같은 서버에 있는 경우 'file://'로 시작하는 경로 (예: 'file:///home/cuckoo/.cuckoo/storage/analyses')
+        """
+        self.converted_file_url_root = url_root.rstrip('/')
+
+    def set_report_source(self, report_source):
+        """레포트를 받아올 곳을 지정합니다.
+        @param report_source: 'api': REST API의 전체 레포트(/tasks/report/<작업ID>/json)
+            'conversion': conversion 레포팅 모듈이 만든 작은 레포트(<converted_file_url_root>/<작업ID>/reports/conversion.json)
+                (converted_file_url_root가 지정되어야 하며, 레포트가 없으면 전체 레포트를 받음)
+        """
+        self.report_source = report_source
+
+    def set_batch_timeout(self, base_timeout, document_timeout):
+        """배치 작업의 분석 제한 시간(쿠쿠의 timeout)을 정하는 값을 지정합니다.
+        제한 시간은 base_timeout + 문서 수 x document_timeout입니다. (단위: 초)
+        """
+        self.batch_timeout = (base_timeout, document_timeout)
+
+    def _timeout(self, operation):
+        return (self.timeouts['connect'], self.timeouts[operation])
+
+    def set_list_page_size(self, list_page_size, list_max_pages):
+        """get_status_many()에서 /tasks/list를 조회할 때 한 페이지의 크기와 최대 페이지 수를 지정합니다."""
+        self.list_page_size = list_page_size
+        self.list_max_pages = list_max_pages
+
     def set_report_analyser(self, report_analyser):
         self.report_analyser = report_analyser
 
@@ -92,15 +223,10 @@ class SandboxDocConverter(DocConverter):
         """
         self.supports_extensions = [ x.lower() for x in exts ]
 
-    def create_task(self, target_path):
-        """새로운 변환 작업을 생성합니다.
-        @param target_path: 변환할 파일의 경로.
-        @return: 작업 ID.
-        @raise UnsupportedFileType: 지원하지 않는 파일 형식일 때.
-        @raise DocConverterError: 기타 에러 발생 시.
+    def check_extension(self, target_path):
+        """변환할 수 있는 파일 형식인지 확인합니다.
+        @raise UnsupportedFileTypeError: 지원하지 않는 파일 형식일 때.
         """
-
-        # 확장자 검증
         root, ext = os.path.splitext(target_path)
         ext = ext[1:] # 가장 앞의 "."을 제거함.
         ext = ext.lower()
@@ -109,16 +235,79 @@ class SandboxDocConverter(DocConverter):
         else:
             raise UnsupportedFileTypeError('지원하지 않는 파일 형식입니다. (확장자: {})'.format(ext))
 
-        url = self.root_url + '/tasks/create/file'
+    def create_task(self, target_path):
+        """새로운 변환 작업을 생성합니다.
+        @param target_path: 변환할 파일의 경로.
+        @return: 작업 ID.
+        @raise UnsupportedFileType: 지원하지 않는 파일 형식일 때.
+        @raise DocConverterError: 기타 에러 발생 시.
+        """
+
+        # 확장자 검증
+        self.check_extension(target_path)
 
         with open(target_path, 'rb') as sample:
-            base_name = os.path.basename(target_path)
-            multipart_file = {'file': (base_name, sample)}
-            param = {'package': 'doc_conv'}
-            request = requests.post(url, data = param, files = multipart_file)
+            return self._post_file(sample, os.path.basename(target_path), {'package': 'doc_conv'}, target_path)
+
+    def create_batch_task(self, documents):
+        """여러 문서를 zip 파일 하나로 묶어서 하나의 작업(배치 작업)으로 생성합니다.
+        zip 파일 안의 파일명은 <문서 이름>.<원본 확장자>이며, doc_conv 분석 패키지가 차례대로 인쇄합니다.
+        쿠쿠는 감시 중인 프로세스가 모두 종료되면 분석을 끝내므로, 모든 문서를 인쇄할 때까지 분석이 끝나지 않도록
+        enforce_timeout을 지정합니다. (분석은 패키지의 check()가 False를 반환하거나 제한 시간이 지나면 끝남)
+        @param documents: (문서 이름, 파일 경로) 목록
+        @return: 작업 ID.
+        @raise UnsupportedFileType: 지원하지 않는 파일 형식이 포함되어 있을 때.
+        @raise DocConverterError: 기타 에러 발생 시.
+        """
+        for name, target_path in documents:
+            self.check_extension(target_path)
+
+        base_timeout, document_timeout = self.batch_timeout
+        param = {'package': 'doc_conv',
+                 'options': 'batch=yes,document_timeout={}'.format(int(document_timeout)),
+                 'enforce_timeout': '1',
+                 'timeout': str(int(base_timeout + len(documents) * document_timeout))}
+
+        # 원본 파일들을 메모리에 올리지 않도록 임시 파일에 묶음. (닫으면 자동으로 삭제됨)
+        with tempfile.TemporaryFile() as batch_file:
+            try:
+                with zipfile.ZipFile(batch_file, 'w', zipfile.ZIP_DEFLATED) as archive:
+                    for name, target_path in documents:
+                        root, ext = os.path.splitext(target_path)
+                        archive.write(target_path, name + ext.lower())
+            except (IOError, OSError, zipfile.BadZipfile) as e:
+                raise DocConverterError('배치 파일 생성 실패. 원인: {}'.format(e))
+            batch_file.flush()
+            batch_file.seek(0)
+
+            description = '배치 작업 (문서 {}개: {})'.format(
+                len(documents), ', '.join(target_path for name, target_path in documents))
+            return self._post_file(batch_file, 'batch.zip', param, description)
+
+    def _post_file(self, sample, base_name, param, description):
+        """/tasks/create/file로 파일을 보내서 작업을 생성합니다.
+        @param sample: 보낼 파일 객체
+        @param base_name: 쿠쿠에 알려줄 파일명
+        @param param: 파일 외에 보낼 항목 (dict)
+        @param description: 변환을 시도한 파일 (에러 메시지용)
+        @return: 작업 ID.
+        @raise DocConverterError: 작업 생성에 실패했을 때.
+        """
+        url = self.root_url + '/tasks/create/file'
+        try:
+            if self.stream_upload:
+                encoder = MultipartFileEncoder(param, 'file', base_name, sample)
+                request = self.session.post(url, data = encoder, headers = {'Content-Type': encoder.content_type},
+                                            timeout = self._timeout('create'))
+            else:
+                multipart_file = {'file': (base_name, sample)}
+                request = self.session.post(url, data = param, files = multipart_file,
+                                            timeout = self._timeout('create'))
+        except requests.RequestException as e:
+            raise DocConverterError('작업 생성 실패. 변환을 시도한 파일: {}, 원인: {}'.format(description, e))
 
         if request.status_code != 200:
-            raise DocConverterError('작업 생성 실패. 변환을 시도한 파일: {}'.format(target_path))
+            raise DocConverterError('작업 생성 실패. 변환을 시도한 파일: {}'.format(description))
 
         json_decoder = json.JSONDecoder()
         task_id = json_decoder.decode(request.text)['task_id']
@@ -130,7 +319,7 @@ class SandboxDocConverter(DocConverter):
         @return: 'pending'(대기), 'running'(진행 중), 'completed' (완료), 'error' (에러)
         """
         url = self.root_url + '/tasks/view/' + str(task_id)
-        request = requests.get(url)
+        request = self.session.get(url, timeout = self._timeout('status'))
         if request.status_code == 200:
             pass
         elif request.status_code == 404:
@@ -144,46 +333,249 @@ class SandboxDocConverter(DocConverter):
 
         json_decoder = json.JSONDecoder()
         json_root = json_decoder.decode(request.text)
+        return self._convert_status(json_root['task'])
 
-        error = json_root['task']['errors']
+    def _convert_status(self, task):
+        """cuckoo의 작업 정보를 DocConverter의 진행 상태로 변환합니다.
+        @param task: cuckoo REST API가 반환한 작업 정보 (dict)
+        """
+        error = task['errors']
         if len(error) > 0:
-            log.error('파일 변환 중 에러가 발생했습니다. 에러: {}'.format(str(error)))
+            log.error('파일 변환 중 에러가 발생했습니다. 작업ID: {}, 에러: {}'.format(task['id'], str(error)))
             return 'error'
 
-        status = json_root['task']['status']
+        status = task['status']
         if status == 'completed':
             # cuckoo에서 상태값은 pending -> running -> completed -> reported 순으로 변화된다.
             # 즉 completed라고 해도 아직 reported 단계가 남아 있으므로 running으로 반환한다.
             status = 'running'
         elif status == 'reported':
             status = 'completed'
+            if not task['id'] in self.task_times:
+                self.task_times[task['id']] = (_parse_time(task.get('added_on')), _parse_time(task.get('started_on')),
+                                               _parse_time(task.get('completed_on')), time.time())
 
         return status
 
-    def get_result(self, task_id):
+    def get_status_many(self, task_ids):
+        """여러 작업의 현재 진행 상태를 한 번에 반환합니다.
+        /tasks/list를 페이지 단위로 조회하여 한 번의 요청으로 여러 작업의 상태를 가져오며,
+        목록에서 찾지 못한 작업만 /tasks/view로 하나씩 조회합니다.
+        목록의 순서는 쿠쿠 버전마다 다르므로(1.x: 최신 작업부터, 2.x: 완료 시각 순) 순서에 의존하지 않고
+        모든 작업을 찾거나 목록이 끝날 때까지(최대 list_max_pages 페이지) 조회합니다.
+        @param task_ids: 작업ID 목록
+        @return: 작업ID -> 진행 상태(get_status()의 반환값과 같음) dict
+        """
+        remaining = set(task_ids)
+        statuses = {}
+        if not remaining:
+            return statuses
+
+        offset = 0
+        for page in range(self.list_max_pages):
+            url = self.root_url + '/tasks/list/' + str(self.list_page_size) + '/' + str(offset)
+            request = self.session.get(url, timeout = self._timeout('status'))
+            if request.status_code != 200:
+                log.warning('작업 목록 조회 중 에러가 발생했습니다. HTTP 응답 코드: {}'.format(request.status_code))
+                break
+
+            json_decoder = json.JSONDecoder()
+            tasks = json_decoder.decode(request.text)['tasks']
+            for task in tasks:
+                if task['id'] in remaining:
+                    statuses[task['id']] = self._convert_status(task)
+                    remaining.discard(task['id'])
+
+            if not remaining or len(tasks) < self.list_page_size:
+                break
+            offset += self.list_page_size
+
+        for task_id in remaining:
+            statuses[task_id] = self.get_status(task_id)
+
+        return statuses
+
+    def get_result(self, task_id, result_file = None):
         """파일 변환 결과를 반환합니다.
+        @param result_file: 결과 파일의 데이터를 기록할 파일 객체 (Linker.create_result_file()의 반환값)
+            None이거나 지원하지 않는 경우 결과 파일의 데이터를 메모리에 올려서 반환합니다.
         @return: (성공 여부, 결과 파일 데이터 혹은 에러 코드)
-            첫 번째 값이 True일 때 두 번째 값은 결과 파일의 바이너리 데이터입니다.
+            첫 번째 값이 True일 때 두 번째 값은 결과 파일의 바이너리 데이터 혹은 데이터를 기록한 result_file입니다.
             첫 번째 값이 False일 때 두 번째 값은 에러 코드(문자열)입니다.
         """
-        url = self.root_url + '/tasks/report/' + str(task_id) + '/json'
-        request = requests.get(url)
+        start_time = time.time()
+        request = self._request_report(task_id)
         if request.status_code == 200:
-            return self.report_analyser.analyse(request.text)
+            self.task_spans[task_id] = spans = []
+            self._observe_task_times(task_id, spans)
+            if self.stream_report:
+                # 레포트 전체를 메모리에 올리지 않고 읽으면서 분석함. (분석이 일찍 끝나면 나머지는 받지 않음)
+                try:
+                    request.raw.decode_content = True
+                    stream = _TimedReader(request.raw)
+                    is_success, result_data = self.report_analyser.analyse_stream(stream, task_id, result_file)
+                    # 받는 시간과 분석하는 시간이 섞여 있으므로 read()에 걸린 시간만 받는 시간으로 계산함.
+                    download_time = time.time() - start_time
+                    decode_time = max(download_time - (stream.start_time - start_time) - stream.read_time, 0)
+                    download_time -= decode_time
+                    download_size = request.raw.tell()
+                finally:
+                    request.close()
+            else:
+                try:
+                    text = request.text
+                    download_time = time.time() - start_time
+                    download_size = request.raw.tell()
+                finally:
+                    request.close() # file:// 경로의 conversion.json을 연 파일도 닫음.
+                is_success, result_data = self.report_analyser.analyse(text)
+                decode_time = time.time() - start_time - download_time
+
+            self.metrics.observe('report_download_seconds', download_time)
+            self.metrics.observe('report_download_bytes', download_size)
+            self.metrics.observe('report_decode_seconds', decode_time)
+            # 받기와 분석이 섞여 있는 stream 모드에서도 받기에 걸린 시간을 먼저, 분석에 걸린 시간을 나중에 표시함.
+            spans.append({'name': 'report_download', 'start': start_time, 'end': start_time + download_time})
+            spans.append({'name': 'report_decode', 'start': start_time + download_time,
+                          'end': start_time + download_time + decode_time})
+
+            if is_success and isinstance(result_data, BatchResult):
+                return (True, self._get_batch_files(task_id, result_data))
+            if is_success and isinstance(result_data, dict):
+                # 레포트에 파일 정보만 포함된 경우 파일을 따로 받아옴.
+                return self._get_converted_file(task_id, result_data, result_file)
+            return (is_success, result_data)
         elif request.status_code == 404:
+            request.close()
             log.warning('존재하지 않는 작업ID로 레포트를 조회하였습니다.\
                         조회를 시도한 작업ID: {}'.format(task_id))
             return (False, '10001')
         else:
+            request.close()
             log.warning('레포트 조회 중 에러가 발생했습니다.\
                         조회를 시도한 작업ID: {}, HTTP 응답 코드: {}'.format(task_id, request.status_code))
             return (False, '10002')
 
+    def _request_report(self, task_id):
+        """레포트를 요청합니다. report_source가 'conversion'이면 conversion.json을 먼저 요청하고, 없으면 전체 레포트를 요청합니다.
+        (conversion.json은 전체 레포트와 같은 이름의 항목만 담고 있으므로 같은 방법으로 분석함)
+        @return: requests의 응답 객체 (file:// 경로의 conversion.json인 경우 _FileResponse)
+        """
+        if self.report_source == 'conversion' and self.converted_file_url_root:
+            url = self.converted_file_url_root + '/' + str(task_id) + '/reports/conversion.json'
+            if url.startswith('file://'):
+                if os.path.isfile(url[len('file://'):]):
+                    return _FileResponse(url[len('file://'):])
+            else:
+                request = self.session.get(url, timeout = self._timeout('report'), stream = True)
+                if request.status_code == 200:
+                    return request
+                request.close()
+            log.warning('conversion 레포트가 없어서 전체 레포트를 조회합니다. (conversion 레포팅 모듈 설정을 확인하십시오.) 작업ID: {}'
+                        .format(task_id))
+            self.metrics.inc('report_fallback_total')
+
+        url = self.root_url + '/tasks/report/' + str(task_id) + '/json'
+        return self.session.get(url, timeout = self._timeout('report'), stream = self.stream_report)
+
+    def _get_batch_files(self, task_id, batch_result):
+        """배치 작업의 문서 중 레포트에 파일 정보만 포함된 것을 받아옵니다. (배치 작업의 문서는 작으므로 메모리에 올림)
+        @return: 받아온 파일 데이터로 바꾼 batch_result
+        """
+        for name, (is_success, result_data) in batch_result.items():
+            if is_success and isinstance(result_data, dict):
+                batch_result[name] = self._get_converted_file(task_id, result_data, None)
+        return batch_result
+
+    def _get_converted_file(self, task_id, file_info, result_file):
+        """변환된 파일을 받아온 후 크기와 sha256 해시값을 확인합니다.
+        @param file_info: 레포트에 포함된 파일 정보 {'size', 'sha256', 'path'}
+        @return: get_result()와 같음.
+        """
+        relative_path = file_info.get('path', '').replace('\\', '/')
+        if not self.converted_file_url_root or not relative_path or \
+                relative_path.startswith('/') or '..' in relative_path.split('/'):
+            log.error('변환된 파일을 받아올 수 없습니다. (ConvertedFileUrlRoot 설정 혹은 파일 경로를 확인하십시오.)\
+                작업ID: {}, 파일 정보: {}'.format(task_id, file_info))
+            return (False, '30005')
+
+        url = self.converted_file_url_root + '/' + str(task_id) + '/' + relative_path
+        if url.startswith('file://'):
+            try:
+                source = open(url[len('file://'):], 'rb')
+            except (IOError, OSError) as e:
+                log.error('변환된 파일을 열지 못했습니다. 작업ID: {}, URL: {}, 원인: {}'.format(task_id, url, e))
+                return (False, '30005')
+        else:
+            request = self.session.get(url, timeout = self._timeout('report'), stream = True)
+            if request.status_code != 200:
+                request.close()
+                log.error('변환된 파일을 받아오지 못했습니다. 작업ID: {}, URL: {}, HTTP 응답 코드: {}'
+                          .format(task_id, url, request.status_code))
+                return (False, '30005')
+            request.raw.decode_content = True
+            source = request.raw
+
+        out = result_file if result_file else StringIO()
+        sha256 = hashlib.sha256()
+        size = 0
+        start_time = time.time()
+        try:
+            while True:
+                data = source.read(1024 * 1024)
+                if not data:
+                    break
+                sha256.update(data)
+                size += len(data)
+                out.write(data)
+        finally:
+            source.close()
+        self.metrics.observe('converted_file_download_seconds', time.time() - start_time)
+        self.metrics.observe('converted_file_download_bytes', size)
+        self.task_spans.setdefault(task_id, []).append(
+            {'name': 'converted_file_download', 'start': start_time, 'end': time.time()})
+
+        if size != file_info.get('size') or sha256.hexdigest() != file_info.get('sha256'):
+            log.error('받아온 파일이 레포트의 파일 정보와 다릅니다. 작업ID: {}, 파일 정보: {}, 받아온 파일의 크기: {}, sha256: {}'
+                      .format(task_id, file_info, size, sha256.hexdigest()))
+            return (False, '30005')
+
+        if result_file:
+            return (True, result_file)
+        return (True, out.getvalue())
+
+    def _observe_task_times(self, task_id, spans):
+        """쿠쿠에서 작업이 대기/실행/레포트 작성에 걸린 시간을 기록합니다.
+        (쿠쿠 서버와 에이전트의 시계 및 시간대가 같다고 가정함. 레포트 작성 시간은 상태 조회 간격만큼 길게 측정될 수 있음)
+        @param spans: 단계별 소요 시간을 추가할 목록
+        """
+        times = self.task_times.pop(task_id, None)
+        if not times:
+            return
+        added_on, started_on, completed_on, reported_time = times
+        if added_on and started_on:
+            self.metrics.observe('sandbox_pending_seconds', max(started_on - added_on, 0))
+            spans.append({'name': 'sandbox_pending', 'start': added_on, 'end': started_on})
+        if started_on and completed_on:
+            self.metrics.observe('sandbox_running_seconds', max(completed_on - started_on, 0))
+            spans.append({'name': 'sandbox_running', 'start': started_on, 'end': completed_on})
+        if completed_on:
+            self.metrics.observe('sandbox_reporting_seconds', max(reported_time - completed_on, 0))
+            spans.append({'name': 'sandbox_reporting', 'start': completed_on, 'end': reported_time})
+
+    def pop_spans(self, task_id):
+        return self.task_spans.pop(task_id, [])
+
     def delete_task(self, task_id):
         """파일 변환 작업을 삭제합니다.
         """
         url = self.root_url + '/tasks/delete/' + str(task_id)
-        request = requests.get(url)
+        try:
+            request = self.session.get(url, timeout = self._timeout('delete'))
+        except requests.RequestException as e:
+            log.warning('작업 삭제 요청에 실패했습니다. 삭제를 시도한 작업ID: {}, 원인: {}'.format(task_id, e))
+            return
+
         if request.status_code == 200:
             pass
         elif request.status_code == 404:
@@ -195,3 +587,86 @@ class SandboxDocConverter(DocConverter):
         else:
             log.warning('작업 삭제 중 에러가 발생했습니다.\
                         삭제를 시도한 작업ID: {}, HTTP 응답 코드: {}'.format(task_id, request.status_code))
+
+    # 사용할 수 없는 상태의 가상 머신 (virtualbox 머신 관리 모듈에서 에러가 발생한 가상 머신은 machete로 표시됨)
+    BROKEN_MACHINE_STATUSES = ('machete', 'error')
+
+    def get_machine_count(self):
+        """동시에 변환 작업을 수행할 수 있는 가상 머신의 수를 반환합니다.
+        /machines/list로 등록된 가상 머신 중 사용할 수 있는 상태인 것의 수를 세며,
+        조회에 실패하면 /cuckoo/status의 machines.total(cuckoo 2.0 이상)을 사용합니다.
+        @return: 가상 머신의 수. 알 수 없으면 None.
+        @raise DocConverterError: 조회 중 에러 발생 시.
+        """
+        json_decoder = json.JSONDecoder()
+        try:
+            request = self.session.get(self.root_url + '/machines/list', timeout = self._timeout('status'))
+            if request.status_code == 200:
+                machines = json_decoder.decode(request.text)['machines']
+                return len([m for m in machines if not m.get('status') in self.BROKEN_MACHINE_STATUSES])
+            log.warning('가상 머신 목록 조회 중 에러가 발생했습니다. HTTP 응답 코드: {}'.format(request.status_code))
+
+            request = self.session.get(self.root_url + '/cuckoo/status', timeout = self._timeout('status'))
+            if request.status_code == 200:
+                return json_decoder.decode(request.text).get('machines', {}).get('total')
+            log.warning('cuckoo 상태 조회 중 에러가 발생했습니다. HTTP 응답 코드: {}'.format(request.status_code))
+        except (requests.RequestException, ValueError, KeyError) as e:
+            raise DocConverterError('가상 머신 수 조회 실패. 원인: {}'.format(e))
+
+        raise DocConverterError('가상 머신 수 조회 실패.')
+
+
+def _parse_time(value):
+    """cuckoo가 반환한 시각 문자열(예: '2016-05-01 12:34:56')을 epoch 시각으로 변환합니다. 변환할 수 없으면 None."""
+    if not value:
+        return None
+    try:
+        return time.mktime(time.strptime(value[:19], '%Y-%m-%d %H:%M:%S'))
+    except ValueError:
+        return None
+
+
+class _TimedReader:
+    """read()에 걸린 시간을 누적하는 스트림 래퍼. (레포트를 받는 시간과 분석하는 시간을 구분하기 위함)"""
+    def __init__(self, stream):
+        self.stream = stream
+        self.start_time = time.time()
+        self.read_time = 0.0
+
+    def read(self, *args):
+        start_time = time.time()
+        try:
+            return self.stream.read(*args)
+        finally:
+            self.read_time += time.time() - start_time
+
+
+class _FileResponse:
+    """file:// 경로의 파일을 requests의 응답 객체처럼 읽기 위한 래퍼. (get_result()에서 사용하는 속성만 제공)"""
+    status_code = 200
+
+    def __init__(self, path):
+        self.raw = _FileRaw(path)
+
+    @property
+    def text(self):
+        return self.raw.read()
+
+    def close(self):
+        self.raw.close()
+
+
+class _FileRaw:
+    decode_content = False
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+
+    def read(self, *args):
+        return self.file.read(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
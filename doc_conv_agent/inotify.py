@@ -0,0 +1,124 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import os
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+import logging
+log = logging.getLogger(__name__)
+
+
+# 참고: /usr/include/linux/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct('iIII') # wd, mask, cookie, len
+
+
+class InotifyError(Exception):
+    """inotify를 사용할 수 없거나 inotify 관련 작업 중 에러가 발생함을 의미함."""
+    pass
+
+
+class Inotify:
+    """외부 라이브러리 없이 libc의 inotify 시스템 콜을 직접 호출하는 간단한 래퍼입니다. (리눅스 전용)"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise InotifyError('libc를 찾을 수 없습니다.')
+
+        self.libc = ctypes.CDLL(libc_name, use_errno = True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise InotifyError('inotify를 지원하지 않는 환경입니다.')
+
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise InotifyError('inotify 초기화 실패. (errno: {})'.format(ctypes.get_errno()))
+
+    def add_watch(self, path, mask):
+        """감시할 경로를 추가합니다.
+        @param path: 감시할 디렉토리의 경로
+        @param mask: 감시할 이벤트 (예: IN_CLOSE_WRITE | IN_MOVED_TO)
+        @return: watch descriptor
+        """
+        if isinstance(path, unicode):
+            path = path.encode('utf-8')
+        wd = self.libc.inotify_add_watch(self.fd, path, mask)
+        if wd < 0:
+            raise InotifyError('감시 경로 추가 실패. (경로: {}, errno: {})'.format(path, ctypes.get_errno()))
+        return wd
+
+    def wait(self, timeout):
+        """읽을 이벤트가 생길 때까지 기다립니다.
+        @param timeout: 최대 대기 시간 (단위: 초)
+        @return: 읽을 이벤트가 있으면 True, 시간이 초과되면 False.
+        """
+        try:
+            readable, writable, error = select.select([self.fd], [], [], timeout)
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                return False
+            raise
+        return len(readable) > 0
+
+    def read_events(self):
+        """지금까지 쌓인 이벤트를 모두 읽어서 반환합니다. (기다리지 않음)
+        @return: (wd, mask, cookie, name) 목록
+        """
+        events = []
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EINTR):
+                    break
+                raise
+
+            if not buf:
+                break
+
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buf):
+                wd, mask, cookie, name_len = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = buf[offset:offset + name_len].rstrip('\0')
+                offset += name_len
+                events.append((wd, mask, cookie, name))
+
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
@@ -0,0 +1,156 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import os
+import time
+import heapq
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class SchedulePolicy:
+    """변환 대기 중인 파일의 처리 순서를 정하는 정책의 기본 클래스.
+    key()가 작은 값을 반환한 파일부터 처리합니다. (같으면 도착한 순서대로)
+    """
+    def key(self, file_path, eof_file_path):
+        """
+        @param file_path: 원본 파일의 경로
+        @param eof_file_path: .eof 파일의 경로
+        @return: 정렬 기준 값 (작을수록 먼저 처리함)
+        """
+        return 0
+
+
+class FifoPolicy(SchedulePolicy):
+    """도착한 순서대로 처리합니다. (기존 방식)"""
+    pass
+
+
+class SmallestFirstPolicy(SchedulePolicy):
+    """크기가 작은 파일부터 처리합니다.
+    큰 파일 하나 때문에 작은 파일 여러 개가 오래 기다리지 않도록 하여 평균 대기 시간을 줄입니다.
+    """
+    def key(self, file_path, eof_file_path):
+        try:
+            return os.path.getsize(file_path)
+        except OSError:
+            return 0
+
+
+class ExtensionWeightPolicy(SmallestFirstPolicy):
+    """파일 크기에 확장자별 가중치를 곱한 값이 작은 파일부터 처리합니다.
+    (같은 크기라도 변환에 오래 걸리는 확장자는 가중치를 크게 주어 나중에 처리함)
+    """
+    def __init__(self, weights):
+        """
+        @param weights: 확장자 -> 가중치 dict. 예: {'ppt': 4, 'default': 1}
+            (목록에 없는 확장자는 'default'의 값을 사용함)
+        """
+        self.weights = dict((k.lower(), v) for k, v in weights.items())
+        self.weights.setdefault('default', 1.0)
+
+    def key(self, file_path, eof_file_path):
+        root, ext = os.path.splitext(file_path)
+        weight = self.weights.get(ext[1:].lower(), self.weights['default'])
+        return SmallestFirstPolicy.key(self, file_path, eof_file_path) * weight
+
+
+class EofPriorityPolicy(SchedulePolicy):
+    """.eof 파일에 기록된 우선 순위(정수)가 높은 파일부터 처리합니다.
+    .eof 파일이 비어 있거나 숫자가 아니면 우선 순위는 0입니다.
+    """
+    def key(self, file_path, eof_file_path):
+        try:
+            with open(eof_file_path, 'r') as eof_file:
+                return -int(eof_file.read(32).strip() or 0)
+        except (IOError, ValueError):
+            return 0
+
+
+class PendingQueue:
+    """변환 대기 중인 파일(확장자를 제외한 파일명)의 대기열.
+    정책(SchedulePolicy)의 순서대로 꺼내되, max_wait보다 오래 기다린 파일은 도착한 순서대로 먼저 꺼냅니다.
+    (크기가 큰 파일이나 우선 순위가 낮은 파일이 계속 밀려서 처리되지 않는 것을 막기 위함)
+    """
+    def __init__(self, policy = None, max_wait = 0):
+        """
+        @param policy: SchedulePolicy 객체. None이면 도착한 순서대로 처리함.
+        @param max_wait: 단위: 초. 0이면 대기 시간을 고려하지 않음.
+        """
+        self.policy = policy or FifoPolicy()
+        self.max_wait = max_wait
+        self.heap = [] # (정렬 기준 값, 도착 시각, 일련번호, 파일명)
+        self.arrivals = [] # (도착 시각, 파일명, 일련번호). 추가한 순서가 도착한 순서와 다를 수 있으므로 힙으로 관리함.
+        self.live = {} # 대기열에 남아 있는 항목의 일련번호 -> 파일명
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.live)
+
+    def push(self, front, file_path, eof_file_path, arrival_time):
+        """대기열에 파일을 추가합니다.
+        @param front: 확장자를 제외한 파일명
+        @param arrival_time: 도착 시각 (.eof 파일의 수정 시각)
+        """
+        self.seq += 1
+        key = self.policy.key(file_path, eof_file_path)
+        heapq.heappush(self.heap, (key, arrival_time, self.seq, front))
+        if self.max_wait:
+            heapq.heappush(self.arrivals, (arrival_time, front, self.seq))
+        self.live[self.seq] = front
+
+    def pop(self, now = None):
+        """다음에 처리할 파일을 꺼냅니다. 비어 있으면 None."""
+        if now is None:
+            now = time.time()
+
+        while self.arrivals and not self.arrivals[0][2] in self.live:
+            heapq.heappop(self.arrivals)
+        if self.arrivals and now - self.arrivals[0][0] > self.max_wait:
+            arrival_time, front, seq = heapq.heappop(self.arrivals)
+            log.debug('오래 기다린 파일을 먼저 처리합니다. 파일: {}, 대기 시간: {:.1f}초'.format(front, now - arrival_time))
+            return self.live.pop(seq)
+
+        while self.heap:
+            key, arrival_time, seq, front = heapq.heappop(self.heap)
+            if seq in self.live:
+                return self.live.pop(seq)
+        return None
+
+
+def create_schedule_policy(name, weights = None):
+    """
+    @param name: fifo, smallest, extension, priority 중 하나
+    @param weights: extension 정책에서 사용할 확장자 -> 가중치 dict
+    """
+    if name == 'fifo':
+        return FifoPolicy()
+    elif name == 'smallest':
+        return SmallestFirstPolicy()
+    elif name == 'extension':
+        return ExtensionWeightPolicy(weights or {})
+    elif name == 'priority':
+        return EofPriorityPolicy()
+    raise ValueError('알 수 없는 스케줄링 정책입니다. (Policy: {})'.format(name))
@@ -0,0 +1,129 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import os
+import time
+import json
+import threading
+
+from load_trace import format_record, get_ext
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class JobTracer:
+    """작업마다 단계별 소요 시간(span)을 정리하여 결과 디렉토리에 JSON 파일(<파일명>.trace.json)로 남깁니다.
+    JSON-lines 파일을 지정하면 같은 내용을 한 줄씩 덧붙입니다.
+    부하 기록 파일을 지정하면 도착 시각, 크기, 확장자, 결과, 처리 시간만 한 줄씩 덧붙입니다. (load_trace 참고)
+    span은 다음으로 구성됩니다.
+     1) 작업 기록(JobJournal)의 상태 변화: 각 상태에 머문 시간 (예: arrived - TargetDir에서 기다린 시간)
+     2) DocConverter가 측정한 샌드박스 및 레포트 처리 단계 (예: sandbox_running, report_download)
+     3) 결과 전달(deliver)에 걸린 시간
+    """
+    def __init__(self, linker, journal):
+        self.linker = linker
+        self.journal = journal
+        self.write_sidecar = True
+        self.jsonl_path = ''
+        self.capture_path = ''
+
+    def set_write_sidecar(self, write_sidecar):
+        """결과 디렉토리에 <파일명>.trace.json 파일을 남길지 지정합니다."""
+        self.write_sidecar = write_sidecar
+
+    def set_jsonl_path(self, jsonl_path):
+        """처리 과정을 한 줄씩 덧붙일 JSON-lines 파일의 경로를 지정합니다. 빈문자열이면 기록하지 않음."""
+        self.jsonl_path = jsonl_path
+
+    def set_capture_path(self, capture_path):
+        """부하 기록을 한 줄씩 덧붙일 파일의 경로를 지정합니다. 빈문자열이면 기록하지 않음."""
+        self.capture_path = capture_path
+
+    def build(self, job_id, file_path, task_id = None, spans = None, err_code = None):
+        """작업의 처리 과정을 dict로 정리합니다.
+        @param spans: 작업 기록의 상태 변화 외에 추가할 span 목록 ({'name', 'start', 'end'} dict 목록)
+        @param err_code: 실패한 경우 에러 코드. 성공이면 None.
+        """
+        transitions = self.journal.get_transitions(job_id)
+        timeline = []
+        for (state, start), (next_state, end) in zip(transitions, transitions[1:]):
+            timeline.append(_span(state, start, end))
+        for span in spans or []:
+            timeline.append(_span(span['name'], span['start'], span['end']))
+        timeline.sort(key = lambda span: (span['start'], span['end']))
+
+        trace = {'job_id': job_id,
+                 'file_path': file_path,
+                 'file_size': self.journal.get_file_size(job_id),
+                 'task_id': task_id,
+                 'result': 'fail' if err_code else 'success',
+                 'err_code': err_code,
+                 'transitions': [{'state': state, 'time': t} for state, t in transitions],
+                 'spans': timeline}
+        if transitions:
+            trace['duration'] = transitions[-1][1] - transitions[0][1]
+        return trace
+
+    def write(self, job_id, file_path, task_id = None, spans = None, err_code = None):
+        """작업의 처리 과정을 기록합니다. (기록에 실패해도 예외를 던지지 않음)
+        ※ 결과(.eof) 파일을 만든 후에 호출하므로 .trace.json 파일은 .eof 파일보다 조금 늦게 생길 수 있습니다.
+        """
+        try:
+            trace = self.build(job_id, file_path, task_id, spans, err_code)
+            if self.write_sidecar or self.jsonl_path:
+                data = json.dumps(trace, sort_keys = True)
+                if self.write_sidecar:
+                    self.linker.write_trace(file_path, data)
+                if self.jsonl_path:
+                    _append_line(self.jsonl_path, data)
+            if self.capture_path:
+                _append_line(self.capture_path, self._format_capture(trace))
+        except Exception:
+            log.exception('처리 과정을 기록하지 못했습니다. 파일: {}'.format(file_path))
+
+
+    def _format_capture(self, trace):
+        transitions = trace['transitions']
+        arrived_time = transitions[0]['time'] if transitions else time.time()
+        return format_record(arrived_time, trace['file_size'], get_ext(trace['file_path']),
+                             trace['err_code'] or '0', trace.get('duration', 0))
+
+
+def _span(name, start, end):
+    return {'name': name, 'start': start, 'end': end, 'duration': end - start}
+
+
+_append_lock = threading.Lock()
+
+def _append_line(path, line):
+    """파일 끝에 한 줄을 덧붙입니다.
+    (O_APPEND로 한 번에 기록하므로 여러 프로세스가 동시에 기록해도 줄이 섞이지 않음)
+    """
+    with _append_lock:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0666)
+        try:
+            os.write(fd, line + '\n')
+        finally:
+            os.close(fd)
@@ -0,0 +1,267 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import time
+import sqlite3
+
+import logging
+log = logging.getLogger(__name__)
+
+
+# 작업의 상태
+ARRIVED = 'arrived' # 연동 대상이 도착함 (.eof 파일의 수정 시각. 상태 변화 기록에만 남김)
+CLAIMED = 'claimed' # 연동 대상을 가져옴
+REQUEUED = 'requeued' # 작업을 생성하기 전에 에이전트가 종료되었거나 배치 작업이 실패하여 다시 생성해야 함
+SUBMITTED = 'submitted' # 샌드박스에 작업을 생성함 (혹은 진행 중인 작업에 합쳐짐)
+POLLING = 'polling' # 결과 처리기가 상태를 조회하는 중
+FETCHED = 'fetched' # 변환 결과를 받아옴
+DELIVERED = 'delivered' # 변환 결과를 전달함
+FAILED = 'failed' # 변환 실패를 전달함
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        file_path TEXT NOT NULL,
+        file_size INTEGER,
+        digest TEXT,
+        task_id INTEGER,
+        batch_member TEXT,
+        state TEXT NOT NULL,
+        err_code TEXT,
+        claimed_time REAL NOT NULL,
+        submitted_time REAL,
+        created_time REAL,
+        updated_time REAL NOT NULL)""",
+    "CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id)",
+    "CREATE INDEX IF NOT EXISTS jobs_task_id ON jobs (task_id)",
+    "CREATE INDEX IF NOT EXISTS jobs_updated_time ON jobs (updated_time)",
+    """CREATE TABLE IF NOT EXISTS transitions (
+        job_id INTEGER NOT NULL,
+        state TEXT NOT NULL,
+        time REAL NOT NULL)""",
+    "CREATE INDEX IF NOT EXISTS transitions_job_id ON transitions (job_id)",
+]
+
+
+class JobJournal:
+    """변환 작업의 상태 변화를 SQLite(WAL 모드)에 기록합니다.
+    요청 처리기와 결과 처리기는 이 기록을 통해 작업을 주고받으며,
+    에이전트가 재시작되어도 진행 중이던 작업을 이어서 처리할 수 있습니다.
+    ※ sqlite3 연결은 스레드/프로세스 간에 공유할 수 없으므로 작업자마다 객체를 따로 만들어야 합니다.
+    """
+    def __init__(self, db_path):
+        self.db = sqlite3.connect(db_path, timeout = 30, isolation_level = None)
+        self.db.execute('PRAGMA journal_mode = WAL')
+        self.db.execute('PRAGMA synchronous = NORMAL')
+        for sql in _SCHEMA:
+            self.db.execute(sql)
+        self._migrate()
+
+    def close(self):
+        self.db.close()
+
+    def _migrate(self):
+        """이전 버전에서 만든 기록 파일에 없는 열을 추가합니다."""
+        columns = [row[1] for row in self.db.execute('PRAGMA table_info(jobs)')]
+        if not 'file_size' in columns:
+            self.db.execute('ALTER TABLE jobs ADD COLUMN file_size INTEGER')
+        if not 'batch_member' in columns:
+            self.db.execute('ALTER TABLE jobs ADD COLUMN batch_member TEXT')
+        if not 'created_time' in columns:
+            self.db.execute('ALTER TABLE jobs ADD COLUMN created_time REAL')
+        self.db.execute('CREATE INDEX IF NOT EXISTS jobs_digest_created ON jobs (digest, created_time)')
+
+    def _set_state(self, job_ids, state, now, **columns):
+        """작업의 상태를 바꾸고 상태 변화를 기록합니다. (트랜잭션 안에서 호출해야 함)"""
+        sets = ['state = ?', 'updated_time = ?']
+        params = [state, now]
+        for name, value in columns.items():
+            sets.append(name + ' = ?')
+            params.append(value)
+
+        for job_id in job_ids:
+            self.db.execute('UPDATE jobs SET ' + ', '.join(sets) + ' WHERE id = ?', params + [job_id])
+            self.db.execute('INSERT INTO transitions (job_id, state, time) VALUES (?, ?, ?)', (job_id, state, now))
+
+    def _transaction(self):
+        return _Transaction(self.db)
+
+    def recover(self):
+        """에이전트를 시작할 때 이전에 종료되면서 처리하지 못한 작업을 되살립니다. (작업자를 시작하기 전에 한 번만 호출)
+         1) 작업을 생성하지 못한 작업은 다시 생성하도록 함. (claimed -> requeued)
+         2) 결과를 전달하지 못한 작업은 이미 생성된 작업ID로 다시 조회하도록 함. (polling, fetched -> submitted)
+        @return: (다시 생성할 작업의 수, 다시 조회할 작업의 수)
+        """
+        now = time.time()
+        with self._transaction():
+            claimed = [row[0] for row in self.db.execute('SELECT id FROM jobs WHERE state = ?', (CLAIMED,))]
+            self._set_state(claimed, REQUEUED, now)
+
+            polling = [row[0] for row in self.db.execute(
+                'SELECT id FROM jobs WHERE state IN (?, ?)', (POLLING, FETCHED))]
+            self._set_state(polling, SUBMITTED, now)
+
+        return (len(claimed), len(polling))
+
+    def claim(self, file_path, digest, arrived_time = None, file_size = None):
+        """연동 대상을 가져왔음을 기록합니다.
+        @param arrived_time: 연동 대상이 도착한 시각. 지정하면 상태 변화 기록에 arrived로 남김.
+        @param file_size: 원본 파일의 크기 (부하 기록용)
+        @return: 작업 기록의 ID
+        """
+        now = time.time()
+        with self._transaction():
+            cursor = self.db.execute(
+                'INSERT INTO jobs (file_path, file_size, digest, state, claimed_time, updated_time) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (file_path, file_size, digest, CLAIMED, now, now))
+            job_id = cursor.lastrowid
+            if arrived_time:
+                self.db.execute('INSERT INTO transitions (job_id, state, time) VALUES (?, ?, ?)',
+                                (job_id, ARRIVED, min(arrived_time, now)))
+            self.db.execute('INSERT INTO transitions (job_id, state, time) VALUES (?, ?, ?)', (job_id, CLAIMED, now))
+        return job_id
+
+    def set_digest(self, job_id, digest):
+        """claim() 후에 계산한 원본 파일의 해시값을 기록합니다."""
+        with self._transaction():
+            self.db.execute('UPDATE jobs SET digest = ? WHERE id = ?', (digest, job_id))
+
+    def take_requeued(self):
+        """다시 생성해야 하는 작업을 하나 가져옵니다.
+        @return: (작업 기록의 ID, 원본 파일의 경로, 원본 파일의 해시값). 없으면 None.
+        """
+        with self._transaction():
+            row = self.db.execute(
+                'SELECT id, file_path, digest FROM jobs WHERE state = ? ORDER BY id LIMIT 1', (REQUEUED,)).fetchone()
+            if row:
+                self._set_state([row[0]], CLAIMED, time.time())
+        return row
+
+    def submitted(self, job_id, task_id, batch_member = None, coalesced = False):
+        """샌드박스에 작업을 생성했음(혹은 진행 중인 작업에 합쳐졌음)을 기록합니다.
+        @param batch_member: 배치 작업에 포함된 경우 배치 작업 안에서의 문서 이름
+        @param coalesced: 진행 중인 작업에 합쳐진 경우 True. (작업을 생성한 시각(created_time)은 기록하지 않음)
+        """
+        now = time.time()
+        with self._transaction():
+            self._set_state([job_id], SUBMITTED, now, task_id = task_id, submitted_time = now,
+                            created_time = None if coalesced else now, batch_member = batch_member)
+
+    def requeue(self, job_ids):
+        """작업을 다시 생성하도록 기록합니다. (배치 작업이 실패하여 문서별로 다시 변환할 때)"""
+        with self._transaction():
+            self._set_state(job_ids, REQUEUED, time.time(), task_id = None, created_time = None, batch_member = None)
+
+    def find_task(self, digest, since):
+        """내용이 같은 파일의 작업ID를 반환합니다. (이미 완료된 작업도 포함. 배치 작업은 제외)
+        합쳐진 파일의 기록이 아니라 작업을 생성한 기록의 시각(created_time)으로 비교합니다.
+        (내용이 같은 파일이 계속 들어와도 오래된 작업을 찾지 않도록 함. 오래된 작업은 완료 후 coalesce_window가 지나면 삭제됨)
+        @param since: 이 시각 이후에 생성된 작업만 찾음.
+        @return: 작업ID. 없으면 None.
+        """
+        row = self.db.execute(
+            'SELECT task_id FROM jobs WHERE digest = ? AND created_time >= ? AND task_id IS NOT NULL '
+            'AND batch_member IS NULL ORDER BY created_time DESC LIMIT 1',
+            (digest, since)).fetchone()
+        if row:
+            return row[0]
+        return None
+
+    def count_active_tasks(self):
+        """샌드박스에서 진행 중인 작업(작업ID 기준)의 수를 반환합니다. (합쳐진 작업은 하나로 셈)"""
+        return self.db.execute(
+            'SELECT COUNT(DISTINCT task_id) FROM jobs WHERE state IN (?, ?, ?)',
+            (SUBMITTED, POLLING, FETCHED)).fetchone()[0]
+
+    def take_submitted(self, limit = 1000):
+        """생성된 작업들을 가져와서 상태를 조회하는 중으로 기록합니다.
+        @return: (작업 기록의 ID, 작업ID, 원본 파일의 경로, 원본 파일의 해시값, 배치 작업 안에서의 문서 이름) 목록
+        """
+        with self._transaction():
+            rows = self.db.execute(
+                'SELECT id, task_id, file_path, digest, batch_member FROM jobs WHERE state = ? ORDER BY id LIMIT ?',
+                (SUBMITTED, limit)).fetchall()
+            self._set_state([row[0] for row in rows], POLLING, time.time())
+        return rows
+
+    def fetched(self, job_ids):
+        """변환 결과를 받아왔음을 기록합니다."""
+        with self._transaction():
+            self._set_state(job_ids, FETCHED, time.time())
+
+    def delivered(self, job_id):
+        """변환 결과를 전달했음을 기록합니다."""
+        with self._transaction():
+            self._set_state([job_id], DELIVERED, time.time())
+
+    def failed(self, job_id, err_code):
+        """변환 실패를 전달했음을 기록합니다."""
+        with self._transaction():
+            self._set_state([job_id], FAILED, time.time(), err_code = err_code)
+
+    def get_file_size(self, job_id):
+        """claim()에서 기록한 원본 파일의 크기를 반환합니다. 알 수 없으면 None."""
+        row = self.db.execute('SELECT file_size FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row:
+            return row[0]
+        return None
+
+    def get_transitions(self, job_id):
+        """작업의 상태 변화 기록을 반환합니다.
+        @return: (상태, 시각) 목록
+        """
+        return self.db.execute(
+            'SELECT state, time FROM transitions WHERE job_id = ? ORDER BY rowid', (job_id,)).fetchall()
+
+    def purge(self, before):
+        """완료(전달 혹은 실패)된 지 오래된 작업 기록을 삭제합니다.
+        @param before: 이 시각 이전에 완료된 작업 기록을 삭제함.
+        @return: 삭제한 작업 기록의 수
+        """
+        with self._transaction():
+            job_ids = [row[0] for row in self.db.execute(
+                'SELECT id FROM jobs WHERE updated_time < ? AND state IN (?, ?)', (before, DELIVERED, FAILED))]
+            for job_id in job_ids:
+                self.db.execute('DELETE FROM transitions WHERE job_id = ?', (job_id,))
+                self.db.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+        return len(job_ids)
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ~ COMMIT/ROLLBACK을 수행하는 with 문용 객체.
+    (여러 작업자가 같은 작업을 동시에 가져가지 않도록 쓰기 잠금을 먼저 획득함)
+    """
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type:
+            self.db.execute('ROLLBACK')
+        else:
+            self.db.execute('COMMIT')
+        return False
@@ -0,0 +1,365 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import re
+
+
+_WHITESPACE = re.compile(r'[ \t\r\n]*')
+_STRING_CHUNK = re.compile(r'[^"\\]*(?:\\[^u][^"\\]*)*')
+_SIMPLE_ESCAPE = re.compile(r'\\(.)')
+_NUMBER = re.compile(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?')
+_NUMBER_END = re.compile(r'[,\]}\s]')
+# 건너뛸 값 안에서 괄호가 아닌 부분과 완결된 문자열을 한꺼번에 건너뜀. (문자열 안의 괄호는 세지 않기 위함)
+_SKIP_RUN = re.compile(r'(?:[^"{}\[\]]+|"[^"\\]*(?:\\.[^"\\]*)*")*', re.DOTALL)
+_SKIP_STRING = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+_NOT_BRACKETS = ''.join(chr(i) for i in range(256) if not chr(i) in '{}[]')
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+# 파서의 상태
+_VALUE = 0 # 값이 와야 함
+_VALUE_OR_END = 1 # 배열의 첫 번째 값 혹은 배열의 끝(])이 와야 함
+_KEY = 2 # 키가 와야 함
+_KEY_OR_END = 3 # 객체의 첫 번째 키 혹은 객체의 끝(})이 와야 함
+_COMMA_OR_END = 4 # 구분자(,) 혹은 객체/배열의 끝이 와야 함
+
+
+class JsonStreamError(ValueError):
+    """JSON 형식이 올바르지 않음을 의미함."""
+    pass
+
+
+def _unescape(match):
+    try:
+        return _ESCAPES[match.group(1)]
+    except KeyError:
+        raise JsonStreamError('잘못된 이스케이프 문자입니다. ({})'.format(repr(match.group(1))))
+
+
+class JsonEventParser:
+    """JSON 문서 전체를 메모리에 올리지 않고 조금씩 읽으면서 이벤트를 만들어내는 파서입니다.
+    이벤트는 (prefix, event, value) 형식이며 prefix는 값의 위치를 뜻합니다.
+    (예: {"info": {"id": 1}, "signatures": [{"name": "a"}]} 에서 1의 prefix는 'info.id',
+         "a"의 prefix는 'signatures.item.name')
+    event의 종류: start_map, map_key, end_map, start_array, end_array, string, number, boolean, null
+    """
+    def __init__(self, stream, chunk_size = 65536):
+        """
+        @param stream: read(size) 메소드를 가진 객체 (파일, HTTP 응답 등)
+        @param chunk_size: 한 번에 읽을 크기 (단위: 바이트)
+        """
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.string_sinks = {}
+        self.wanted_keys = None
+
+    def set_wanted_keys(self, keys):
+        """최상위 객체에서 keys에 포함된 키의 값만 이벤트를 만들고, 나머지 키의 값은 이벤트 없이 건너뜁니다.
+        (behavior, network, static 등 필요 없는 큰 항목을 토큰 단위로 분석하지 않고 괄호의 깊이만 세면서 건너뛰기 위함.
+         건너뛴 값의 형식은 검사하지 않으며, 해당 키의 map_key 이벤트는 만듦)
+        """
+        self.wanted_keys = set(keys)
+
+    def set_string_sink(self, prefix, sink):
+        """prefix 위치의 문자열 값을 메모리에 모으지 않고 sink.write()로 조금씩 전달하도록 합니다.
+        (이 경우 string 이벤트의 값은 None입니다.)
+        @param sink: write(data) 메소드를 가진 객체. data는 UTF-8 문자열입니다.
+        """
+        self.string_sinks[prefix] = sink
+
+    def _fill(self):
+        """스트림에서 데이터를 더 읽어서 버퍼에 추가합니다. 더 읽을 데이터가 없으면 False 반환."""
+        data = self.stream.read(self.chunk_size)
+        if not data:
+            return False
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def _ensure(self, size):
+        """버퍼에 최소 size 바이트가 남아 있도록 합니다. (스트림의 끝이면 그보다 적을 수 있음)"""
+        while len(self.buf) - self.pos < size and self._fill():
+            pass
+
+    def _peek(self):
+        """공백을 건너뛴 후 다음 문자를 반환합니다. (읽은 것으로 처리하지 않음) 문서의 끝이면 빈문자열."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def _read_string(self, prefix):
+        self.pos += 1 # 시작 따옴표(")
+        sink = self.string_sinks.get(prefix)
+        parts = []
+        write = sink.write if sink else parts.append
+
+        while True:
+            # \uXXXX를 제외한 이스케이프 문자는 정규식으로 한꺼번에 처리함.
+            end = _STRING_CHUNK.match(self.buf, self.pos).end()
+            if end > self.pos:
+                chunk = self.buf[self.pos:end]
+                if '\\' in chunk:
+                    chunk = _SIMPLE_ESCAPE.sub(_unescape, chunk)
+                write(chunk)
+            self.pos = end
+
+            if self.pos >= len(self.buf):
+                if not self._fill():
+                    raise JsonStreamError('문자열이 끝나지 않았습니다.')
+                continue
+
+            if self.buf[self.pos] == '"':
+                self.pos += 1
+                break
+
+            # 이스케이프 문자 (\uXXXX\uXXXX 형식의 서로게이트 쌍이 최대 길이)
+            self._ensure(12)
+            escape = self.buf[self.pos + 1:self.pos + 2]
+            if escape == 'u':
+                code = self._read_unicode_escape()
+                if 0xd800 <= code < 0xdc00 and self.buf[self.pos:self.pos + 2] == '\\u':
+                    low = int(self.buf[self.pos + 2:self.pos + 6], 16)
+                    if 0xdc00 <= low < 0xe000:
+                        code = 0x10000 + ((code - 0xd800) << 10) + (low - 0xdc00)
+                        self.pos += 6
+                write(('\\U%08x' % code).decode('unicode-escape').encode('utf-8'))
+            elif escape in _ESCAPES:
+                write(_ESCAPES[escape])
+                self.pos += 2
+            else:
+                raise JsonStreamError('잘못된 이스케이프 문자입니다. ({})'.format(repr(escape)))
+
+        if sink:
+            return None
+        return ''.join(parts).decode('utf-8')
+
+    def _skip_string(self):
+        """문자열 하나를 값을 만들지 않고 건너뜁니다. (버퍼보다 긴 문자열도 조금씩 건너뜀)"""
+        self.pos += 1 # 시작 따옴표(")
+        while True:
+            self.pos = _SKIP_STRING.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) and self.buf[self.pos] == '"':
+                self.pos += 1
+                return
+            # 버퍼의 끝 (혹은 버퍼의 마지막 문자가 이스케이프 문자(\)인 경우)
+            if not self._fill():
+                raise JsonStreamError('문자열이 끝나지 않았습니다.')
+
+    def _skip_value(self):
+        """값 하나를 이벤트 없이 건너뜁니다. 객체/배열은 괄호의 깊이만 셉니다.
+        버퍼 단위로 문자열을 지우고(str.split) 괄호만 남긴(str.translate) 후 깊이를 세며,
+        값이 끝나는 버퍼에서만 괄호를 하나씩 찾아서 끝 위치를 정합니다. (괄호마다 정규식을 실행하지 않기 위함)
+        """
+        c = self._peek()
+        if c == '"':
+            self._skip_string()
+            return
+        if c != '{' and c != '[':
+            if c == '-' or c.isdigit():
+                self._read_number()
+            elif c == '':
+                raise JsonStreamError('문서가 끝나지 않았습니다.')
+            else:
+                self._read_literal()
+            return
+
+        depth = 0
+        while True:
+            if self.pos >= len(self.buf) and not self._fill():
+                raise JsonStreamError('문서가 끝나지 않았습니다.')
+
+            rest = self.buf[self.pos:]
+            # 문자열 밖에는 역슬래시가 없으므로 이스케이프된 문자를 지우면 남은 따옴표는 모두 문자열의 시작/끝이며,
+            # 따옴표로 나눈 조각 중 짝수 번째가 문자열 밖임. (조각이 짝수 개이면 버퍼가 문자열 안에서 끝남)
+            parts = rest.replace('\\\\', '').replace('\\"', '').split('"')
+            in_string = len(parts) % 2 == 0
+
+            new_depth = depth
+            for c in ''.join(parts[::2]).translate(None, _NOT_BRACKETS):
+                if c == '{' or c == '[':
+                    new_depth += 1
+                else:
+                    new_depth -= 1
+                    if new_depth == 0:
+                        break
+            if new_depth == 0:
+                self._skip_brackets(depth)
+                return
+            depth = new_depth
+
+            if in_string:
+                # 끝나지 않는 문자열의 시작 따옴표는 이스케이프되지 않은 마지막 따옴표임.
+                tail = rest.rfind('"')
+                while tail > 0 and rest[tail - 1] == '\\':
+                    tail = rest.rfind('"', 0, tail - 1)
+                self.pos += tail
+                self._skip_string()
+            else:
+                self.pos = len(self.buf)
+
+    def _skip_brackets(self, depth):
+        """괄호를 하나씩 세면서 깊이가 0이 되는 위치까지 건너뜁니다.
+        @param depth: 현재 위치의 깊이
+        """
+        while True:
+            self.pos = _SKIP_RUN.match(self.buf, self.pos).end()
+            if self.pos >= len(self.buf):
+                if not self._fill():
+                    raise JsonStreamError('문서가 끝나지 않았습니다.')
+                continue
+
+            c = self.buf[self.pos]
+            if c == '"':
+                # 버퍼 안에서 끝나지 않는 문자열
+                self._skip_string()
+            elif c == '{' or c == '[':
+                depth += 1
+                self.pos += 1
+            else:
+                depth -= 1
+                self.pos += 1
+                if depth == 0:
+                    return
+
+    def _read_unicode_escape(self):
+        try:
+            code = int(self.buf[self.pos + 2:self.pos + 6], 16)
+        except ValueError:
+            raise JsonStreamError('잘못된 유니코드 이스케이프 문자입니다.')
+        self.pos += 6
+        return code
+
+    def _read_number(self):
+        # 숫자가 버퍼의 끝에 걸쳐 있을 수 있으므로 숫자의 끝을 확인할 수 있을 때까지 더 읽음.
+        while not _NUMBER_END.search(self.buf, self.pos) and self._fill():
+            pass
+
+        match = _NUMBER.match(self.buf, self.pos)
+        if not match or match.end() == self.pos:
+            raise JsonStreamError('잘못된 숫자 형식입니다.')
+        self.pos = match.end()
+
+        text = match.group()
+        if '.' in text or 'e' in text or 'E' in text:
+            return float(text)
+        return int(text)
+
+    def _read_literal(self):
+        self._ensure(5)
+        for text, value in (('true', True), ('false', False), ('null', None)):
+            if self.buf.startswith(text, self.pos):
+                self.pos += len(text)
+                return value
+        raise JsonStreamError('잘못된 값입니다. (위치: {})'.format(repr(self.buf[self.pos:self.pos + 10])))
+
+    def events(self):
+        """(prefix, event, value) 이벤트를 차례대로 반환하는 generator입니다.
+        @raise JsonStreamError: JSON 형식이 올바르지 않을 때.
+        """
+        stack = [] # 'map' 혹은 'array'
+        path = []
+        state = _VALUE
+
+        while True:
+            c = self._peek()
+
+            if state == _VALUE or state == _VALUE_OR_END:
+                if state == _VALUE_OR_END and c == ']':
+                    state = None # 아래에서 배열을 닫음
+                else:
+                    prefix = '.'.join(path)
+                    if c == '{':
+                        self.pos += 1
+                        yield (prefix, 'start_map', None)
+                        stack.append('map')
+                        path.append('')
+                        state = _KEY_OR_END
+                        continue
+                    elif c == '[':
+                        self.pos += 1
+                        yield (prefix, 'start_array', None)
+                        stack.append('array')
+                        path.append('item')
+                        state = _VALUE_OR_END
+                        continue
+                    elif c == '"':
+                        yield (prefix, 'string', self._read_string(prefix))
+                    elif c == '-' or c.isdigit():
+                        yield (prefix, 'number', self._read_number())
+                    elif c == '':
+                        raise JsonStreamError('문서가 끝나지 않았습니다.')
+                    else:
+                        value = self._read_literal()
+                        if value is None:
+                            yield (prefix, 'null', None)
+                        else:
+                            yield (prefix, 'boolean', value)
+
+                    if not stack:
+                        return
+                    state = _COMMA_OR_END
+                    continue
+
+            elif state == _KEY or state == _KEY_OR_END:
+                if state == _KEY_OR_END and c == '}':
+                    state = None # 아래에서 객체를 닫음
+                elif c == '"':
+                    path.pop()
+                    key = self._read_string(None)
+                    yield ('.'.join(path), 'map_key', key)
+                    path.append(key)
+                    if self._peek() != ':':
+                        raise JsonStreamError('키 다음에 :이 없습니다. (키: {})'.format(key))
+                    self.pos += 1
+                    if len(stack) == 1 and self.wanted_keys is not None and not key in self.wanted_keys:
+                        self._skip_value()
+                        state = _COMMA_OR_END
+                    else:
+                        state = _VALUE
+                    continue
+                else:
+                    raise JsonStreamError('키가 와야 합니다. (문자: {})'.format(repr(c)))
+
+            elif state == _COMMA_OR_END:
+                if c == ',':
+                    self.pos += 1
+                    state = _KEY if stack[-1] == 'map' else _VALUE
+                    continue
+                elif not ((c == '}' and stack[-1] == 'map') or (c == ']' and stack[-1] == 'array')):
+                    raise JsonStreamError('잘못된 문자입니다. (문자: {})'.format(repr(c)))
+
+            # 객체 혹은 배열을 닫음.
+            self.pos += 1
+            container = stack.pop()
+            path.pop()
+            yield ('.'.join(path), 'end_map' if container == 'map' else 'end_array', None)
+            if not stack:
+                return
+            state = _COMMA_OR_END
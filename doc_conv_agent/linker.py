@@ -23,9 +23,17 @@
 
 
 import os
+import errno
+import shutil
+import threading
+import time
 
 import uuid
 
+from job_scheduler import PendingQueue
+
+from inotify import Inotify, InotifyError, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE, IN_DELETE, IN_MOVED_FROM, IN_Q_OVERFLOW
+
 import logging
 log = logging.getLogger(__name__)
 
@@ -36,10 +44,30 @@ class Linker:
         """
         pass
 
+    def get_many(self, n):
+        """변환할 대상을 최대 n개 반환합니다.
+        @return: 변환할 파일의 경로 목록. 없으면 빈 목록.
+        """
+        file_paths = []
+        while len(file_paths) < n:
+            file_path = self.get()
+            if not file_path:
+                break
+            file_paths.append(file_path)
+        return file_paths
+
+    def create_result_file(self):
+        """변환된 파일을 조금씩 기록할 수 있는 파일 객체를 만듭니다.
+        (기록이 끝난 파일 객체는 success()의 result_file_binary로 넘겨줍니다.)
+        @return: ResultFile 객체. 지원하지 않으면 None.
+        """
+        return None
+
     def success(self, origin_file_path, result_file_binary):
         """변환 성공 결과를 처리합니다.
         @param origin_file_path: 원본 파일의 경로
-        @param result_file_binary: 변환된 파일의 바이너리 데이터
+        @param result_file_binary: 변환된 파일의 바이너리 데이터,
+            혹은 변환된 파일을 읽을 수 있는 파일 객체(read() 메소드를 가진 객체나 create_result_file()이 반환한 객체)
         """
         pass
 
@@ -50,8 +78,117 @@ class Linker:
         """
         pass
 
+    def write_trace(self, origin_file_path, trace_data):
+        """작업의 처리 과정 기록을 결과와 함께 남깁니다.
+        @param origin_file_path: 원본 파일의 경로
+        @param trace_data: 처리 과정 기록 (JSON 문자열)
+        """
+        pass
+
+    def wait(self, timeout):
+        """새로운 변환 대상이 생길 때까지 기다립니다.
+        (기본 구현은 단순히 timeout만큼 기다립니다.)
+        @param timeout: 최대 대기 시간 (단위: 초)
+        """
+        time.sleep(timeout)
+
+
+def create_temp_file(dir_path):
+    """dir_path에 숨김 임시 파일을 만들고 그 경로를 반환합니다.
+    (tempfile.mkstemp()와 달리 일반 파일과 같은 권한으로 만들어서 다른 프로그램도 읽을 수 있도록 함)
+    """
+    while True:
+        path = os.path.join(dir_path, '.' + uuid.uuid4().hex + '.tmp')
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0666)
+        except OSError as e:
+            if e.errno == errno.EEXIST:
+                continue
+            raise
+        os.close(fd)
+        return path
+
+
+class ResultFile:
+    """결과 디렉토리 안에 임시 파일을 만들어 기록하고, 기록이 끝나면 최종 경로로 이름을 바꾸어 공개합니다.
+    (이름 바꾸기는 원자적으로 수행되므로 기록 중인 파일이 최종 경로에 노출되지 않음)
+    """
+    def __init__(self, dir_path):
+        self.name = create_temp_file(dir_path)
+        self.file = open(self.name, 'wb')
+        self.size = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.size += len(data)
+
+    def copy_to(self, out):
+        """지금까지 기록한 내용을 다른 파일 객체에 복사합니다."""
+        self.file.flush()
+        with open(self.name, 'rb') as f:
+            shutil.copyfileobj(f, out)
+
+    def open(self):
+        """지금까지 기록한 내용을 읽을 수 있는 파일 객체를 반환합니다."""
+        self.file.flush()
+        return open(self.name, 'rb')
+
+    def publish(self, path):
+        """기록을 마치고 path로 이름을 바꿉니다."""
+        self.file.close()
+        os.rename(self.name, path)
+
+    def discard(self):
+        """기록을 중단하고 임시 파일을 삭제합니다."""
+        self.file.close()
+        if os.path.isfile(self.name):
+            os.remove(self.name)
+
+
+class SynchronizedLinker(Linker):
+    """다른 Linker 객체를 감싸서 여러 스레드에서 동시에 사용할 수 있도록 합니다.
+    (같은 파일을 두 스레드가 동시에 가져가는 문제를 막기 위함)
+    """
+    def __init__(self, linker):
+        self.linker = linker
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            return self.linker.get()
+
+    def get_many(self, n):
+        with self.lock:
+            return self.linker.get_many(n)
+
+    def create_result_file(self):
+        return self.linker.create_result_file()
+
+    def success(self, origin_file_path, result_file_binary):
+        with self.lock:
+            return self.linker.success(origin_file_path, result_file_binary)
+
+    def fail(self, origin_file_path, err_code):
+        with self.lock:
+            return self.linker.fail(origin_file_path, err_code)
+
+    def write_trace(self, origin_file_path, trace_data):
+        # 다른 파일과 겹치지 않으므로 lock을 잡지 않음.
+        return self.linker.write_trace(origin_file_path, trace_data)
+
+    def wait(self, timeout):
+        # 기다리는 동안에는 다른 스레드가 결과를 처리할 수 있도록 lock을 잡지 않음.
+        return self.linker.wait(timeout)
+
 
 class FileLinker(Linker):
+    def __init__(self):
+        self.entries = {} # 확장자를 제외한 파일명 -> 원본 파일명 목록 및 eof/ing 파일 존재 여부
+        self.ready = PendingQueue() # 변환 대상의 확장자를 제외한 파일명 (set_schedule_policy()로 지정한 순서대로)
+        self.known_names = set() # 색인에 반영된 파일명
+        self.dir_mtime = None
+        self.last_refresh_time = 0
+
     def set_target_dir(self, target_dir):
         """연동 대상을 조회할 디렉토리를 지정합니다."""
         self.target_dir = target_dir
@@ -66,6 +203,14 @@ class FileLinker(Linker):
         """
         self.error_dir = error_dir
 
+    def set_schedule_policy(self, policy, max_wait = 0):
+        """변환 대상을 꺼내는 순서를 지정합니다. (기본값: 도착한 순서대로)
+        @param policy: SchedulePolicy 객체
+        @param max_wait: 이 시간보다 오래 기다린 대상은 정책과 상관없이 도착한 순서대로 먼저 꺼냄.
+            단위: 초. 0이면 대기 시간을 고려하지 않음.
+        """
+        self.ready = PendingQueue(policy, max_wait)
+
     def _create_file_with_new_ext(self, origin_file_path, ext, data = ''):
         """주어진 파일명에서 확장자만 바꾸어 새로운 파일을 만듭니다.
         @param origin_file_path: 파일 경로 및 파일명을 추출할 경로.
@@ -79,41 +224,153 @@ class FileLinker(Linker):
         with open(file_root + ext, 'w') as new_file:
             new_file.write(data)
 
-    def _is_new_target(self, file_name):
-        """새로운 작업 대상인지 확인합니다.
+    def _entry(self, front):
+        entry = self.entries.get(front)
+        if not entry:
+            entry = {'names': [], 'eof': False, 'ing': False, 'queued': False}
+            self.entries[front] = entry
+        return entry
+
+    def _is_ready(self, entry):
+        """eof 파일은 있으면서 ing 파일은 없는 원본 파일이 있으면 True 반환."""
+        return entry['eof'] and (not entry['ing']) and len(entry['names']) > 0
+
+    def _update_name(self, file_name, exists):
+        """디렉토리에 파일이 생기거나 없어졌을 때 색인을 갱신합니다.
         @param file_name: 파일명
-        @return: eof 파일은 있으면서 ing 파일은 없는 경우 True 반환.
-            그 외의 경우 혹은 file_name의 확장자가 eof이거나 ing인 경우에는 False 반환.
+        @param exists: 파일이 생겼으면 True, 없어졌으면 False.
         """
+        if exists:
+            self.known_names.add(file_name)
+        else:
+            self.known_names.discard(file_name)
+
         front, ext = os.path.splitext(file_name)
-        if ext == '.eof' or ext == '.ing':
-            return False
+        entry = self._entry(front)
+        if ext == '.eof':
+            entry['eof'] = exists
+        elif ext == '.ing':
+            entry['ing'] = exists
+        elif exists:
+            if not file_name in entry['names']:
+                entry['names'].append(file_name)
+        elif file_name in entry['names']:
+            entry['names'].remove(file_name)
+
+        if self._is_ready(entry):
+            if not entry['queued']:
+                entry['queued'] = True
+                eof_file_name = front + '.eof'
+                self.ready.push(front,
+                                os.path.join(self.target_dir, entry['names'][0]),
+                                os.path.join(self.target_dir, eof_file_name),
+                                self._arrival_key(eof_file_name))
+        elif not entry['names'] and not entry['eof'] and not entry['ing']:
+            del self.entries[front]
+
+    def _refresh(self, force = False):
+        """색인을 갱신합니다.
+        디렉토리의 수정 시각이 바뀐 경우에만 디렉토리를 조회하며, 이전 조회 결과와 달라진 파일만 반영합니다.
+        """
+        now = time.time()
+        # 대기열에 대상이 남아 있으면 잠시 동안은 조회하지 않음. (.ing 파일 생성으로 인해 매번 조회하는 것을 막기 위함)
+        if not force and self.ready and now - self.last_refresh_time < 1:
+            return
+
+        mtime = os.stat(self.target_dir).st_mtime
+        # 수정 시각의 해상도보다 짧은 간격으로 변경된 경우를 놓치지 않도록 최근에 바뀐 디렉토리는 항상 다시 조회함.
+        if not force and mtime == self.dir_mtime and now - mtime > 2:
+            return
+        self.dir_mtime = mtime
+        self.last_refresh_time = now
 
-        eof_path = os.path.join(self.target_dir, front + '.eof')
-        ing_path = os.path.join(self.target_dir, front + '.ing')
-        # eof는 있으면서 ing는 없는 경우 True 반환.
-        if os.path.isfile(eof_path) and (not os.path.isfile(ing_path)):
-            return True
+        names = set(os.listdir(self.target_dir))
+        for file_name in self.known_names - names:
+            self._update_name(file_name, False)
 
-        return False
+        for file_name in names - self.known_names:
+            self._update_name(file_name, True)
+
+    def _arrival_key(self, file_name):
+        """대상이 도착한 시각(.eof 파일의 수정 시각)을 반환합니다."""
+        try:
+            return os.stat(os.path.join(self.target_dir, file_name)).st_mtime
+        except OSError:
+            return time.time()
+
+    def _claim(self):
+        """대기열에서 변환 대상을 하나 꺼내서 .ing 파일을 생성한 후 그 경로를 반환합니다. 없으면 빈문자열."""
+        while self.ready:
+            front = self.ready.pop()
+            entry = self.entries.get(front)
+            if not entry:
+                continue
+            entry['queued'] = False
+            if not self._is_ready(entry):
+                continue
+
+            # 색인이 갱신되기 전에 삭제된 파일일 수 있으므로 꺼낼 때 한 번 더 확인함.
+            file_name = entry['names'][0]
+            file_path = os.path.join(self.target_dir, file_name)
+            if not os.path.isfile(file_path):
+                self._update_name(file_name, False)
+                continue
+            if not os.path.isfile(os.path.join(self.target_dir, front + '.eof')):
+                self._update_name(front + '.eof', False)
+                continue
+
+            self._create_file_with_new_ext(file_path, '.ing')
+            self._update_name(front + '.ing', True)
+            return file_path
+
+        return ''
 
     def get(self):
         """지정된 경로에서 조건을 만족하는 파일을 찾아 그 경로를 반환합니다.
          1) 지정된 경로: set_target_dir()를 이용하여 지정한 경로.
          2) 조건: 특정 파일명과 이름은 같고 확장자가 .eof인 파일은 존재하되, 확장자가 .ing 파일은 존재하지 않아야 함.
+        ※ 디렉토리 전체를 매번 조회하지 않고, 메모리에 유지하는 색인에서 대상을 꺼냅니다.
         """
-        file_names = os.listdir(self.target_dir)
-        for file_name in file_names:
-            if self._is_new_target(file_name):
-                file_path = os.path.join(self.target_dir, file_name)
-                self._create_file_with_new_ext(file_path, '.ing')
-                return file_path
+        self._refresh()
+        return self._claim()
 
-        return ''
+    def get_many(self, n):
+        """get()과 같은 조건을 만족하는 파일을 최대 n개 찾아 그 경로 목록을 반환합니다."""
+        self._refresh()
+        file_paths = []
+        while len(file_paths) < n:
+            file_path = self._claim()
+            if not file_path:
+                break
+            file_paths.append(file_path)
+        return file_paths
+
+    def create_result_file(self):
+        """set_result_dir()로 지정한 경로에 임시 파일을 만들어 반환합니다."""
+        return ResultFile(self.result_dir)
+
+    def _publish(self, result_file_binary, result_file_path):
+        """변환된 파일을 임시 파일에 기록한 후 result_file_path로 이름을 바꿉니다.
+        @param result_file_binary: 바이너리 데이터, 파일 객체, 혹은 create_result_file()이 반환한 객체.
+        """
+        if isinstance(result_file_binary, ResultFile):
+            result_file_binary.publish(result_file_path)
+            return
+
+        result_file = self.create_result_file()
+        try:
+            if hasattr(result_file_binary, 'read'):
+                shutil.copyfileobj(result_file_binary, result_file)
+            else:
+                result_file.write(result_file_binary)
+            result_file.publish(result_file_path)
+        except:
+            result_file.discard()
+            raise
 
     def success(self, origin_file_path, result_file_binary):
         """다음의 작업을 수행합니다.
-         1) set_target_dir()로 지정한 경로에 result_file_binary를 저장함.
+         1) set_result_dir()로 지정한 경로에 result_file_binary를 저장함. (임시 파일에 기록한 후 이름을 바꿈)
          2) origin_file_path 파일 삭제.
          3) set_target_dir()로 지정한 경로에서 파일명.eof 파일 삭제 후 파일명.ing 파일 삭제.
          4) set_result_dir()로 지정한 경로에서 파일명.eof 파일을 생성하고 '0'을 기록. (0은 성공을 뜻합니다.)
@@ -128,8 +385,7 @@ class FileLinker(Linker):
             os.remove(os.path.join(self.result_dir, root + '.eof'))
             os.remove(result_file_path)
 
-        with open(result_file_path, 'wb') as pdf:
-            pdf.write(result_file_binary)
+        self._publish(result_file_binary, result_file_path)
 
         try:
             os.remove(origin_file_path)
@@ -176,3 +432,66 @@ class FileLinker(Linker):
 
         temp = os.path.join(self.result_dir, base_name)
         self._create_file_with_new_ext(temp, '.eof', err_code)
+
+    def write_trace(self, origin_file_path, trace_data):
+        """set_result_dir()로 지정한 경로에 파일명.trace.json 파일을 만들어 trace_data를 기록합니다.
+        (임시 파일에 기록한 후 이름을 바꿈)
+        """
+        root, ext = os.path.splitext(os.path.basename(origin_file_path))
+        self._publish(trace_data, os.path.join(self.result_dir, root + '.trace.json'))
+
+
+class InotifyFileLinker(FileLinker):
+    """inotify로 TargetDir을 감시하여 .eof 파일이 생성되는 즉시 변환 대상을 찾는 FileLinker입니다.
+    디렉토리를 조회하는 대신 inotify 이벤트로 색인을 갱신합니다.
+    inotify를 사용할 수 없는 경우(리눅스가 아니거나 초기화 실패 등)에는 FileLinker와 같이 동작합니다.
+    ※ 네트워크 파일 시스템(NFS, CIFS 등)은 inotify 이벤트가 전달되지 않으므로 FileLinker를 사용해야 합니다.
+    """
+    def __init__(self):
+        FileLinker.__init__(self)
+        self.inotify = None
+        self.need_rescan = True
+        self.last_scan_time = 0
+        self.rescan_interval = 60
+
+    def set_rescan_interval(self, rescan_interval):
+        """놓친 이벤트가 있을 경우를 대비하여 디렉토리 전체를 다시 조회하는 주기를 지정합니다. (단위: 초)"""
+        self.rescan_interval = rescan_interval
+
+    def set_target_dir(self, target_dir):
+        FileLinker.set_target_dir(self, target_dir)
+
+        try:
+            self.inotify = Inotify()
+            self.inotify.add_watch(target_dir, IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_MOVED_FROM)
+        except InotifyError as e:
+            log.warning('inotify를 사용할 수 없습니다. 디렉토리 조회 방식으로 동작합니다. 원인: {}'.format(e))
+            if self.inotify:
+                self.inotify.close()
+            self.inotify = None
+
+    def _refresh(self, force = False):
+        if not self.inotify:
+            return FileLinker._refresh(self, force)
+
+        for wd, mask, cookie, name in self.inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                log.warning('inotify 이벤트 큐가 가득 찼습니다. 디렉토리 전체를 다시 조회합니다.')
+                self.need_rescan = True
+            elif not name:
+                continue
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._update_name(name, False)
+            elif not name in self.known_names:
+                self._update_name(name, True)
+
+        if force or self.need_rescan or time.time() - self.last_scan_time > self.rescan_interval:
+            FileLinker._refresh(self, True)
+            self.need_rescan = False
+            self.last_scan_time = time.time()
+
+    def wait(self, timeout):
+        """새로운 inotify 이벤트가 생기면 timeout 전이라도 바로 반환합니다."""
+        if not self.inotify or self.ready or self.need_rescan:
+            return FileLinker.wait(self, timeout)
+        self.inotify.wait(timeout)
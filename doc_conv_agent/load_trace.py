@@ -0,0 +1,85 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""부하 기록: 운영 중에 들어온 연동 대상의 도착 시각, 크기, 확장자, 처리 결과를 작업마다 한 줄씩 남긴 파일.
+([Trace] CaptureFile 설정. benchmark/replay_trace.py로 같은 부하를 다시 만들 수 있습니다.)
+
+형식: 탭으로 구분한 텍스트. '#'으로 시작하는 줄은 무시합니다.
+    도착 시각(epoch 초)  크기(바이트, 모르면 -)  확장자  결과(.eof 내용. 0이면 성공, 그 외는 에러 코드)  처리 시간(초)
+"""
+
+import os
+
+import logging
+log = logging.getLogger(__name__)
+
+FIELDS = ('arrived_time', 'size', 'ext', 'result', 'duration')
+
+
+def format_record(arrived_time, size, ext, result, duration):
+    """한 작업의 기록을 한 줄(줄바꿈 제외)로 만듭니다.
+    @param size: 원본 파일의 크기. 모르면 None.
+    @param result: 성공이면 '0', 실패면 에러 코드.
+    """
+    return '{:.3f}\t{}\t{}\t{}\t{:.3f}'.format(
+            arrived_time, '-' if size is None else size, ext.lower() or '-', result, duration)
+
+
+def parse_record(line):
+    """format_record()로 만든 줄을 dict로 바꿉니다. 빈 줄이나 주석이면 None.
+    @raise ValueError: 형식이 맞지 않을 때.
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    values = line.split('\t')
+    if len(values) != len(FIELDS):
+        raise ValueError('항목의 수가 맞지 않습니다: {}'.format(line))
+    arrived_time, size, ext, result, duration = values
+    return {'arrived_time': float(arrived_time),
+            'size': None if size == '-' else int(size),
+            'ext': '' if ext == '-' else ext,
+            'result': result,
+            'duration': float(duration)}
+
+
+def read_records(path):
+    """부하 기록 파일을 읽어서 도착 시각 순으로 정렬한 목록을 반환합니다. (형식이 맞지 않는 줄은 건너뜀)"""
+    records = []
+    with open(path, 'r') as f:
+        for line_no, line in enumerate(f, 1):
+            try:
+                record = parse_record(line)
+            except ValueError as e:
+                log.warning('부하 기록의 {}번째 줄을 건너뜁니다. ({})'.format(line_no, e))
+                continue
+            if record:
+                records.append(record)
+    records.sort(key = lambda record: record['arrived_time'])
+    return records
+
+
+def get_ext(file_path):
+    """부하 기록에 남길 확장자 (점 제외, 소문자)"""
+    return os.path.splitext(file_path)[1][1:].lower()
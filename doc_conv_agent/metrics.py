@@ -0,0 +1,245 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import time
+import threading
+import BaseHTTPServer
+from SocketServer import ThreadingMixIn
+from Queue import Empty, Full
+
+import logging
+log = logging.getLogger(__name__)
+
+
+PREFIX = 'doc_conv_agent_'
+
+# 처리 시간 히스토그램의 구간 (단위: 초)
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# 개수 히스토그램의 구간
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+# 크기 히스토그램의 구간 (단위: 바이트)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024, 100 * 1024 * 1024, 1024 * 1024 * 1024)
+
+# 수집하는 항목: 이름 -> (종류, 설명, 히스토그램 구간)
+DEFINITIONS = {
+    'pickup_delay_seconds': ('histogram', '.eof 파일이 생성된 후 변환 대상으로 가져오기까지 걸린 시간', TIME_BUCKETS),
+    'create_task_seconds': ('histogram', '작업 생성(create_task) 요청에 걸린 시간', TIME_BUCKETS),
+    'batch_documents': ('histogram', '배치 작업 하나에 묶은 문서의 수', COUNT_BUCKETS),
+    'batch_requeued_total': ('counter', '배치 작업이 실패하여 문서별로 다시 변환한 문서의 수 (배치 작업의 에러 코드별)', None),
+    'sandbox_pending_seconds': ('histogram', '쿠쿠에서 작업이 가상 머신을 기다린 시간 (added_on ~ started_on)', TIME_BUCKETS),
+    'sandbox_running_seconds': ('histogram', '쿠쿠에서 작업이 실행된 시간 (started_on ~ completed_on)', TIME_BUCKETS),
+    'sandbox_reporting_seconds': ('histogram', '쿠쿠에서 실행이 끝난 후 레포트 작성이 끝난 것을 확인하기까지 걸린 시간', TIME_BUCKETS),
+    'report_fallback_total': ('counter', 'conversion 레포트가 없어서 전체 레포트(/tasks/report)를 받은 수', None),
+    'report_download_seconds': ('histogram', '레포트를 받는 데 걸린 시간', TIME_BUCKETS),
+    'report_download_bytes': ('histogram', '받은 레포트의 크기 (전송된 크기 기준)', SIZE_BUCKETS),
+    'report_decode_seconds': ('histogram', '레포트 분석 및 변환된 파일의 디코딩에 걸린 시간', TIME_BUCKETS),
+    'converted_file_download_seconds': ('histogram', '레포트와 따로 받은 변환된 파일을 받는 데 걸린 시간', TIME_BUCKETS),
+    'converted_file_download_bytes': ('histogram', '레포트와 따로 받은 변환된 파일의 크기', SIZE_BUCKETS),
+    'deliver_seconds': ('histogram', '변환 결과를 결과 디렉토리에 기록(Linker.success)하는 데 걸린 시간', TIME_BUCKETS),
+    'delivered_total': ('counter', '변환 결과를 전달한 파일의 수', None),
+    'errors_total': ('counter', '에러 코드별 변환 실패 수', None),
+}
+
+
+class Metrics:
+    """단계별 처리 시간(히스토그램)과 처리 건수(카운터)를 모아둡니다. (여러 스레드가 공유할 수 있음)
+    이름은 DEFINITIONS에 정의된 것만 사용할 수 있습니다.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {} # (이름, 레이블) -> 값
+        self.histograms = {} # (이름, 레이블) -> [구간별 건수 목록, 합계, 건수]
+
+    def _key(self, name, labels):
+        if not name in DEFINITIONS:
+            raise KeyError('정의되지 않은 항목입니다. (이름: {})'.format(name))
+        return (name, tuple(sorted(labels.items())) if labels else ())
+
+    def inc(self, name, labels = None, value = 1):
+        """카운터를 증가시킵니다.
+        @param labels: 레이블 dict. 예: {'code': '10000'}
+        """
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels = None):
+        """히스토그램에 값을 추가합니다."""
+        key = self._key(name, labels)
+        buckets = DEFINITIONS[name][2]
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if not histogram:
+                histogram = [[0] * len(buckets), 0.0, 0]
+                self.histograms[key] = histogram
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+
+    def flush(self):
+        """모아둔 값을 다른 곳으로 전달합니다. (QueueMetrics에서 사용)"""
+        pass
+
+    def take(self):
+        """모아둔 값을 반환하고 비웁니다.
+        @return: (카운터 dict, 히스토그램 dict). merge()에 그대로 넘길 수 있음.
+        """
+        with self.lock:
+            snapshot = (self.counters, self.histograms)
+            self.counters = {}
+            self.histograms = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """take()로 가져온 값을 더합니다."""
+        counters, histograms = snapshot
+        with self.lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, (bucket_counts, total, count) in histograms.items():
+                histogram = self.histograms.get(key)
+                if not histogram:
+                    histogram = [[0] * len(bucket_counts), 0.0, 0]
+                    self.histograms[key] = histogram
+                for i, bucket_count in enumerate(bucket_counts):
+                    histogram[0][i] += bucket_count
+                histogram[1] += total
+                histogram[2] += count
+
+    def render(self):
+        """Prometheus 텍스트 형식으로 변환합니다."""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = dict((key, (list(h[0]), h[1], h[2])) for key, h in self.histograms.items())
+
+        lines = []
+        for name in sorted(DEFINITIONS):
+            kind, help_text, buckets = DEFINITIONS[name]
+            full_name = PREFIX + name
+            lines.append('# HELP {} {}'.format(full_name, help_text))
+            lines.append('# TYPE {} {}'.format(full_name, kind))
+            if kind == 'counter':
+                for (key_name, labels), value in sorted(counters.items()):
+                    if key_name == name:
+                        lines.append('{}{} {}'.format(full_name, _format_labels(labels), value))
+                continue
+
+            for (key_name, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+                if key_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, bucket_counts):
+                    cumulative += bucket_count
+                    lines.append('{}_bucket{} {}'.format(full_name, _format_labels(labels + (('le', repr(float(bound))),)), cumulative))
+                lines.append('{}_bucket{} {}'.format(full_name, _format_labels(labels + (('le', '+Inf'),)), count))
+                lines.append('{}_sum{} {}'.format(full_name, _format_labels(labels), repr(total)))
+                lines.append('{}_count{} {}'.format(full_name, _format_labels(labels), count))
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels) + '}'
+
+
+class QueueMetrics(Metrics):
+    """작업 프로세스에서 모은 값을 주기적으로 큐에 넣어 메인 프로세스의 Metrics로 전달합니다.
+    (메인 프로세스에서는 MetricsCollector가 큐에서 꺼내 합침)
+    """
+    def __init__(self, q, flush_interval = 1.0):
+        Metrics.__init__(self)
+        self.q = q
+        self.flush_interval = flush_interval
+        self.last_flush_time = time.time()
+
+    def flush(self):
+        now = time.time()
+        if now - self.last_flush_time < self.flush_interval:
+            return
+        self.last_flush_time = now
+
+        snapshot = self.take()
+        if not snapshot[0] and not snapshot[1]:
+            return
+        try:
+            self.q.put_nowait(snapshot)
+        except Full:
+            # 메인 프로세스가 가져가지 못하면 다음에 다시 전달함.
+            self.merge(snapshot)
+
+
+class MetricsCollector(threading.Thread):
+    """작업 프로세스들이 큐로 보낸 값을 메인 프로세스의 Metrics에 합칩니다."""
+    def __init__(self, q, metrics, flag):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.q = q
+        self.metrics = metrics
+        self.flag = flag
+
+    def run(self):
+        while self.flag.is_set():
+            try:
+                self.metrics.merge(self.q.get(timeout = 1))
+            except Empty:
+                pass
+            except Exception:
+                log.exception('수집한 값을 합치는 중 에러가 발생했습니다.')
+
+
+class _MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.metrics.render()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug('metrics 요청: ' + format % args)
+
+
+class _MetricsServer(ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def start_metrics_server(metrics, port, host = '127.0.0.1'):
+    """/metrics 경로로 Prometheus 텍스트 형식의 값을 제공하는 HTTP 서버를 백그라운드 스레드로 실행합니다.
+    @return: HTTP 서버 객체 (shutdown()으로 중지)
+    """
+    server = _MetricsServer((host, port), _MetricsHandler)
+    server.metrics = metrics
+    thread = threading.Thread(target = server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    log.info('metrics 서버를 시작했습니다. (http://{}:{}/metrics)'.format(host, port))
+    return server
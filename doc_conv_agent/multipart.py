@@ -0,0 +1,102 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import os
+import uuid
+
+from requests.packages.urllib3.fields import RequestField
+
+
+class MultipartFileEncoder:
+    """파일 하나를 포함한 multipart/form-data 본문을 파일에서 조금씩 읽어서 만듭니다.
+    requests.post(files=...)는 본문 전체를 메모리에 만든 후 보내지만, 이 객체를 data로 넘기면
+    본문의 크기(Content-Length)를 미리 계산하여 보내고, 파일은 보내는 동안 조금씩 읽습니다.
+    (본문의 형식은 requests.post(files=...)와 같음)
+
+    사용 예:
+        encoder = MultipartFileEncoder({'package': 'doc_conv'}, 'file', file_name, f)
+        session.post(url, data = encoder, headers = {'Content-Type': encoder.content_type})
+    """
+    def __init__(self, fields, file_field, file_name, file_obj):
+        """
+        @param fields: 파일 외에 보낼 항목 (dict)
+        @param file_field: 파일 항목의 이름
+        @param file_name: 서버에 알려줄 파일명
+        @param file_obj: 보낼 파일 객체 (파일의 끝까지 보내며, 보내는 동안 크기가 바뀌면 안 됨)
+        """
+        self.boundary = uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary=' + self.boundary
+
+        head = []
+        for name, value in sorted(fields.items()):
+            field = RequestField.from_tuples(name, _to_bytes(value))
+            head.append(self._part_header(field) + field.data + '\r\n')
+        file_field = RequestField(name = file_field, data = '', filename = file_name)
+        file_field.make_multipart(content_type = None)
+        head.append(self._part_header(file_field))
+
+        file_size = os.fstat(file_obj.fileno()).st_size - file_obj.tell()
+        # 본문 = (파일 외 항목 + 파일 항목의 헤더) + 파일 내용 + 끝 표시
+        self.parts = [_StringReader(''.join(head)), file_obj, _StringReader('\r\n--' + self.boundary + '--\r\n')]
+        self.length = sum(len(part.data) for part in self.parts if isinstance(part, _StringReader)) + file_size
+        self.index = 0
+
+    def _part_header(self, field):
+        return '--' + self.boundary + '\r\n' + field.render_headers().encode('utf-8')
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size = -1):
+        """본문을 최대 size 바이트 읽습니다. 본문의 끝이면 빈문자열."""
+        chunks = []
+        while self.index < len(self.parts):
+            data = self.parts[self.index].read(size)
+            if data:
+                chunks.append(data)
+                if size >= 0:
+                    size -= len(data)
+                    if size <= 0:
+                        break
+            else:
+                self.index += 1
+        return ''.join(chunks)
+
+
+class _StringReader:
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def read(self, size = -1):
+        end = len(self.data) if size < 0 else self.position + size
+        data = self.data[self.position:end]
+        self.position += len(data)
+        return data
+
+
+def _to_bytes(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
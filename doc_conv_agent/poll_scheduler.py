@@ -0,0 +1,113 @@
+# encoding: utf-8
+
+# Copyright (c) 2016 Hyo min Bak. (typemild@gmail.com)
+#
+# License: MIT License
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import os
+import time
+
+
+class PollScheduler:
+    """진행 중인 변환 작업마다 다음 상태 조회 시각을 관리합니다.
+    확장자별 예상 소요 시간이 지나기 전에는 드물게, 지난 후에는 최소 간격으로 자주 조회하도록 합니다.
+    """
+    def __init__(self):
+        self.tasks = {} # 작업ID -> {'jobs', 'digest', 'ext', 'added_time', 'next_poll_time'}
+        self.min_poll_interval = 1.0
+        self.max_poll_interval = 30.0
+        self.expected_durations = {'default': 60.0}
+
+    def set_poll_interval(self, min_poll_interval, max_poll_interval):
+        """상태 조회 간격의 최소/최대 값을 지정합니다. (단위: 초)"""
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+
+    def set_expected_durations(self, expected_durations):
+        """
+        @param expected_durations: 확장자 -> 예상 소요 시간(초) dict. 예: {'doc': 40, 'ppt': 90, 'default': 60}
+            (목록에 없는 확장자는 'default'의 값을 사용함)
+        """
+        self.expected_durations = dict((k.lower(), v) for k, v in expected_durations.items())
+        self.expected_durations.setdefault('default', 60.0)
+
+    def get_expected_duration(self, ext):
+        return self.expected_durations.get(ext, self.expected_durations['default'])
+
+    def add(self, task_id, job_id, file_path, digest = None, now = None):
+        """진행 중인 작업을 추가합니다.
+        이미 있는 작업이면 결과를 함께 받을 파일만 추가합니다. (내용이 같은 파일의 작업을 합친 경우)
+        @param job_id: 작업 기록(JobJournal)의 ID
+        @param digest: 원본 파일의 해시값 (캐시를 사용하지 않으면 None)
+        """
+        if task_id in self.tasks:
+            self.tasks[task_id]['jobs'].append((job_id, file_path))
+            return
+
+        if now is None:
+            now = time.time()
+        root, ext = os.path.splitext(file_path)
+        task = {'jobs': [(job_id, file_path)],
+                'digest': digest,
+                'ext': ext[1:].lower(),
+                'added_time': now,
+                'next_poll_time': now}
+        self.tasks[task_id] = task
+        self.reschedule(task_id, now)
+
+    def remove(self, task_id):
+        return self.tasks.pop(task_id, None)
+
+    def get(self, task_id):
+        return self.tasks.get(task_id)
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def reschedule(self, task_id, now = None):
+        """작업의 다음 조회 시각을 정합니다.
+        예상 완료 시각 전에는 남은 시간의 절반만큼(최대 max_poll_interval) 기다리고,
+        예상 완료 시각이 지나면 결과를 바로 가져올 수 있도록 min_poll_interval 간격으로 조회합니다.
+        """
+        if now is None:
+            now = time.time()
+        task = self.tasks[task_id]
+        elapsed = now - task['added_time']
+        remaining = self.get_expected_duration(task['ext']) - elapsed
+        interval = self.min_poll_interval
+        if remaining > 0:
+            interval = min(max(remaining / 2.0, self.min_poll_interval), self.max_poll_interval)
+        task['next_poll_time'] = now + interval
+
+    def due(self, now = None):
+        """조회할 시각이 된 작업ID 목록을 반환합니다."""
+        if now is None:
+            now = time.time()
+        return [task_id for task_id, task in self.tasks.items() if task['next_poll_time'] <= now]
+
+    def time_until_next_poll(self, now = None):
+        """가장 먼저 조회해야 하는 작업까지 남은 시간을 반환합니다. 작업이 없으면 None."""
+        if not self.tasks:
+            return None
+        if now is None:
+            now = time.time()
+        next_poll_time = min(task['next_poll_time'] for task in self.tasks.values())
+        return max(next_poll_time - now, 0)
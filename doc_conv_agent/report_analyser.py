@@ -25,19 +25,76 @@
 import json
 import base64
 
+from json_stream import JsonEventParser
+
 import logging
 log = logging.getLogger(__name__)
 
+# doc_conv 분석 패키지의 인쇄 감시기가 보고한 실패 원인(레포트의 converted.error) -> 에러 코드
+# (목록에 없는 원인은 변환된 파일이 없는 것(30002)으로 처리함)
+WATCHDOG_ERROR_CODES = {'viewer_exited': '30006', # 인쇄가 끝나기 전에 뷰어가 종료됨
+                        'print_stalled': '30007', # 인쇄가 진행되지 않음 (대화상자 등)
+                        'spool_error': '30008'}   # 인쇄 작업이 에러 상태임
+
 class ReportAnalyser:
     def analyse(self, report):
         """
         @param report: 보고서 문자열 (예: JSON 등..)
         @return: (성공 여부, 결과 파일 데이터 혹은 에러 코드)
             첫 번째 값이 True일 때 두 번째 값은 결과 파일의 바이너리 데이터입니다.
+            (보고서에 파일 정보만 포함된 경우에는 {'size', 'sha256', 'path'} dict입니다.)
             첫 번째 값이 False일 때 두 번째 값은 에러 코드(문자열)입니다.
+            배치 작업의 레포트인 경우 두 번째 값은 문서별 결과를 담은 BatchResult입니다.
         """
         pass
 
+    def analyse_stream(self, stream, task_id, result_file = None):
+        """보고서를 스트림에서 읽어서 분석합니다. (기본 구현은 전체를 읽은 후 analyse()를 호출합니다.)
+        @param stream: read(size) 메소드를 가진 객체 (HTTP 응답 등)
+        @param task_id: 작업ID (로그 기록용)
+        @param result_file: 변환된 파일을 기록할 파일 객체. (지원하지 않는 경우 무시됨)
+        @return: analyse()와 같음. 단, result_file에 기록한 경우 두 번째 값은 result_file입니다.
+        """
+        return self.analyse(stream.read())
+
+
+class BatchResult(dict):
+    """여러 문서를 하나의 작업으로 변환한 경우(배치 작업)의 결과.
+    문서 이름(배치 파일 안의 파일명에서 확장자를 뺀 것) -> (성공 여부, 결과 파일 데이터 혹은 에러 코드) dict입니다.
+    각 값의 의미는 ReportAnalyser.analyse()의 반환값과 같습니다.
+    """
+    pass
+
+
+class Base64DecodingWriter:
+    """base64 문자열을 조금씩 받아서 디코딩한 후 다른 파일 객체에 기록합니다.
+    (디코딩된 데이터 전체를 메모리에 올리지 않기 위함)
+    """
+    def __init__(self, out):
+        self.out = out
+        self.pending = '' # 4의 배수가 되지 않아 아직 디코딩하지 못한 문자열
+        self.size = 0 # 디코딩된 데이터의 크기
+
+    def write(self, data):
+        data = self.pending + data.translate(None, ' \t\r\n')
+        length = len(data) // 4 * 4
+        self.pending = data[length:]
+        if length:
+            self._write(data[:length])
+
+    def _write(self, data):
+        plain_data = base64.decodestring(data)
+        self.out.write(plain_data)
+        self.size += len(plain_data)
+
+    def close(self):
+        """남은 문자열을 디코딩합니다.
+        @raise binascii.Error: 올바른 base64 문자열이 아닐 때.
+        """
+        if self.pending:
+            self._write(self.pending)
+            self.pending = ''
+
 
 class JsonReportAnalyser(ReportAnalyser):
     def set_signature_list(self, signature_list):
@@ -60,18 +117,127 @@ class JsonReportAnalyser(ReportAnalyser):
             log.info('변환된 파일이 존재하지 않습니다.\n작업ID: {}'.format(json_root['info']['id']))
             return (False, '30002')
 
-        b64_data = json_root['converted']
-        if not b64_data:
-            log.info('파일 데이터가 없습니다.\n작업ID: {}'.format(json_root['info']['id']))
+        converted = json_root['converted']
+        if isinstance(converted, dict) and 'documents' in converted:
+            # 배치 작업인 경우 문서별로 결과를 만듦.
+            batch_result = BatchResult()
+            for name, value in converted['documents'].items():
+                batch_result[name] = self._decode_converted(value, json_root['info']['id'], name)
+            return (True, batch_result)
+
+        return self._decode_converted(converted, json_root['info']['id'])
+
+    def _decode_converted(self, converted, task_id, name = None):
+        """레포트의 converted 항목(혹은 배치 작업의 문서 하나)을 결과 파일 데이터로 바꿉니다.
+        @param name: 배치 작업인 경우 문서 이름 (로그 기록용)
+        @return: analyse()와 같음.
+        """
+        if name is not None:
+            task_id = '{} (문서: {})'.format(task_id, name)
+
+        if isinstance(converted, dict):
+            if 'error' in converted:
+                # 분석 패키지가 인쇄 실패를 보고한 경우.
+                log.error('인쇄에 실패했습니다.\n작업ID: {}\n원인: {}'.format(task_id, converted['error']))
+                return (False, WATCHDOG_ERROR_CODES.get(converted['error'], '30002'))
+            # 레포트에 파일 정보만 포함된 경우. (converted 처리 모듈의 mode = reference)
+            return (True, converted)
+
+        if not converted:
+            log.info('파일 데이터가 없습니다.\n작업ID: {}'.format(task_id))
             return (False, '30003')
 
         try:
-            plain_data = base64.decodestring(b64_data)
+            plain_data = base64.decodestring(converted)
         except Exception as e:
             log.error(
                     '파일 데이터 디코딩 중 에러가 발생했습니다.\n작업ID: {}\n에러 내용:{}'
-                    .format(json_root['info']['id'], e))
+                    .format(task_id, e))
             return (False, '30004')
 
         return (True, plain_data)
 
+    def analyse_stream(self, stream, task_id, result_file = None):
+        """보고서 전체를 메모리에 올리지 않고 필요한 항목(signatures[].name, info.id, converted)만 읽어서 분석합니다.
+        검사 대상 시그니처가 발견되면 나머지는 읽지 않고 바로 반환합니다.
+        result_file이 주어지면 converted 항목은 메모리에 모으지 않고 조금씩 디코딩하여 result_file에 기록합니다.
+        (배치 작업의 문서별 결과는 result_file을 사용하지 않고 메모리에 모음)
+        """
+        parser = JsonEventParser(stream)
+        # behavior, network, static, debug 등 분석에 필요 없는 항목은 토큰 단위로 분석하지 않고 건너뜀.
+        parser.set_wanted_keys(['info', 'signatures', 'converted'])
+        decoder = None
+        if result_file:
+            decoder = Base64DecodingWriter(result_file)
+            parser.set_string_sink('converted', decoder)
+
+        has_converted = False
+        converted = ''
+        converted_info = None
+        documents = None # 배치 작업인 경우 문서 이름 -> base64 문자열 혹은 파일 정보 dict
+        for prefix, event, value in parser.events():
+            if prefix == 'info.id' and event == 'number':
+                task_id = value
+            elif prefix == 'signatures.item.name' and event == 'string':
+                if value in self.signature_list:
+                    log.error(
+                    '''시그니처가 검출되었습니다.
+                        작업ID: {}
+                        시그니처: {}'''.format(task_id, value))
+                    return (False, '30001')
+            elif prefix == 'converted':
+                has_converted = True
+                if event == 'string' and value:
+                    converted = value
+                elif event == 'start_map':
+                    converted_info = {}
+            elif prefix == 'converted.documents' and event == 'start_map':
+                documents = {}
+            elif prefix.startswith('converted.documents.') and documents is not None:
+                # 'converted.documents.<문서 이름>' 혹은 'converted.documents.<문서 이름>.<항목>'
+                name, dot, field = prefix[len('converted.documents.'):].partition('.')
+                if not field:
+                    if event == 'string':
+                        documents[name] = value
+                    elif event == 'start_map':
+                        documents[name] = {}
+                elif event in ('string', 'number') and isinstance(documents.get(name), dict):
+                    documents[name][field] = value
+            elif prefix.startswith('converted.') and converted_info is not None:
+                if event in ('string', 'number'):
+                    converted_info[prefix[len('converted.'):]] = value
+
+        if not has_converted:
+            log.info('변환된 파일이 존재하지 않습니다.\n작업ID: {}'.format(task_id))
+            return (False, '30002')
+
+        if documents is not None:
+            batch_result = BatchResult()
+            for name, value in documents.items():
+                batch_result[name] = self._decode_converted(value, task_id, name)
+            return (True, batch_result)
+
+        if converted_info:
+            # 레포트에 파일 정보만 포함된 경우(converted 처리 모듈의 mode = reference) 혹은 인쇄 실패를 보고한 경우.
+            return self._decode_converted(converted_info, task_id)
+
+        if decoder:
+            return self._check_decoded(decoder, task_id, result_file)
+
+        return self._decode_converted(converted, task_id)
+
+    def _check_decoded(self, decoder, task_id, result_file):
+        """analyse_stream()에서 result_file에 기록한 결과를 확인합니다."""
+        try:
+            decoder.close()
+        except Exception as e:
+            log.error(
+                    '파일 데이터 디코딩 중 에러가 발생했습니다.\n작업ID: {}\n에러 내용:{}'
+                    .format(task_id, e))
+            return (False, '30004')
+
+        if decoder.size == 0:
+            log.info('파일 데이터가 없습니다.\n작업ID: {}'.format(task_id))
+            return (False, '30003')
+
+        return (True, result_file)
@@ -0,0 +1,88 @@
+# encoding: utf-8
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'doc_conv_agent'))
+
+import conversion_cache
+from conversion_cache import ConversionCache
+
+
+class ConversionCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def disk_size(self):
+        return sum(os.path.getsize(os.path.join(self.cache_dir, name))
+                   for name in os.listdir(self.cache_dir) if name.endswith('.pdf'))
+
+    def test_workers_share_max_size(self):
+        # 같은 디렉토리를 사용하는 워커 4개가 함께 최대 크기를 지킴. (매번 디스크의 전체 크기를 다시 합산하는 경우)
+        workers = [ConversionCache(self.cache_dir, 10000) for i in range(4)]
+        for worker in workers:
+            worker.set_scan_interval(0)
+        for i in range(40):
+            workers[i % 4].put('{:064x}'.format(i), 'A' * 1000)
+            self.assertTrue(self.disk_size() <= 10000)
+
+    def test_scan_only_over_max_size(self):
+        cache = ConversionCache(self.cache_dir, 10000)
+        scans = []
+        list_entries = cache._list_entries
+        def counting_list_entries():
+            scans.append(1)
+            return list_entries()
+        cache._list_entries = counting_list_entries
+
+        for i in range(10):
+            cache.put('{:064x}'.format(i), 'A' * 1000)
+        self.assertEqual(0, len(scans))
+
+        cache.put('{:064x}'.format(10), 'A' * 1000)
+        self.assertEqual(1, len(scans))
+        self.assertEqual(9000, cache.total_size)
+        self.assertEqual(9000, self.disk_size())
+
+    def test_evict_without_fcntl(self):
+        # POSIX가 아닌 환경에서는 잠금 없이 삭제함.
+        fcntl = conversion_cache.fcntl
+        conversion_cache.fcntl = None
+        try:
+            cache = ConversionCache(self.cache_dir, 10000)
+            for i in range(20):
+                cache.put('{:064x}'.format(i), 'A' * 1000)
+                self.assertTrue(self.disk_size() <= 10000)
+        finally:
+            conversion_cache.fcntl = fcntl
+
+    def test_vanished_entry_is_miss(self):
+        cache = ConversionCache(self.cache_dir, 10000)
+        other = ConversionCache(self.cache_dir, 10000)
+        cache.put('a' * 64, 'converted')
+        os.remove(os.path.join(self.cache_dir, 'a' * 64 + '.pdf'))
+
+        self.assertEqual(None, other.open('a' * 64))
+        self.assertEqual((0, 1), (other.hits, other.misses))
+
+    def test_open_file_survives_eviction(self):
+        cache = ConversionCache(self.cache_dir, 1500)
+        cache.put('a' * 64, 'A' * 1000)
+        cached_file = cache.open('a' * 64)
+        os.utime(os.path.join(self.cache_dir, 'a' * 64 + '.pdf'), (0, 0))
+
+        cache.put('b' * 64, 'B' * 1000)
+        with cached_file:
+            self.assertEqual('A' * 1000, cached_file.read())
+        self.assertEqual(None, cache.open('a' * 64))
+        self.assertEqual('B' * 1000, cache.open('b' * 64).read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# encoding: utf-8
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'doc_conv_agent'))
+
+from job_scheduler import PendingQueue, SchedulePolicy
+
+
+class NamePolicy(SchedulePolicy):
+    """파일 경로를 그대로 정렬 기준 값으로 사용함."""
+    def key(self, file_path, eof_file_path):
+        return file_path
+
+
+class PendingQueueTest(unittest.TestCase):
+    def test_starved_files_in_arrival_order(self):
+        queue = PendingQueue(NamePolicy(), max_wait = 60)
+        # 디렉토리를 읽은 순서대로 추가하므로 도착 시각의 순서와 다름.
+        queue.push('c', 'a.doc', 'c.eof', 300.0)
+        queue.push('b', 'b.doc', 'b.eof', 100.0)
+        queue.push('a', 'c.doc', 'a.eof', 200.0)
+        queue.push('d', 'd.doc', 'd.eof', 990.0)
+
+        self.assertEqual(['b', 'a', 'c', 'd'], [queue.pop(1000.0) for i in range(4)])
+        self.assertEqual(None, queue.pop(1000.0))
+
+    def test_policy_order_before_max_wait(self):
+        queue = PendingQueue(NamePolicy(), max_wait = 60)
+        queue.push('late', 'a.doc', 'late.eof', 300.0)
+        queue.push('early', 'b.doc', 'early.eof', 100.0)
+
+        self.assertEqual('late', queue.pop(150.0))
+        self.assertEqual('early', queue.pop(170.0))
+        self.assertEqual(0, len(queue))
+
+    def test_skips_files_already_popped_by_policy(self):
+        queue = PendingQueue(NamePolicy(), max_wait = 60)
+        queue.push('y', 'b.doc', 'y.eof', 120.0)
+        queue.push('x', 'a.doc', 'x.eof', 100.0)
+
+        self.assertEqual('x', queue.pop(150.0))
+        self.assertEqual('y', queue.pop(1000.0))
+        self.assertEqual(None, queue.pop(1000.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
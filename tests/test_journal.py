@@ -0,0 +1,83 @@
+# encoding: utf-8
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'doc_conv_agent'))
+
+import journal
+from journal import JobJournal
+
+
+class FakeTime:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class FindTaskTest(unittest.TestCase):
+    WINDOW = 600
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.clock = FakeTime(1000.0)
+        self.saved_time = journal.time
+        journal.time = self.clock
+        self.journal = JobJournal(os.path.join(self.work_dir, 'journal.db'))
+
+    def tearDown(self):
+        self.journal.close()
+        journal.time = self.saved_time
+        shutil.rmtree(self.work_dir)
+
+    def find_task(self, digest):
+        return self.journal.find_task(digest, self.clock.now - self.WINDOW)
+
+    def test_duplicate_expire_duplicate(self):
+        # 작업을 생성함.
+        job_id = self.journal.claim('/target/a.doc', 'digest')
+        self.journal.submitted(job_id, 1)
+
+        # coalesce_window 안에 들어온 같은 파일은 작업에 합쳐짐.
+        self.clock.now += self.WINDOW - 10
+        self.assertEqual(self.find_task('digest'), 1)
+        job_id = self.journal.claim('/target/b.doc', 'digest')
+        self.journal.submitted(job_id, 1, coalesced = True)
+
+        # 작업을 생성한 지 coalesce_window가 지나면 합쳐진 파일이 최근에 있었어도 찾지 않음. (작업이 삭제되었을 수 있음)
+        self.clock.now += 20
+        self.assertEqual(self.find_task('digest'), None)
+        job_id = self.journal.claim('/target/c.doc', 'digest')
+        self.journal.submitted(job_id, 2)
+        self.assertEqual(self.find_task('digest'), 2)
+
+    def test_requeued_row_does_not_hide_older_task(self):
+        job_id = self.journal.claim('/target/a.doc', 'digest')
+        self.journal.submitted(job_id, 1)
+
+        self.clock.now += 10
+        job_id = self.journal.claim('/target/b.doc', 'digest')
+        self.journal.submitted(job_id, 2)
+        self.journal.requeue([job_id])
+
+        self.assertEqual(self.find_task('digest'), 1)
+
+    def test_digest_recorded_after_claim(self):
+        job_id = self.journal.claim('/target/a.doc', None)
+        self.journal.set_digest(job_id, 'digest')
+        self.journal.submitted(job_id, 1)
+        self.assertEqual(self.find_task('digest'), 1)
+
+    def test_batch_task_is_not_found(self):
+        job_id = self.journal.claim('/target/a.doc', 'digest')
+        self.journal.submitted(job_id, 1, str(job_id))
+        self.assertEqual(self.find_task('digest'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+# encoding: utf-8
+
+import io
+import os
+import sys
+import json
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'doc_conv_agent'))
+
+from json_stream import JsonEventParser, JsonStreamError
+
+
+WANTED = ['info', 'signatures', 'converted']
+
+
+class SkipValueTest(unittest.TestCase):
+    # 문자열 안의 괄호, 이스케이프된 따옴표/역슬래시, 버퍼보다 긴 문자열을 포함한 레포트
+    DOCUMENT = json.dumps({
+        'info': {'id': 5},
+        'behavior': {'calls': ['x]}"\\', {'b': '{[', 'c': [1, 2.5, None, True]}], 'z': 'q\\"}'},
+        'debug': {'log': 'line "1" ]]] \\\n' * 50},
+        'network': [], 'static': 'str}', 'n': 12, 'l': None,
+        'signatures': [{'name': 'a]'}],
+        'converted': 'QUJD'})
+
+    def events(self, chunk_size, wanted_keys):
+        parser = JsonEventParser(io.BytesIO(self.DOCUMENT), chunk_size)
+        if wanted_keys is not None:
+            parser.set_wanted_keys(wanted_keys)
+        # 건너뛴 키의 map_key 이벤트는 남으므로 비교에서 제외함.
+        return [(prefix, event, value) for prefix, event, value in parser.events()
+                if prefix.split('.')[0] in WANTED or (prefix == '' and (event != 'map_key' or value in WANTED))]
+
+    def test_same_events_for_any_chunk_size(self):
+        expected = self.events(65536, None)
+        for chunk_size in [1, 2, 3, 5, 7, 16, 64, 65536]:
+            self.assertEqual(expected, self.events(chunk_size, WANTED), chunk_size)
+
+    def test_unterminated_skipped_value(self):
+        parser = JsonEventParser(io.BytesIO('{"behavior": {"calls": ["a", {"b": "}"'), 4)
+        parser.set_wanted_keys(WANTED)
+        with self.assertRaises(JsonStreamError):
+            list(parser.events())
+
+
+if __name__ == '__main__':
+    unittest.main()
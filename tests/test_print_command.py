@@ -0,0 +1,171 @@
+# encoding: utf-8
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cuckoo_custom', 'analysis_packages'))
+
+from print_command import DictRegistry, PrintCommandResolver, DdeConnectError, lookup_print_command, \
+    build_table, save_table, load_table, connect_dde, warm_viewers
+
+
+WORD = '"C:\\Program Files\\Microsoft Office\\Office12\\WINWORD.EXE" /n /dde'
+READER = '"C:\\Program Files\\Adobe\\Reader\\AcroRd32.exe" /p /h "%1"'
+NOTEPAD = '%SystemRoot%\\system32\\NOTEPAD.EXE /p %1'
+
+REGISTRY = {
+    ('HKEY_CLASSES_ROOT', '.doc', ''): 'Word.Document.8',
+    ('HKEY_CLASSES_ROOT', 'Word.Document.8\\shell\\print\\command', ''): WORD,
+    ('HKEY_CLASSES_ROOT', 'Word.Document.8\\shell\\print\\ddeexec', ''): '[FileOpen("%1")][FilePrint][FileClose]',
+    ('HKEY_CLASSES_ROOT', 'Word.Document.8\\shell\\print\\ddeexec\\application', ''): 'WinWord',
+    ('HKEY_CLASSES_ROOT', 'Word.Document.8\\shell\\print\\ddeexec\\topic', ''): 'System',
+    # docx는 CurVer로 doc과 같은 ProgId를 가리킴
+    ('HKEY_CLASSES_ROOT', '.docx', ''): 'Word.Document.12',
+    ('HKEY_CLASSES_ROOT', 'Word.Document.12\\CurVer', ''): 'Word.Document.8',
+    # pdf는 사용자가 선택한 ProgId(UserChoice)가 우선함
+    ('HKEY_CLASSES_ROOT', '.pdf', ''): 'Other.Pdf',
+    ('HKEY_CURRENT_USER', 'Software\\Microsoft\\Windows\\CurrentVersion\\Explorer\\FileExts\\.pdf\\UserChoice',
+     'ProgId'): 'AcroExch.Document',
+    ('HKEY_CLASSES_ROOT', 'AcroExch.Document\\shell\\print\\command', ''): READER,
+    # txt는 PerceivedType으로 찾음
+    ('HKEY_CLASSES_ROOT', '.txt', 'PerceivedType'): 'text',
+    ('HKEY_CLASSES_ROOT', 'SystemFileAssociations\\text\\shell\\print\\command', ''): NOTEPAD,
+}
+
+
+class LookupTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = DictRegistry(REGISTRY)
+
+    def test_dde_command(self):
+        self.assertEqual({'command': WORD, 'ddeexec': '[FileOpen("%1")][FilePrint][FileClose]',
+                          'application': 'WinWord', 'topic': 'System'},
+                         lookup_print_command(self.registry, '.DOC'))
+
+    def test_cur_ver(self):
+        self.assertEqual(lookup_print_command(self.registry, 'doc'), lookup_print_command(self.registry, 'docx'))
+
+    def test_user_choice(self):
+        self.assertEqual(READER, lookup_print_command(self.registry, 'pdf')['command'])
+
+    def test_perceived_type(self):
+        self.assertEqual(NOTEPAD, lookup_print_command(self.registry, 'txt')['command'])
+
+    def test_not_found(self):
+        self.assertEqual(None, lookup_print_command(self.registry, 'hwp'))
+
+
+class ResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = DictRegistry(REGISTRY)
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_table_hit_does_not_read_registry(self):
+        path = os.path.join(self.work_dir, 'table', 'print_commands.json')
+        save_table(build_table(self.registry, ['.DOC', 'pdf', 'hwp']), path)
+        self.registry.reads = 0
+
+        resolver = PrintCommandResolver(self.registry, load_table(path))
+        self.assertEqual(WORD, resolver.get('doc')['command'])
+        self.assertEqual(READER, resolver.get('.PDF')['command'])
+        self.assertEqual(0, self.registry.reads)
+
+    def test_registry_fallback_is_remembered(self):
+        resolver = PrintCommandResolver(self.registry, {'doc': {'command': 'table', 'ddeexec': '',
+                                                                'application': '', 'topic': ''}})
+        self.assertEqual('table', resolver.get('doc')['command'])
+        self.assertEqual(0, self.registry.reads)
+
+        self.assertEqual(NOTEPAD, resolver.get('txt')['command'])
+        self.assertEqual(None, resolver.get('hwp'))
+        reads = self.registry.reads
+        self.assertTrue(reads > 0)
+
+        self.assertEqual(NOTEPAD, resolver.get('.TXT')['command'])
+        self.assertEqual(None, resolver.get('hwp'))
+        self.assertEqual(reads, self.registry.reads)
+
+    def test_broken_table(self):
+        path = os.path.join(self.work_dir, 'print_commands.json')
+        with open(path, 'w') as table_file:
+            table_file.write('{"doc": ')
+        self.assertEqual({}, load_table(path))
+        self.assertEqual({}, load_table(os.path.join(self.work_dir, 'missing.json')))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeDdeClient:
+    """ready_time 이후에 연결되는 DDE 서버"""
+    def __init__(self, clock, ready_time):
+        self.clock = clock
+        self.ready_time = ready_time
+        self.connects = []
+
+    def connect(self, application, topic):
+        self.connects.append((application, topic))
+        if self.clock.now < self.ready_time:
+            raise Exception('ConnectTo failed')
+        return 'conversation'
+
+
+class ConnectDdeTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def connect(self, client, timeout):
+        return connect_dde(client, 'WinWord', 'System', timeout, 0.5, self.clock.sleep, self.clock.time)
+
+    def test_connected_at_once(self):
+        client = FakeDdeClient(self.clock, 0)
+        self.assertEqual('conversation', self.connect(client, 15))
+        self.assertEqual([('WinWord', 'System')], client.connects)
+        self.assertEqual([], self.clock.sleeps)
+
+    def test_retry_until_ready(self):
+        client = FakeDdeClient(self.clock, 102.0)
+        self.assertEqual('conversation', self.connect(client, 15))
+        self.assertEqual(5, len(client.connects))
+        self.assertEqual([0.5] * 4, self.clock.sleeps)
+
+    def test_timeout(self):
+        client = FakeDdeClient(self.clock, 200.0)
+        with self.assertRaises(DdeConnectError):
+            self.connect(client, 3)
+        # 다음 시도가 제한 시간을 넘기면 기다리지 않고 포기함.
+        self.assertEqual([0.5] * 6, self.clock.sleeps)
+        self.assertEqual(7, len(client.connects))
+
+    def test_warm_viewers_share_dde_server(self):
+        table = build_table(DictRegistry(REGISTRY), ['doc', 'docx', 'pdf'])
+        launched = []
+        def launch(args):
+            launched.append(args)
+            return 1234
+
+        self.assertEqual(1, warm_viewers(table, FakeDdeClient(self.clock, 0), launch))
+        self.assertEqual([['C:\\Program Files\\Microsoft Office\\Office12\\WINWORD.EXE', '/n', '/dde']], launched)
+        self.assertEqual({'pid': 1234, 'image': os.path.basename(launched[0][0])}, table['doc']['warm'])
+        self.assertEqual(table['doc']['warm'], table['docx']['warm'])
+        self.assertFalse('warm' in table['pdf'])
+
+
+if __name__ == '__main__':
+    unittest.main()
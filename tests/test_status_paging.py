@@ -0,0 +1,107 @@
+# encoding: utf-8
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'doc_conv_agent'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmark'))
+
+import fake_cuckoo
+from doc_converter import SandboxDocConverter
+
+
+class GetStatusManyTest(unittest.TestCase):
+    PAGE_SIZE = 100
+    MAX_PAGES = 10
+    # ListPageSize x ListMaxPages보다 많은, 에이전트가 삭제하지 않은 오래된 작업
+    OLD_TASKS = 2500
+
+    def start_server(self, *args):
+        options = fake_cuckoo.create_parser().parse_args(
+            ['--port', '0', '--machines', '4', '--run-time', '0', '--report-time', '0', '--jitter', '0',
+             '--old-tasks', str(self.OLD_TASKS)] + list(args))
+        self.server = fake_cuckoo.create_server(options)
+        thread = threading.Thread(target = self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        # 에이전트와 같이 작업을 생성하는 변환기(RequestProcessor)와 상태를 조회하는 변환기(ConvertResultProcessor)를 따로 둠.
+        url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        self.creator = SandboxDocConverter()
+        self.creator.set_server_url(url)
+        self.creator.set_supports_extensions(['doc'])
+        self.converter = SandboxDocConverter()
+        self.converter.set_server_url(url)
+        self.converter.set_list_page_size(self.PAGE_SIZE, self.MAX_PAGES)
+
+        self.urls = []
+        get = self.converter.session.get
+        def counting_get(url, **kwargs):
+            self.urls.append(url)
+            return get(url, **kwargs)
+        self.converter.session.get = counting_get
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.sample_path = os.path.join(self.work_dir, 'sample.doc')
+        with open(self.sample_path, 'wb') as sample:
+            sample.write('sample')
+        self.server = None
+
+    def tearDown(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.creator.session.close()
+            self.converter.session.close()
+        shutil.rmtree(self.work_dir)
+
+    def create_tasks(self, count):
+        return [self.creator.create_task(self.sample_path) for i in range(count)]
+
+    def requests_to(self, path):
+        return len([url for url in self.urls if '/tasks/' + path + '/' in url])
+
+    def check_statuses(self, status, *args):
+        self.start_server(*args)
+        task_ids = self.create_tasks(10)
+
+        statuses = self.converter.get_status_many(task_ids)
+
+        self.assertEqual(dict((task_id, status) for task_id in task_ids), statuses)
+        self.assertEqual(1, self.requests_to('list'))
+        self.assertEqual(0, self.requests_to('view'))
+
+    def test_reported_tasks_newest_first(self):
+        self.check_statuses('completed', '--list-order', 'newest')
+
+    def test_pending_tasks_newest_first(self):
+        self.check_statuses('pending', '--list-order', 'newest', '--machines', '0')
+
+    def test_pending_tasks_completed_order(self):
+        self.check_statuses('pending', '--list-order', 'completed', '--machines', '0')
+
+    def test_running_tasks_completed_order(self):
+        self.check_statuses('running', '--list-order', 'completed', '--machines', '10', '--run-time', '600')
+
+    def test_reported_tasks_after_old_tasks(self):
+        # 완료 시각 순이면 새로 끝난 작업이 오래된 작업 뒤에 있으므로, 최대 페이지 수까지 찾지 못한 작업은 하나씩 조회함.
+        self.start_server('--list-order', 'completed')
+        task_ids = self.create_tasks(5)
+
+        statuses = self.converter.get_status_many(task_ids + [1])
+
+        expected = dict((task_id, 'completed') for task_id in task_ids)
+        expected[1] = 'completed'
+        self.assertEqual(expected, statuses)
+        self.assertEqual(self.MAX_PAGES, self.requests_to('list'))
+        self.assertEqual(5, self.requests_to('view'))
+
+
+if __name__ == '__main__':
+    unittest.main()